@@ -0,0 +1,205 @@
+"""
+Compiled grammar artifacts: a fully analyzed grammar (symbol tables,
+productions, LL(1) and LR tables, conflict reports) saved to a versioned
+binary file, so a worker can start parsing without redoing the analysis.
+
+Layout: MAGIC, format version, the grammar fingerprint (sha256 of its
+canonical text), the length of a JSON header, the header itself, then the
+int32 tables, each aligned on 8 bytes. The header holds the symbols,
+productions and conflicts plus the offset and length of every table,
+among them the LL(1) FOLLOW rows that error recovery reads.
+Loading maps the file and hands the tables to the parsers as memoryviews
+over the mapping, without copying them.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from grammar import Grammar, CompiledLL1, LRTable, Conflict, Tokenizer
+
+MAGIC = b'GRMC'
+VERSION = 2
+HEADER = struct.Struct('<4sI32sI')
+SUFFIX = '.grc'
+
+
+def canonical_text(G):
+    # one line per production, symbols separated by spaces: independent of
+    # how the grammar was written
+    lines = [G.axiom]
+    for v, rule in G.productions():
+        lines.append(' '.join([v, Grammar.ARROW] + [repr(x) for x in rule]))
+    return '\n'.join(lines)
+
+
+def fingerprint(G):
+    if isinstance(G, str):
+        G = Grammar.from_text(G)
+    return hashlib.sha256(canonical_text(G).encode('utf-8')).digest()
+
+
+class CompiledGrammar:
+    # the parsers of a grammar as loaded from an artifact; `ll1` is a
+    # CompiledLL1 and `lr` maps a table kind ('lalr', 'slr',..) to an LRTable
+
+    def __init__(self, fingerprint, ll1, lr, buffer=None):
+        self.fingerprint = fingerprint
+        self.ll1 = ll1
+        self.lr = lr
+        self._buffer = buffer # keeps the mapping alive
+
+    @property
+    def terminals(self):
+        return self.ll1.terminals
+
+    def tokenizer(self, patterns=None, skip=r'\s+'):
+        return Tokenizer.for_terminals(self.terminals, patterns, skip)
+
+    def close(self):
+        # release the mapping and drop the tables. The file is unmapped at
+        # once if no table loaded from it is still referenced elsewhere;
+        # otherwise the unmap waits until the last of them is released.
+        if self._buffer is not None:
+            self.ll1 = self.lr = None
+            try:
+                self._buffer.close()
+            except BufferError:
+                pass # the memoryviews keep the mapping alive until then
+            self._buffer = None
+
+
+def save(G, path, kinds=('lalr',)):
+    ll1 = G.ll1()
+    blocks = []
+    def block(data):
+        blocks.append(data)
+        return len(blocks) - 1
+
+    def conflicts(table):
+        return [[c.row, c.symbol, list(c.choices)] for c in table.conflicts]
+
+    # the FOLLOW rows of the LL(1) table, for recovery: every row's terminal
+    # ids one after the other, and where each row starts
+    follow, starts = [], [0]
+    for row in ll1.follow:
+        follow.extend(sorted(row))
+        starts.append(len(follow))
+
+    meta = {
+        'byteorder': sys.byteorder,
+        'terminals': ll1.terminals,
+        'nonterminals': ll1.nonterminals,
+        'll1': {
+            'axiom': ll1.axiom,
+            'productions': [[lhs, list(rhs)] for lhs, rhs in ll1.productions],
+            'table': block(ll1.table),
+            'conflicts': conflicts(ll1),
+            'follow': block(follow),
+            'follow_starts': block(starts),
+        },
+        'lr': {},
+    }
+    for kind in kinds:
+        lr = G.lr_table(kind)
+        meta['lr'][kind] = {
+            'productions': [[lhs, list(rhs)] for lhs, rhs in lr.productions],
+            'action': block(lr.action),
+            'goto': block(lr.goto),
+            'conflicts': conflicts(lr),
+        }
+
+    # offsets are relative to the end of the header, which depends on them,
+    # so they are laid out first and the header is padded to 8 bytes
+    layout = []
+    offset = 0
+    for data in blocks:
+        layout.append([offset, len(data)])
+        offset += (len(data) * 4 + 7) // 8 * 8
+    meta['blocks'] = layout
+    header = json.dumps(meta).encode('utf-8')
+    header += b' ' * (-(HEADER.size + len(header)) % 8)
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, fingerprint(G), len(header)))
+        f.write(header)
+        for data in blocks:
+            raw = array('i', data).tobytes()
+            f.write(raw + b'\0' * (-len(raw) % 8))
+    os.replace(tmp, path)
+
+
+def load(path, expected=None):
+    # `expected` is a Grammar, grammar text or fingerprint the artifact must match
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, digest, size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        buffer.close()
+        raise ValueError("%s is not a compiled grammar" % path)
+    if version != VERSION:
+        buffer.close()
+        raise ValueError("%s has format version %d, expected %d" % (path, version, VERSION))
+    if expected is not None:
+        if not isinstance(expected, bytes):
+            expected = fingerprint(expected)
+        if expected != digest:
+            buffer.close()
+            raise ValueError("%s was compiled from another grammar" % path)
+
+    start = HEADER.size + size
+    meta = json.loads(bytes(buffer[HEADER.size:start]).decode('utf-8'))
+    view = memoryview(buffer)
+    swap = meta['byteorder'] != sys.byteorder or array('i').itemsize != 4
+
+    def block(n):
+        offset, length = meta['blocks'][n]
+        raw = view[start+offset:start+offset+length*4]
+        if swap:
+            data = array('i')
+            data.frombytes(bytes(raw))
+            if meta['byteorder'] != sys.byteorder:
+                data.byteswap()
+            return data
+        return raw.cast('i')
+
+    def conflicts(entries):
+        return [Conflict(row, symbol, choices) for row, symbol, choices in entries]
+
+    def productions(entries):
+        return [(lhs, tuple(rhs)) for lhs, rhs in entries]
+
+    terminals, nonterminals = meta['terminals'], meta['nonterminals']
+    info = meta['ll1']
+    follow, starts = block(info['follow']), block(info['follow_starts'])
+    ll1 = CompiledLL1(terminals, nonterminals, info['axiom'],
+        productions(info['productions']), block(info['table']),
+        conflicts(info['conflicts']),
+        [frozenset(follow[starts[i]:starts[i+1]]) for i in range(len(starts) - 1)])
+    lr = {}
+    for kind, info in meta['lr'].items():
+        lr[kind] = LRTable(kind, terminals, nonterminals,
+            productions(info['productions']), block(info['action']),
+            block(info['goto']), conflicts(info['conflicts']))
+    return CompiledGrammar(digest, ll1, lr, buffer)
+
+
+def compile_cached(text, directory, kinds=('lalr',)):
+    # load the artifact of `text` from `directory`, compiling it on a miss
+    # or when it lacks some of the `kinds`, which are then added to it
+    G = Grammar.from_text(text)
+    digest = fingerprint(G)
+    path = os.path.join(directory, digest.hex() + SUFFIX)
+    if os.path.exists(path):
+        compiled = load(path, digest)
+        if set(kinds) <= set(compiled.lr):
+            return compiled
+        kinds = sorted(set(kinds) | set(compiled.lr))
+        compiled.close()
+    save(G, path, kinds)
+    return load(path, digest)
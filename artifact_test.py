@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import artifact
+from grammar import Grammar
+
+
+class TestArtifact(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.text = """
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """
+        self.G = Grammar.from_text(self.text)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        path = os.path.join(self.directory, 'g.grc')
+        artifact.save(self.G, path, kinds=('lalr', 'lr0'))
+        compiled = artifact.load(path, self.text)
+        self.assertIsInstance(compiled.ll1.table, memoryview)
+        self.assertEqual(list(compiled.ll1.table), list(self.G.ll1().table))
+        self.assertEqual(list(compiled.lr['lalr'].action), list(self.G.lr_table('lalr').action))
+        self.assertTrue(compiled.ll1.recognize("a+a∗a"))
+        self.assertFalse(compiled.lr['lr0'].recognize("a+∗a"))
+        tree = compiled.lr['lalr'].recognize("(a+a)∗a", tree=True).tree
+        self.assertEqual(tree.text(), "(a+a)∗a")
+        compiled.close()
+
+    def test_recover(self):
+        path = os.path.join(self.directory, 'g.grc')
+        artifact.save(self.G, path)
+        compiled = artifact.load(path)
+        self.assertEqual(compiled.ll1.follow, self.G.ll1().follow)
+        for s in ["a++a", "a+a∗a", "(a+)a∗"]:
+            result, expected = compiled.ll1.recover(s), self.G.ll1().recover(s)
+            self.assertEqual((result.accepted, result.position, result.errors),
+                (expected.accepted, expected.position, expected.errors), s)
+        self.assertEqual(len(compiled.ll1.recover("a++a").errors), 1)
+        compiled.close()
+
+    def test_close(self):
+        path = os.path.join(self.directory, 'g.grc')
+        artifact.save(self.G, path)
+        compiled = artifact.load(path)
+        buffer = compiled._buffer
+        self.assertTrue(compiled.lr['lalr'].recognize("a+a"))
+        compiled.close()
+        self.assertTrue(buffer.closed)
+        # a table still in use defers the unmap instead of failing
+        compiled = artifact.load(path)
+        buffer = compiled._buffer
+        table = compiled.lr['lalr']
+        compiled.close()
+        self.assertFalse(buffer.closed)
+        self.assertTrue(table.recognize("a∗a"))
+        del table
+
+    def test_conflicts(self):
+        G = Grammar.from_text("""
+                S → Aa | Bb | ac
+                A → a
+                B → a
+            """)
+        path = os.path.join(self.directory, 'g.grc')
+        artifact.save(G, path, kinds=('lr0', 'slr'))
+        compiled = artifact.load(path)
+        self.assertEqual(compiled.ll1.conflicts, G.ll1().conflicts)
+        self.assertEqual(compiled.lr['lr0'].conflicts, G.lr_table('lr0').conflicts)
+        self.assertEqual(compiled.lr['slr'].conflicts, [])
+        compiled.close()
+
+    def test_fingerprint(self):
+        self.assertEqual(artifact.fingerprint(self.text),
+            artifact.fingerprint("E -> TA\nA->+TA|ɛ\nT → FB\nB → ∗FB | ɛ\nF → (E) | a"))
+        path = os.path.join(self.directory, 'g.grc')
+        artifact.save(self.G, path)
+        self.assertRaises(ValueError, artifact.load, path, "S → a")
+
+    def test_compile_cached(self):
+        compiled = artifact.compile_cached(self.text, self.directory)
+        self.assertEqual(os.listdir(self.directory),
+            [compiled.fingerprint.hex() + artifact.SUFFIX])
+        again = artifact.compile_cached(self.text, self.directory)
+        self.assertTrue(again.lr['lalr'].recognize("a∗a"))
+        compiled.close()
+        again.close()
+        # kinds missing from the cached artifact are compiled in
+        more = artifact.compile_cached(self.text, self.directory, ('slr', 'lr1'))
+        self.assertEqual(set(more.lr), {'lalr', 'slr', 'lr1'})
+        self.assertTrue(more.lr['slr'].recognize("a∗a"))
+        more.close()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_not_an_artifact(self):
+        path = os.path.join(self.directory, 'g.grc')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 64)
+        self.assertRaises(ValueError, artifact.load, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Validate newline-delimited inputs against a grammar:
+
+    python batch.py grammar.txt inputs.txt --workers 8 --method lalr
+    cat inputs.txt | python batch.py grammar.txt --token num='\\d+'
+
+Prints one line per input, "accept" or "reject <position>", in input
+order, and exits with status 1 if any input was rejected. With --recover
+the parse goes on past syntax errors and a rejection lists the position
+of each one, up to --max-errors per input.
+"""
+
+import argparse
+import os
+import sys
+
+from grammar import Grammar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate newline-delimited inputs against a grammar.")
+    parser.add_argument('grammar', help="grammar file, one rule per line")
+    parser.add_argument('inputs', nargs='?', help="inputs file, one input per line (default: stdin)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--method', default='ll1', choices=['ll1', 'lr0', 'slr', 'lalr', 'lr1'])
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--token', action='append', default=[], metavar='KIND=REGEX',
+        help="pattern of a terminal that stands for a class of lexemes")
+    parser.add_argument('--recover', action='store_true', help="report every syntax error of an input")
+    parser.add_argument('--max-errors', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with open(args.grammar, encoding='utf-8') as f:
+        G = Grammar.from_text(f.read())
+    tokenizer = None
+    if args.token:
+        tokenizer = G.tokenizer(dict(x.split('=', 1) for x in args.token))
+
+    source = open(args.inputs, encoding='utf-8') if args.inputs else sys.stdin
+    rejected = 0
+    try:
+        inputs = (line.rstrip('\n') for line in source)
+        for result in G.parse_many(inputs, args.workers, args.method,
+                args.chunk_size, tokenizer, args.recover, args.max_errors):
+            if result:
+                print("accept")
+            elif args.recover:
+                print("reject", *(e.position for e in result.errors))
+                rejected += 1
+            else:
+                print("reject", result.position)
+                rejected += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import batch
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.grammar = self.write('grammar.txt', """
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_main(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = batch.main([self.grammar] + list(argv))
+        return status, out.getvalue().splitlines()
+
+    def test_main(self):
+        inputs = self.write('inputs.txt', "a+a∗a\na+\n(a)\na∗∗a\n")
+        for method in ('ll1', 'lalr'):
+            status, lines = self.run_main(inputs, '--workers', '1', '--method', method)
+            self.assertEqual(lines, ["accept", "reject 2", "accept", "reject 2"], method)
+            self.assertEqual(status, 1)
+        status, lines = self.run_main(self.write('valid.txt', "a\n(a+a)\n"), '--workers', '2',
+            '--chunk-size', '1')
+        self.assertEqual((status, lines), (0, ["accept", "accept"]))
+
+    def test_recover(self):
+        inputs = self.write('inputs.txt', "a+∗a+∗a\na\n")
+        status, lines = self.run_main(inputs, '--workers', '1', '--recover')
+        self.assertEqual((status, lines), (1, ["reject 2 5", "accept"]))
+        status, lines = self.run_main(inputs, '--workers', '1', '--recover', '--method', 'slr',
+            '--max-errors', '1')
+        self.assertEqual((status, lines), (1, ["reject 2", "accept"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
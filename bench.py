@@ -0,0 +1,259 @@
+"""
+Benchmarks over synthetic grammars.
+
+Every family builds a grammar from a size parameter:
+
+    chain   expression grammar with `size` precedence levels (LL(1) form)
+    nested  `size` non-terminals each nesting the next in brackets
+    wide    one non-terminal with `size` alternatives
+    left    `size` left-recursive levels (not LL(1))
+    right   `size` right-recursive levels
+
+For each grammar, random accepted inputs are derived from the axiom and
+rejected ones made by mutating them. FIRST, FOLLOW, the LL(1) table, the
+LR(0) automaton, the LALR(1) table, both table-driven recognizers and
+the modules codegen.py generates from those tables are timed, and the
+results are written as JSON so runs from different commits can be
+compared:
+
+    python bench.py --out before.json
+    git checkout ... && python bench.py --out after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import codegen
+from grammar import Grammar, grid
+
+
+def chain(n):
+    # E0 → E1 A0, A0 → op0 E1 A0 | ɛ, ..., En → ( E0 ) | id
+    rules = {}
+    for i in range(n):
+        rules['E%d' % i] = [['E%d' % (i+1), 'A%d' % i]]
+        rules['A%d' % i] = [['op%d' % i, 'E%d' % (i+1), 'A%d' % i], []]
+    rules['E%d' % n] = [['(', 'E0', ')'], ['id']]
+    return Grammar('E0', rules)
+
+
+def nested(n):
+    # N0 → [ N1 ] | t0, ..., Nn → tn
+    rules = {'N%d' % i: [['[', 'N%d' % (i+1), ']'], ['t%d' % i]] for i in range(n)}
+    rules['N%d' % n] = [['t%d' % n]]
+    return Grammar('N0', rules)
+
+
+def wide(n):
+    # S → t0 S | t1 S | ... | ɛ
+    return Grammar('S', {'S': [['t%d' % i, 'S'] for i in range(n)] + [[]]})
+
+
+def left(n):
+    # L0 → L0 x0 | L1, ..., Ln → y
+    rules = {'L%d' % i: [['L%d' % i, 'x%d' % i], ['L%d' % (i+1)]] for i in range(n)}
+    rules['L%d' % n] = [['y']]
+    return Grammar('L0', rules)
+
+
+def right(n):
+    # R0 → x0 R0 | R1, ..., Rn → y
+    rules = {'R%d' % i: [['x%d' % i, 'R%d' % i], ['R%d' % (i+1)]] for i in range(n)}
+    rules['R%d' % n] = [['y']]
+    return Grammar('R0', rules)
+
+
+FAMILIES = {'chain': chain, 'nested': nested, 'wide': wide, 'left': left, 'right': right}
+
+
+def shortest(G):
+    # length of the shortest terminal string each non-terminal derives,
+    # and the alternative that reaches it
+    length = {}
+    best = {}
+    changed = True
+    while changed:
+        changed = False
+        for v, rule in G.productions():
+            if all(G.is_terminal(x) or x in length for x in rule):
+                n = sum(1 if G.is_terminal(x) else length[x] for x in rule)
+                if n < length.get(v, float('inf')):
+                    length[v], best[v] = n, rule
+                    changed = True
+    return length, best
+
+
+def sentence(G, size, rng, length=None, best=None):
+    # a random sentence of the grammar, about `size` tokens long: alternatives
+    # are picked at random until the budget is spent, then shortest ones
+    if length is None:
+        length, best = shortest(G)
+    out = []
+    stack = [G.axiom]
+    pending = length[G.axiom] # tokens still owed by the stack
+    while stack:
+        x = stack.pop()
+        if G.is_terminal(x):
+            out.append(x)
+            pending -= 1
+            continue
+        pending -= length[x]
+        rule = best[x]
+        if len(out) + pending < size:
+            rule = rng.choice(G.rules[x])
+        pending += sum(1 if G.is_terminal(y) else length[y] for y in rule)
+        stack.extend(reversed(rule))
+    return out
+
+
+def mutate(tokens, terminals, rng):
+    # delete, insert or replace one token; the result is usually rejected
+    tokens = list(tokens)
+    i = rng.randrange(len(tokens) + 1)
+    op = rng.choice(('delete', 'insert', 'replace') if i < len(tokens) else ('insert',))
+    if op == 'delete':
+        del tokens[i]
+    elif op == 'insert':
+        tokens.insert(i, rng.choice(terminals))
+    else:
+        tokens[i] = rng.choice(terminals)
+    return tokens
+
+
+def inputs(G, count, size, rng, rejected=0.5):
+    length, best = shortest(G)
+    terminals = sorted(G.T())
+    out = []
+    for _ in range(count):
+        tokens = sentence(G, size, rng, length, best)
+        if rng.random() < rejected:
+            tokens = mutate(tokens, terminals, rng)
+        out.append(tokens)
+    return out
+
+
+def timed(run, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench(family, size, count=200, length=100, repeat=5, seed=0):
+    # one record per phase: {'family', 'size', 'phase', 'best', 'median', ...}
+    G = FAMILIES[family](size)
+    rng = random.Random(seed)
+    data = inputs(G, count, length, rng)
+    phases = [
+        ('first', lambda: G.FIRST(G.axiom)),
+        ('follow', G.FOLLOW_all),
+        ('ll1_table', G.ll1),
+        ('lr0_automaton', G.lr0_automaton),
+        ('lalr_table', lambda: G.lr_table('lalr')),
+    ]
+    records = []
+    def record(phase, times, **extra):
+        records.append(dict(family=family, size=size, phase=phase,
+            best=min(times), median=statistics.median(times), repeat=len(times), **extra))
+
+    # each analysis phase starts from a grammar holding the earlier phases only
+    for i, (phase, run) in enumerate(phases):
+        def setup():
+            G.invalidate()
+            for _, before in phases[:i]:
+                before()
+        record(phase, timed(run, repeat, setup))
+
+    tokens = sum(len(x) for x in data)
+    for method, table in (('ll1', G.ll1()), ('lalr', G.lr_table('lalr'))):
+        if table.conflicts:
+            continue # the recognizer would not decide the language
+        accepted = sum(1 for x in data if table.recognize(x))
+        record(method + '_parse', timed(lambda: [table.recognize(x) for x in data], repeat),
+            inputs=len(data), tokens=tokens, accepted=accepted)
+        recognize = codegen.load(G, method).recognize
+        accepted = sum(1 for x in data if recognize(x)[0])
+        record(method + '_generated', timed(lambda: [recognize(x) for x in data], repeat),
+            inputs=len(data), tokens=tokens, accepted=accepted)
+
+    stats = dict(productions=len(G.productions()), terminals=len(G.T()),
+        nonterminals=len(G.V()), lr0_states=len(G.lr0_automaton().states))
+    for r in records:
+        r.update(stats)
+    return records
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(records, baseline):
+    # rows of (family, size, phase, old best, new best, ratio) for the phases
+    # present in both runs
+    old = {(r['family'], r['size'], r['phase']): r['best'] for r in baseline['results']}
+    rows = []
+    for r in records:
+        key = (r['family'], r['size'], r['phase'])
+        if key in old:
+            rows.append(list(key) + ['%.6f' % old[key], '%.6f' % r['best'],
+                '%.2f' % (r['best'] / old[key] if old[key] else float('inf'))])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark grammar analyses and parsers.")
+    parser.add_argument('--family', action='append', choices=sorted(FAMILIES),
+        help="grammar family, repeatable (default: all)")
+    parser.add_argument('--size', default='4,16,64', help="comma-separated grammar sizes")
+    parser.add_argument('--inputs', type=int, default=200, help="inputs per grammar")
+    parser.add_argument('--length', type=int, default=100, help="approximate tokens per input")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="write JSON results to this file (default: stdout)")
+    parser.add_argument('--compare', metavar='JSON', help="earlier results to compare with")
+    args = parser.parse_args(argv)
+
+    records = []
+    for family in args.family or sorted(FAMILIES):
+        for size in [int(x) for x in args.size.split(',')]:
+            records.extend(bench(family, size, args.inputs, args.length, args.repeat, args.seed))
+    result = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': vars(args),
+        'results': records,
+    }
+
+    rows = [['family', 'size', 'phase', 'best (s)', 'median (s)']]
+    rows += [[r['family'], r['size'], r['phase'], '%.6f' % r['best'], '%.6f' % r['median']]
+        for r in records]
+    print(grid(rows), file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(records, json.load(f))
+        print(grid([['family', 'size', 'phase', 'before', 'after', 'ratio']] + rows),
+            file=sys.stderr)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+    else:
+        json.dump(result, sys.stdout, indent=1)
+
+
+if __name__ == '__main__':
+    main()
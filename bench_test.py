@@ -0,0 +1,34 @@
+import random
+import unittest
+
+import bench
+
+
+class TestBench(unittest.TestCase):
+
+    def test_families(self):
+        for name, family in bench.FAMILIES.items():
+            G = family(6)
+            sentences = [bench.sentence(G, 30, random.Random(i)) for i in range(20)]
+            for table in (G.ll1(), G.lr_table('lalr')):
+                if table.conflicts:
+                    self.assertEqual(name, 'left')
+                    continue
+                for x in sentences:
+                    self.assertTrue(table.recognize(x), (name, x))
+            self.assertGreater(len(set(map(tuple, sentences))), 1, name)
+
+    def test_bench(self):
+        records = bench.bench('chain', 3, count=10, length=20, repeat=1)
+        phases = [r['phase'] for r in records]
+        self.assertEqual(phases, ['first', 'follow', 'll1_table', 'lr0_automaton',
+            'lalr_table', 'll1_parse', 'll1_generated', 'lalr_parse', 'lalr_generated'])
+        self.assertEqual(records[-1]['accepted'], records[-2]['accepted'])
+        self.assertEqual(bench.compare(records, {'results': records})[0][-1], '1.00')
+
+        phases = [r['phase'] for r in bench.bench('left', 3, count=10, length=20, repeat=1)]
+        self.assertNotIn('ll1_parse', phases)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,291 @@
+"""
+Compile a grammar into a standalone Python recognizer module:
+
+    python codegen.py grammar.txt --method lalr -o expr_parser.py
+
+The module does not import grammar.py. It holds the tables as tuple
+literals and a driver specialized for them, and exposes
+
+    recognize(tokens) -> (accepted, position)
+
+where tokens are terminal names (a string is a sequence of one-character
+terminals) or Tokens, and position is the number of tokens consumed, so
+on a rejection the index of the offending one.
+
+The LL(1) driver consumes the lookahead along with the expansion that
+predicted it when the rule starts with that terminal, and keeps
+non-terminals on its stack as their row offset in the table. The LR
+driver folds a shift into a state whose only action is one reduction
+into a single shift-reduce step.
+
+load(G, method) builds such a module in memory; bench.py measures it
+against the table-driven recognizers.
+"""
+
+import argparse
+import sys
+import textwrap
+import types
+
+from grammar import Grammar
+
+
+NAMES = {'ll1': 'LL(1)', 'lr0': 'LR(0)', 'slr': 'SLR(1)', 'lalr': 'LALR(1)', 'lr1': 'LR(1)'}
+
+
+def _literal(values, indent='    '):
+    # a tuple literal of `values`, wrapped
+    if not values:
+        return '()'
+    text = ', '.join(repr(x) for x in values) + ','
+    lines = textwrap.wrap(text, 96, break_long_words=False, break_on_hyphens=False)
+    return '(\n' + '\n'.join(indent + line for line in lines) + '\n)'
+
+
+def _header(G, method, table):
+    rules = '\n'.join('    ' + G.vrules2str(v) for v in G.rules)
+    rules = rules.replace('\\', '\\\\').replace('"', '\\"') # safe in the docstring
+    terminals = {x: i for i, x in enumerate(table.terminals[:-1])}
+    return '\n'.join([
+        '"""',
+        '%s recognizer generated by codegen.py for the grammar' % NAMES[method],
+        '',
+        rules,
+        '',
+        'recognize(tokens) -> (accepted, position). Standalone: it does not',
+        'import grammar.py.',
+        '"""',
+        '',
+        'METHOD = %r' % method,
+        'AXIOM = %r' % G.axiom,
+        'TERMINALS = %r # name -> id' % terminals,
+        'END = %d' % len(terminals),
+        '',
+    ])
+
+
+LL1_DRIVER = '''
+# RULES[c] is a right side reversed, ready to push: terminal ids, and
+# non-terminals as -(row offset in TABLE)-1. TABLE[row + t] is 0 for an
+# error, c to push RULES[c] and -c to push it and consume the lookahead.
+RULES = %(rules)s
+TABLE = %(table)s
+START = %(start)d
+
+
+def recognize(tokens):
+    terminals = TERMINALS
+    table = TABLE
+    rules = RULES
+    end = END
+    tokens = iter(tokens)
+    stack = [end, START]
+    pop = stack.pop
+    push = stack.extend
+    position = 0
+    token = next(tokens, None)
+    if token is None:
+        t = end
+    else:
+        t = terminals.get(token if token.__class__ is str else token[0], -1)
+        if t < 0:
+            return False, position
+    while True:
+        top = pop()
+        if top >= 0:
+            if top != t:
+                return False, position
+            if t == end:
+                return True, position
+        else:
+            c = table[t - top - 1]
+            if c > 0:
+                push(rules[c])
+                continue
+            if c == 0:
+                return False, position
+            push(rules[-c])
+        position += 1
+        token = next(tokens, None)
+        if token is None:
+            t = end
+        else:
+            t = terminals.get(token if token.__class__ is str else token[0], -1)
+            if t < 0:
+                return False, position
+'''
+
+
+LR_DRIVER = '''
+# ACTION[state*WIDTH + t]: 0 error, 1..NSTATES shift to state-1,
+# NSTATES+1+p shift then reduce p, -(p+1) reduce p, ACCEPT accept.
+# GOTO[state*HEIGHT + v] is the state after reducing to non-terminal v,
+# SIZE[p] and LHS[p] the length and left side of production p.
+WIDTH = %(width)d
+HEIGHT = %(height)d
+NSTATES = %(nstates)d
+ACCEPT = %(accept)d
+ACTION = %(action)s
+GOTO = %(goto)s
+SIZE = %(size)s
+LHS = %(lhs)s
+
+
+def recognize(tokens):
+    terminals = TERMINALS
+    action = ACTION
+    goto = GOTO
+    size = SIZE
+    lhs = LHS
+    width = WIDTH
+    height = HEIGHT
+    nstates = NSTATES
+    accept = ACCEPT
+    end = END
+    tokens = iter(tokens)
+    states = [0]
+    push = states.append
+    state = 0
+    position = 0
+    token = next(tokens, None)
+    if token is None:
+        t = end
+    else:
+        t = terminals.get(token if token.__class__ is str else token[0], -1)
+        if t < 0:
+            return False, position
+    while True:
+        a = action[state*width + t]
+        if a > 0:
+            position += 1
+            token = next(tokens, None)
+            if token is None:
+                t = end
+            else:
+                t = terminals.get(token if token.__class__ is str else token[0], -1)
+                if t < 0:
+                    return False, position
+            if a <= nstates:
+                state = a-1
+                push(state)
+                continue
+            p = a - nstates - 1
+            n = size[p] - 1 # the shifted symbol was never pushed
+        elif a == 0:
+            return False, position
+        elif a == accept:
+            return True, position
+        else:
+            p = -a-1
+            n = size[p]
+        if n:
+            del states[-n:]
+        state = goto[states[-1]*height + lhs[p]]
+        push(state)
+'''
+
+
+def _ll1(G):
+    table = G.ll1()
+    if table.conflicts:
+        raise ValueError("the grammar is not %s: its table has conflicts" % NAMES['ll1'])
+    width = len(table.terminals)
+    # a non-terminal v is stored as -(offset of its row)-1
+    code = lambda x: x if x < width else -((x - width) * width) - 1
+    rules = [None]
+    ids = {}
+    cells = [0] * len(table.table)
+    for cell, p in enumerate(table.table):
+        if p < 0:
+            continue
+        rhs = table.productions[p][1]
+        consume = bool(rhs) and rhs[0] == cell % width
+        if consume:
+            rhs = rhs[1:]
+        expand = tuple(code(x) for x in reversed(rhs))
+        if expand not in ids:
+            ids[expand] = len(rules)
+            rules.append(expand)
+        cells[cell] = -ids[expand] if consume else ids[expand]
+    return _header(G, 'll1', table) + LL1_DRIVER % {
+        'rules': _literal(rules),
+        'table': _literal(cells),
+        'start': code(table.axiom),
+    }
+
+
+def _lr(G, method):
+    table = G.lr_table(method)
+    if table.conflicts:
+        raise ValueError("the grammar is not %s: its table has conflicts" % NAMES[method])
+    width = len(table.terminals)
+    nstates = table.nstates
+    sizes = table._sizes
+    # states whose only action is one reduction, whatever the lookahead
+    default = {}
+    for s in range(nstates):
+        row = set(table.action[s*width:(s+1)*width]) - {0}
+        if len(row) == 1:
+            a, = row
+            if a < 0 and a != table.accept:
+                default[s] = -a-1
+    action = list(table.action)
+    for cell, a in enumerate(action):
+        if a > 0 and a-1 in default:
+            p = default[a-1]
+            rhs = table.productions[p][1]
+            if rhs and rhs[-1] == cell % width:
+                action[cell] = nstates + 1 + p
+    return _header(G, method, table) + LR_DRIVER % {
+        'width': width,
+        'height': len(table.nonterminals),
+        'nstates': nstates,
+        'accept': table.accept,
+        'action': _literal(action),
+        'goto': _literal(list(table.goto)),
+        'size': _literal(sizes),
+        'lhs': _literal(table._lhs),
+    }
+
+
+def generate(G, method='ll1'):
+    # source of a standalone recognizer module for G with the 'll1' table
+    # or an LR table ('lr0', 'slr', 'lalr', 'lr1'); ValueError when that
+    # table has conflicts
+    if method == 'll1':
+        return _ll1(G)
+    return _lr(G, method)
+
+
+def load(G, method='ll1', name=None):
+    # the generated module, compiled and imported without a file
+    source = generate(G, method)
+    module = types.ModuleType(name or 'generated_%s' % method)
+    exec(compile(source, '<codegen %s>' % method, 'exec'), module.__dict__)
+    return module
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a grammar into a standalone recognizer module.")
+    parser.add_argument('grammar', help="grammar file, one rule per line")
+    parser.add_argument('--method', default='ll1', choices=list(NAMES))
+    parser.add_argument('-o', '--out', help="module file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with open(args.grammar, encoding='utf-8') as f:
+        G = Grammar.from_text(f.read())
+    try:
+        source = generate(G, args.method)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import codegen
+from grammar import Grammar, Token
+
+
+class TestCodegen(unittest.TestCase):
+
+    def setUp(self):
+        self.G = Grammar.from_text("""
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """)
+
+    def test_recognize(self):
+        inputs = ["a+a∗a", "(a+a)∗a", "a+", "a∗(a", "", "a?a", "(" * 5000 + "a" + ")" * 5000]
+        for method in ('ll1', 'slr', 'lalr', 'lr1'):
+            module = codegen.load(self.G, method)
+            table = self.G.ll1() if method == 'll1' else self.G.lr_table(method)
+            for s in inputs:
+                expected = table.recognize(s)
+                self.assertEqual(module.recognize(s), (expected.accepted, expected.position), (method, s))
+            tokens = [Token('a', 'x', 0), Token('+', '+', 1), Token('a', 'y', 2)]
+            self.assertEqual(module.recognize(tokens), (True, 3))
+
+        G = Grammar.from_text("S → Aa | Bb | ac\nA → a\nB → a")
+        with self.assertRaises(ValueError):
+            codegen.generate(G, 'll1')
+        self.assertEqual(codegen.load(G, 'slr').recognize("ab"), (True, 2))
+
+    def test_standalone(self):
+        # the written module runs in a fresh interpreter without grammar.py
+        with tempfile.TemporaryDirectory() as tmp:
+            grammar = os.path.join(tmp, 'grammar.txt')
+            with open(grammar, 'w', encoding='utf-8') as f:
+                f.write("S → (S) | a\n")
+            out = os.path.join(tmp, 'parens.py')
+            self.assertEqual(codegen.main([grammar, '--method', 'lalr', '-o', out]), 0)
+            script = ("import sys; sys.modules['grammar'] = None; import parens; "
+                "print(parens.recognize('((a))'), parens.recognize('((a)'))")
+            result = subprocess.run([sys.executable, '-c', script], cwd=tmp,
+                capture_output=True, text=True, check=True)
+            self.assertEqual(result.stdout.strip(), "(True, 5) (False, 4)")
+
+
+if __name__ == '__main__':
+    unittest.main()
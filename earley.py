@@ -0,0 +1,270 @@
+"""
+Earley parsing for any context-free grammar, straight from Grammar.rules:
+no table has to be conflict-free.
+
+Item set i holds the items (production, dot, origin) that are valid after
+the first i tokens, and indexes them by the symbol after their dot, so
+scanning a token and completing a non-terminal only touch the items
+waiting for that symbol. Nullable non-terminals follow Aycock and
+Horspool: predicting one also moves the dot over it, so epsilon rules need
+no special completion pass. Leo's optimization stands a single topmost
+item for each deterministic chain of completions, which keeps right
+recursion linear.
+
+With tree=True the result holds the shared packed parse forest of the
+input (see glr.Forest), built top-down from the item sets once the input
+is accepted; completions skipped by Leo's optimization are replayed then.
+
+    G = Grammar.from_text("E → E+E | a")
+    result = earley.parse(G, "a+a+a", tree=True)
+    result.tree.count()   # 2
+"""
+
+from glr import Forest, Node
+from grammar import ParseResult, Token
+
+
+class EarleyParser:
+    # Earley driver over a Grammar; build one per grammar and reuse it.
+    # Items are (LR(0) item id, origin); item ids follow the productions,
+    # the augmented S' → axiom being the last.
+
+    def __init__(self, G):
+        terminals, nonterminals = G.symbol_table()
+        self.symbols = terminals + nonterminals
+        self.width = len(terminals)
+        self.index = {x: i for i, x in enumerate(self.symbols)}
+        index = self.index
+        self.productions = [(index[v], tuple(index[x] for x in rule))
+                for v, rule in G.productions()]
+        self.productions.append((-1, (index[G.axiom],)))
+        self.base = [] # first item id of each production
+        self.prod = [] # production of each item
+        self.next = [] # symbol after the dot, -1 for a complete item
+        self.predict = {index[v]: [] for v in nonterminals} # v -> items (v → •rule)
+        for p, (v, rule) in enumerate(self.productions):
+            self.base.append(len(self.prod))
+            self.predict.setdefault(v, []).append(len(self.prod))
+            for i in range(len(rule)+1):
+                self.prod.append(p)
+                self.next.append(rule[i] if i < len(rule) else -1)
+        self.nullable = {index[v] for v in G.V() if G.is_nullable(v)}
+        self.start = self.base[-1]
+        self.accept = self.base[-1] + 1
+
+    def parse(self, tokens, tree=False):
+        # ParseResult whose tree, with tree=True, is the Forest of the input
+        width = self.width
+        end = width - 1
+        index = self.index
+        prod = self.prod
+        next_symbol = self.next
+        predict = self.predict
+        nullable = self.nullable
+        lhs = [v for v, _ in self.productions]
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        waiting = [] # per set: symbol -> items whose dot is before it
+        done = [] # per set: (production, origin) of its complete items
+        leos = [] # per set: (origin, symbol) of the completions Leo skipped
+        links = [] # per set: item -> where the symbol before its dot starts
+        leo = [] # per set: symbol -> topmost complete item or None
+
+        def topmost(j, v):
+            # Leo's topmost item for completing v from set j: while the only
+            # item waiting for v is A → α•v, completing v completes A too
+            chain = {}
+            top = None
+            while True:
+                memo = leo[j]
+                if v in memo:
+                    top = memo[v] or top
+                    break
+                items = waiting[j].get(v)
+                if items is None or len(items) != 1 or next_symbol[items[0][0]+1] != -1:
+                    memo[v] = None
+                    break
+                chain[j, v] = True
+                item, origin = items[0]
+                top = item+1, origin
+                j, v = origin, lhs[prod[item]]
+                if (j, v) in chain:
+                    break # a cycle of unit rules
+            for j, v in chain:
+                leo[j][v] = top
+            return top
+
+        i = 0
+        items = {(self.start, 0)}
+        todo = [(self.start, 0)]
+        token = next(tokens, None)
+        kept = []
+        while True:
+            index_i = {}
+            waiting.append(index_i)
+            leo.append({})
+            complete = []
+            skipped = []
+            split = {} # filled with tree=True only
+            predicted = set()
+            add = todo.append
+            while todo:
+                x = todo.pop()
+                item, origin = x
+                y = next_symbol[item]
+                if y >= 0:
+                    index_i.setdefault(y, []).append(x)
+                    if y >= width:
+                        if y not in predicted:
+                            predicted.add(y)
+                            for z in predict[y]:
+                                if (z, i) not in items:
+                                    items.add((z, i))
+                                    add((z, i))
+                        if y in nullable:
+                            if tree:
+                                split.setdefault((item+1, origin), set()).add(i)
+                            if (item+1, origin) not in items:
+                                items.add((item+1, origin))
+                                add((item+1, origin))
+                    continue
+                p = prod[item]
+                complete.append((p, origin))
+                v = lhs[p]
+                if origin == i:
+                    # v is nullable: later items waiting for it skip it
+                    # on their own, the ones already here move now
+                    for item, o in index_i.get(v, ()):
+                        if tree:
+                            split.setdefault((item+1, o), set()).add(i)
+                        if (item+1, o) not in items:
+                            items.add((item+1, o))
+                            add((item+1, o))
+                    continue
+                top = topmost(origin, v)
+                if top is not None:
+                    skipped.append((origin, v))
+                    if top not in items:
+                        items.add(top)
+                        add(top)
+                    continue
+                for item, o in waiting[origin].get(v, ()):
+                    if tree:
+                        split.setdefault((item+1, o), set()).add(origin)
+                    if (item+1, o) not in items:
+                        items.add((item+1, o))
+                        add((item+1, o))
+            if tree:
+                done.append(complete)
+                leos.append(skipped)
+                links.append(split)
+            if token is None:
+                if (self.accept, 0) in items:
+                    forest = None
+                    if tree:
+                        forest = self._forest(kept, done, leos, links, waiting)
+                    return ParseResult(True, i, forest)
+                return ParseResult(False, i)
+            t = terminal(token)
+            items = set()
+            for item, origin in index_i.get(t, ()) if t >= 0 else ():
+                items.add((item+1, origin))
+            if not items:
+                return ParseResult(False, i)
+            if tree:
+                kept.append(token)
+            todo = list(items)
+            token = next(tokens, None)
+            i += 1
+
+    def recognize(self, tokens):
+        return self.parse(tokens)
+
+    def _forest(self, tokens, done, leos, links, waiting):
+        # the Forest of an accepted input, from the axiom spanning all of it.
+        # links[i][(item, origin)] lists where the symbol before the dot
+        # starts, so an alternative's children are found right to left.
+        width = self.width
+        productions = self.productions
+        base = self.base
+        prod = self.prod
+        rhs = [rule for _, rule in productions]
+        lhs = [v for v, _ in productions]
+        completed = {}
+
+        def completions(i):
+            # symbol -> origin -> productions completed in set i, replaying
+            # the chains Leo's optimization went up in one step
+            if i in completed:
+                return completed[i]
+            result = {}
+            for p, origin in done[i]:
+                result.setdefault(lhs[p], {}).setdefault(origin, []).append(p)
+            split = links[i]
+            for j, v in leos[i]:
+                while True:
+                    (item, origin), = waiting[j][v]
+                    split.setdefault((item+1, origin), set()).add(j)
+                    p = prod[item]
+                    found = result.setdefault(lhs[p], {}).setdefault(origin, [])
+                    if p in found:
+                        break # the rest of the chain is known already
+                    found.append(p)
+                    j, v = origin, lhs[p]
+            completed[i] = result
+            return result
+
+        nodes = {}
+        pending = []
+        def node(x, start, end):
+            key = x, start, end
+            n = nodes.get(key)
+            if n is None:
+                if x < width:
+                    n = Node(x, start, end, tokens[start])
+                else:
+                    n = Node(x, start, end)
+                    pending.append(n)
+                nodes[key] = n
+            return n
+
+        memo = {}
+        def splits(item, start, end):
+            # the children lists of the symbols before the dot of `item`
+            # deriving tokens start..end
+            key = item, start, end
+            if key in memo:
+                return memo[key]
+            p = prod[item]
+            dot = item - base[p]
+            if dot == 0:
+                result = [()] if start == end else []
+            elif rhs[p][dot-1] < width:
+                leaf = node(rhs[p][dot-1], end-1, end)
+                result = [kids + (leaf,) for kids in splits(item-1, start, end-1)]
+            else:
+                result = []
+                for m in links[end].get((item, start), ()):
+                    child = node(rhs[p][dot-1], m, end)
+                    result.extend(kids + (child,) for kids in splits(item-1, start, m))
+            memo[key] = result
+            return result
+
+        root = node(rhs[-1][0], 0, len(tokens))
+        while pending:
+            parent = pending.pop()
+            for p in completions(parent.end).get(parent.symbol, {}).get(parent.start, ()):
+                for kids in splits(base[p] + len(rhs[p]), parent.start, parent.end):
+                    parent.alternatives.append((p, kids))
+        return Forest(self.symbols, width, productions, root)
+
+
+def parse(G, s, tree=False):
+    # Earley parse of an input string or token list
+    return EarleyParser(G).parse(G.tokens(s), tree)
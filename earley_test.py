@@ -0,0 +1,60 @@
+import unittest
+
+import earley
+from grammar import Grammar
+
+
+class TestEarley(unittest.TestCase):
+
+    def test_ambiguous(self):
+        G = Grammar.from_text("E → E+E | E∗E | (E) | a")
+        counts = {"a": 1, "a+a": 1, "a+a+a": 2, "a+a∗a+a": 5, "a+a+a+a+a": 14, "(a+a)+a": 1}
+        parser = earley.EarleyParser(G)
+        for s, count in counts.items():
+            result = parser.parse(s, tree=True)
+            self.assertTrue(result, s)
+            self.assertEqual(result.tree.count(), count, s)
+            self.assertEqual(result.tree.tree().text(), s)
+        for s, position in {"a+": 2, "+a": 0, "": 0, "a)": 1, "a-a": 1}.items():
+            result = parser.parse(s)
+            self.assertFalse(result)
+            self.assertEqual(result.position, position, s)
+
+    def test_nullable(self):
+        # Aycock and Horspool's example, and a grammar neither LL(1) nor LR(1)
+        G = Grammar.from_text("S → AAAA\nA → a | E\nE → ɛ")
+        self.assertEqual([bool(earley.parse(G, "a" * n)) for n in range(6)],
+            [True, True, True, True, True, False])
+        self.assertEqual(earley.parse(G, "aa", tree=True).tree.count(), 6)
+        G = Grammar.from_text("S → aSa | bSb | a | b | ɛ")
+        self.assertTrue(G.lr_table('lr1').conflicts)
+        self.assertEqual([bool(earley.parse(G, s)) for s in ["abba", "abaaba", "aba", "ab", "abb"]],
+            [True, True, True, False, False])
+        G = Grammar.from_text("S → S | b")
+        self.assertEqual(earley.parse(G, "b", tree=True).tree.count(), float('inf'))
+
+    def test_right_recursion(self):
+        # Leo's items: the completions of the whole chain come back in the forest
+        G = Grammar('R', {'R': [['x', 'R'], ['y']]})
+        result = earley.parse(G, ['x'] * 3000 + ['y'], tree=True)
+        self.assertTrue(result)
+        self.assertEqual(result.tree.count(), 1)
+        self.assertEqual(len(list(result.tree.nodes())), 2*3000 + 2)
+        G = Grammar.from_text("S → aS | ɛ")
+        tree = earley.parse(G, "a" * 2000, tree=True).tree.tree()
+        self.assertEqual(tree.text(), "a" * 2000)
+        self.assertEqual(len(tree), 2*2000 + 1)
+        G = Grammar.from_text("""
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """)
+        for s in ["a+a∗a", "(a+a)∗a", "a+(a∗a+a)∗a"]:
+            expected = G.lr_parse(s, trace=False, tree=True)
+            self.assertEqual(earley.parse(G, s, tree=True).tree.tree().pretty(), expected.tree.pretty())
+
+
+if __name__ == '__main__':
+    unittest.main()
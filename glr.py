@@ -0,0 +1,530 @@
+"""
+Generalized LR parsing over the tables of grammar.LRTable, conflicts
+included, for ambiguous and non-LR grammars.
+
+The parser runs every LR parse at once in a graph-structured stack (GSS):
+one node per (state, input position), so parses that reach the same state
+at the same point share everything below it. Reductions follow Rekers'
+formulation of Tomita's algorithm with Farshi's fix, which stays correct
+for epsilon rules and hidden left recursion. While the input is
+deterministic there is a single stack top and the loop is the plain LR
+one, paying only for the node objects.
+
+With tree=True the result holds a shared packed parse forest: a node per
+(symbol, start, end) listing every way of deriving it, so an input with
+exponentially many parses still gets a polynomial forest.
+
+    G = Grammar.from_text("E → E+E | a")
+    result = glr.parse(G, "a+a+a", tree=True)
+    result.tree.count()   # 2
+"""
+
+from grammar import ParseResult, ParseTree, Token
+
+
+class Node:
+    # a node of the parse forest: `symbol` (an interned symbol id) derives
+    # the tokens start..end. Terminal nodes hold their `token`, the others
+    # their `alternatives`, one (production id, children) per derivation.
+    __slots__ = ('symbol', 'start', 'end', 'token', 'alternatives')
+
+    def __init__(self, symbol, start, end, token=None):
+        self.symbol = symbol
+        self.start = start
+        self.end = end
+        self.token = token
+        self.alternatives = []
+
+    def __repr__(self):
+        return 'Node(%r, %r, %r)' % (self.symbol, self.start, self.end)
+
+
+class Forest:
+    # shared packed parse forest of an accepted input, rooted at the axiom
+    # node spanning the whole input. Cyclic grammars (A → A) give cycles.
+
+    def __init__(self, symbols, width, productions, root):
+        self.symbols = symbols
+        self.width = width
+        self.productions = productions
+        self.root = root
+
+    def nodes(self):
+        # every node reachable from the root, each once
+        seen = {id(self.root)}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            for _, children in node.alternatives:
+                for child in children:
+                    if id(child) not in seen:
+                        seen.add(id(child))
+                        stack.append(child)
+
+    def label(self, node):
+        return self.symbols[node.symbol]
+
+    def ambiguities(self):
+        # the nodes with more than one derivation
+        return [node for node in self.nodes() if len(node.alternatives) > 1]
+
+    def is_ambiguous(self):
+        return any(len(node.alternatives) > 1 for node in self.nodes())
+
+    def count(self):
+        # number of distinct parse trees, float('inf') when the forest has
+        # a cycle
+        counts = {}
+        active = set()
+        def visit(node):
+            # iterative post-order: a node is counted once its children are
+            stack = [(node, False)]
+            while stack:
+                node, expanded = stack.pop()
+                key = id(node)
+                if key in counts:
+                    continue
+                if expanded:
+                    active.discard(key)
+                    total = 0
+                    for _, children in node.alternatives:
+                        product = 1
+                        for child in children:
+                            product *= counts[id(child)]
+                        total += product
+                    counts[key] = total if node.alternatives else 1
+                    continue
+                if key in active:
+                    return False
+                active.add(key)
+                stack.append((node, True))
+                for _, children in node.alternatives:
+                    for child in children:
+                        if id(child) in active:
+                            return False
+                        if id(child) not in counts:
+                            stack.append((child, False))
+            return True
+        if not visit(self.root):
+            return float('inf')
+        return counts[id(self.root)]
+
+    def tree(self):
+        # one parse tree of the forest as a ParseTree: the first derivation
+        # of every node that does not lead back into a node being expanded
+        tree = ParseTree(self.symbols, self.width)
+        expanding = set()
+        # explicit stack of [forest node, tree node, children, their tree
+        # nodes], so deep derivations do not hit the recursion limit
+        stack = []
+        def enter(node):
+            n = tree.add(node.symbol)
+            if not node.alternatives:
+                if node.symbol < self.width:
+                    tree.set_token(n, node.token)
+                return n
+            expanding.add(id(node))
+            for _, children in node.alternatives:
+                if not any(id(child) in expanding for child in children):
+                    break
+            stack.append((node, n, children, []))
+            return None
+        root = enter(self.root)
+        while stack:
+            node, n, children, built = stack[-1]
+            if len(built) < len(children):
+                child = enter(children[len(built)])
+                if child is not None:
+                    built.append(child)
+                continue
+            stack.pop()
+            tree.set_children(n, built)
+            expanding.discard(id(node))
+            if stack:
+                stack[-1][3].append(n)
+            else:
+                root = n
+        tree.root = root
+        return tree
+
+    def as_dict(self):
+        # JSON-ready form: nodes numbered from the root, each with its
+        # symbol, span and either its token or its alternatives
+        ids = {}
+        nodes = []
+        for node in self.nodes():
+            ids[id(node)] = len(nodes)
+            nodes.append(node)
+        result = []
+        for node in nodes:
+            entry = {'symbol': self.label(node), 'start': node.start, 'end': node.end}
+            if node.symbol < self.width:
+                entry['token'] = None if node.token is None else str(node.token)
+            else:
+                entry['alternatives'] = [{
+                        'rule': rule2str(self, p),
+                        'children': [ids[id(child)] for child in children],
+                    } for p, children in node.alternatives]
+            result.append(entry)
+        return {'root': 0, 'nodes': result}
+
+
+def rule2str(forest, p):
+    lhs, rhs = forest.productions[p]
+    sep = '' if all(len(x) == 1 for x in forest.symbols) else ' '
+    return forest.symbols[lhs] + ' → ' + (sep.join(forest.symbols[x] for x in rhs) or 'ɛ')
+
+
+class Head:
+    # a GSS node: LR `state` at input position `level`, with `links` from
+    # each node below to the link (node, forest node of the symbol between)
+    __slots__ = ('state', 'level', 'links')
+
+    def __init__(self, state, level):
+        self.state = state
+        self.level = level
+        self.links = {}
+
+
+class GLRParser:
+    # GLR driver over an LRTable; build one per table and reuse it
+
+    def __init__(self, table):
+        self.table = table
+        width = len(table.terminals)
+        self.cells = {c.row*width + table.index[c.symbol]: c.choices for c in table.conflicts}
+        self.cyclic = cyclic(table.productions)
+
+    def parse(self, tokens, tree=False):
+        # ParseResult whose tree, with tree=True, is the Forest of the input
+        table = self.table
+        width = len(table.terminals)
+        height = len(table.nonterminals)
+        end = width - 1
+        index = table.index
+        action = table.action
+        goto = table.goto
+        accept = table.accept
+        sizes = table._sizes
+        lhs = table._lhs
+        cells = self.cells
+        cyclic = self.cyclic
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        def actions(state):
+            cell = state*width + t
+            if cell in cells:
+                return cells[cell]
+            a = action[cell]
+            return (a,) if a else ()
+
+        def paths(head, n, through):
+            # (bottom node, forest nodes) of every path of n links down from
+            # head; with `through`, only the paths that use that link
+            if n == 0:
+                return [] if through else [(head, ())]
+            # `through` always leaves a node at the current position, so a
+            # path that went below it without using it is dropped
+            # Without a forest the children do not matter: each (node, links
+            # left) is explored once, so many paths to one bottom cost one.
+            found = []
+            stack = [(head, n, (), through is None)]
+            seen = None if tree else set()
+            while stack:
+                head, n, kids, used = stack.pop()
+                if not used and head.level < level:
+                    continue
+                if seen is not None:
+                    if (head, n, used) in seen:
+                        continue
+                    seen.add((head, n, used))
+                links = head.links
+                while n > 1 and len(links) == 1:
+                    # a single way down: no need for the stack
+                    link, = links.values()
+                    used = used or link is through
+                    head, kids, n = link[0], (link[1],) + kids, n-1
+                    if not used and head.level < level:
+                        break
+                    links = head.links
+                else:
+                    if not used:
+                        # only the new link or one that stays at this
+                        # position can still lead to it
+                        links = within.get(head, ())
+                        if through[0].level < level and head.links.get(through[0]) is through:
+                            links = list(links) + [through]
+                        links = {link[0]: link for link in links}
+                    for link in links.values():
+                        if n == 1:
+                            if (used or link is through) and (seen is None or link[0] not in seen):
+                                if seen is not None:
+                                    seen.add(link[0])
+                                found.append((link[0], (link[1],) + kids))
+                        else:
+                            stack.append((link[0], n-1, (link[1],) + kids, used or link is through))
+            return found
+
+        def reduce(head, p, through=None):
+            v = lhs[p]
+            for bottom, kids in paths(head, sizes[p], through):
+                state = goto[bottom.state*height + v]
+                symbol = None
+                if tree:
+                    key = v, bottom.level
+                    symbol = symbols.get(key)
+                    if symbol is None:
+                        symbol = symbols[key] = Node(v + width, bottom.level, level)
+                    if (symbol, p, kids) not in packed:
+                        packed.add((symbol, p, kids))
+                        symbol.alternatives.append((p, kids))
+                top = active.get(state)
+                if top is None:
+                    top = active[state] = Head(state, level)
+                    top.links[bottom] = (bottom, symbol)
+                    if bottom.level == level:
+                        above.setdefault(bottom, []).append(top)
+                        within[top] = [top.links[bottom]]
+                    pending.append(top)
+                elif bottom not in top.links:
+                    # a new way down for a top already processed: the
+                    # processed heads that reach it within this position
+                    # redo their reductions along the new link only
+                    link = top.links[bottom] = (bottom, symbol)
+                    if bottom.level == level:
+                        above.setdefault(bottom, []).append(top)
+                        within.setdefault(top, []).append(link)
+                    reached = {top}
+                    stack = [top]
+                    while stack:
+                        other = stack.pop()
+                        if other in done:
+                            for a in actions(other.state):
+                                if a < 0 and a != accept and sizes[-a-1]:
+                                    limited.append((other, -a-1, link))
+                        for head in above.get(other, ()):
+                            if head not in reached:
+                                reached.add(head)
+                                stack.append(head)
+
+        def linear(head):
+            # the (states, nodes, levels) lists of the stack under head when
+            # it is a single path down to the bottom, else None
+            states, nodes, levels = [], [], []
+            while len(head.links) == 1:
+                below, node = next(iter(head.links.values()))
+                states.append(head.state)
+                nodes.append(node)
+                levels.append(head.level)
+                head = below
+            if head.links:
+                return None
+            states.append(head.state)
+            nodes.append(None)
+            levels.append(head.level)
+            return states[::-1], nodes[::-1], levels[::-1]
+
+        # Deterministic stretches run on a plain LR stack: parallel lists of
+        # states, forest nodes and the position where each entry starts.
+        # The stack moves into the GSS at the first conflicted cell and back
+        # once a single linear stack is left.
+        states, nodes, levels = [0], [None], [0]
+        active = None
+        level = 0
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        while t >= 0:
+            if states is not None:
+                cell = states[-1]*width + t
+                while cell not in cells:
+                    a = action[cell]
+                    if a > 0:
+                        states.append(a-1)
+                        nodes.append(Node(t, level, level+1, token) if tree else None)
+                        level += 1
+                        levels.append(level)
+                        token = next(tokens, None)
+                        t = end if token is None else terminal(token)
+                        if t < 0:
+                            return ParseResult(False, level)
+                    elif a == accept:
+                        forest = Forest(table.symbols, width, table.productions, nodes[-1]) if tree else None
+                        return ParseResult(True, level, forest)
+                    elif a < 0:
+                        p = -a-1
+                        n = sizes[p]
+                        state = goto[states[-n-1]*height + lhs[p]]
+                        if p in cyclic:
+                            break # reductions that may go round in circles
+                        # a state already on the stack at this position
+                        # means the reductions in between derived nothing
+                        # and may repeat forever: leave it to the GSS
+                        k = len(states) - n
+                        i = k
+                        while i and levels[i-1] == level:
+                            i -= 1
+                        if state in states[i:k]:
+                            break
+                        node = None
+                        if tree:
+                            node = Node(lhs[p] + width, levels[-n-1], level)
+                            node.alternatives.append((p, tuple(nodes[len(nodes)-n:])))
+                        if n:
+                            del states[-n:], nodes[-n:], levels[-n:]
+                        states.append(state)
+                        nodes.append(node)
+                        levels.append(level)
+                    else:
+                        return ParseResult(False, level)
+                    cell = states[-1]*width + t
+                # the stack as a chain of GSS nodes; the entries already at
+                # this position count as processed, the top is pending
+                symbols = {}
+                packed = set()
+                above = {} # GSS node -> the nodes linked to it within this position
+                within = {} # GSS node -> its links to nodes at this position
+                active = {}
+                below = None
+                for state, node, start in zip(states, nodes, levels):
+                    head = Head(state, start)
+                    if below is not None:
+                        if start == level and tree and node.symbol >= width:
+                            # one forest node per symbol and span: repeated
+                            # epsilon reductions made one each
+                            key = node.symbol - width, below.level
+                            shared = symbols.setdefault(key, node)
+                            for p, kids in node.alternatives:
+                                if (shared, p, kids) not in packed:
+                                    packed.add((shared, p, kids))
+                                    if shared is not node:
+                                        shared.alternatives.append((p, kids))
+                            node = shared
+                        head.links[below] = (below, node)
+                    if start == level:
+                        active[state] = head
+                        if below is not None and below.level == level:
+                            above[below] = [head]
+                            within[head] = [head.links[below]]
+                    below = head
+                pending = [below]
+                done = set(active.values())
+                done.discard(below)
+                states = None
+            else:
+                symbols = {} # (non-terminal, start) -> forest node ending here
+                packed = set() # (forest node, production, children) already added
+                above = {}
+                within = {}
+                pending = list(active.values())
+                done = set()
+
+            shifts = []
+            root = None
+            limited = [] # (head, production, link): reductions along a new link
+            while pending or limited:
+                if limited:
+                    reduce(*limited.pop())
+                    continue
+                head = pending.pop()
+                done.add(head)
+                for a in actions(head.state):
+                    if a > 0:
+                        shifts.append((head, a-1))
+                    elif a == accept:
+                        root = next(iter(head.links.values()))[1] if tree else True
+                    else:
+                        reduce(head, -a-1)
+            if root is not None:
+                forest = None
+                if tree:
+                    forest = Forest(table.symbols, width, table.productions, root)
+                return ParseResult(True, level, forest)
+            if not shifts:
+                break
+            leaf = Node(t, level, level+1, token) if tree else None
+            level += 1
+            active = {}
+            for head, state in shifts:
+                top = active.get(state)
+                if top is None:
+                    top = active[state] = Head(state, level)
+                top.links[head] = (head, leaf)
+            token = next(tokens, None)
+            t = end if token is None else terminal(token)
+            if len(active) == 1:
+                states = linear(next(iter(active.values())))
+                if states is not None:
+                    states, nodes, levels = states
+        return ParseResult(False, level)
+
+    def recognize(self, tokens):
+        return self.parse(tokens)
+
+
+def cyclic(productions):
+    # the productions of the non-terminals A with A ⇒+ A, whose reductions
+    # can loop without consuming input
+    nullable = set()
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhs in productions:
+            if lhs not in nullable and all(x in nullable for x in rhs):
+                nullable.add(lhs)
+                changed = True
+    # A → α B β with α and β nullable: A ⇒+ B
+    units = {}
+    for lhs, rhs in productions:
+        for i, x in enumerate(rhs):
+            if all(y in nullable for j, y in enumerate(rhs) if j != i):
+                units.setdefault(lhs, set()).add(x)
+    # A ⇒+ A when A has a unit self-loop or shares a strongly connected
+    # component of the unit graph (iterative Tarjan) with another symbol
+    looping = {v for v, xs in units.items() if v in xs}
+    index, low = {}, {}
+    component = []
+    for root in units:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        component.append(root)
+        on = {root}
+        stack = [(root, iter(units[root]))]
+        while stack:
+            v, edges = stack[-1]
+            for x in edges:
+                if x not in index:
+                    index[x] = low[x] = len(index)
+                    component.append(x)
+                    on.add(x)
+                    stack.append((x, iter(units.get(x, ()))))
+                    break
+                if x in on:
+                    low[v] = min(low[v], index[x])
+            else:
+                stack.pop()
+                if stack:
+                    u = stack[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    i = len(component) - 1
+                    while component[i] != v:
+                        i -= 1
+                    members = component[i:]
+                    del component[i:]
+                    on.difference_update(members)
+                    if len(members) > 1:
+                        looping.update(members)
+    return {p for p, (lhs, _) in enumerate(productions) if lhs in looping}
+
+
+def parse(G, s, kind='lalr', tree=False):
+    # GLR parse of an input string or token list with G's `kind` LR table
+    return GLRParser(G.lr_table(kind)).parse(G.tokens(s), tree)
@@ -0,0 +1,99 @@
+import time
+import unittest
+
+import glr
+from grammar import Grammar
+
+
+class TestGLR(unittest.TestCase):
+
+    def test_ambiguous(self):
+        G = Grammar.from_text("E → E+E | E∗E | (E) | a")
+        self.assertTrue(G.lr_table('lalr').conflicts)
+        counts = {"a": 1, "a+a": 1, "a+a+a": 2, "a+a∗a+a": 5, "a+a+a+a+a": 14, "(a+a)+a": 1}
+        for s, count in counts.items():
+            result = glr.parse(G, s, tree=True)
+            self.assertTrue(result, s)
+            self.assertEqual(result.tree.count(), count, s)
+            self.assertEqual(result.tree.is_ambiguous(), count > 1)
+            self.assertEqual(result.tree.tree().text(), s)
+        for s, position in {"a+": 2, "+a": 0, "": 0, "a)": 1}.items():
+            result = glr.parse(G, s)
+            self.assertFalse(result)
+            self.assertEqual(result.position, position, s)
+
+        forest = glr.parse(G, "a+a+a", tree=True).tree
+        (node,) = forest.ambiguities()
+        self.assertEqual((forest.label(node), node.start, node.end), ('E', 0, 5))
+        self.assertEqual(forest.as_dict()['nodes'][0]['alternatives'][0]['rule'], 'E → E+E')
+
+    def test_epsilon(self):
+        # hidden left recursion, and a grammar with infinitely many parses
+        G = Grammar.from_text("S → ASb | c\nA → ɛ")
+        for kind in ('lr0', 'lalr'):
+            self.assertEqual([bool(glr.parse(G, s, kind)) for s in ["c", "cb", "cbbb", "b", "bc"]],
+                [True, True, True, False, False])
+        G = Grammar.from_text("S → SS | a | ɛ")
+        result = glr.parse(G, "aa", 'lr0', tree=True)
+        self.assertTrue(result)
+        self.assertEqual(result.tree.count(), float('inf'))
+        self.assertEqual(result.tree.tree().text(), "aa")
+        # a unit cycle reduced in a cell without conflict
+        G = Grammar.from_text("S → S | b")
+        self.assertEqual([bool(glr.parse(G, s, 'lr0')) for s in ["b", "ba", "bb", ""]],
+            [True, False, False, False])
+        # epsilon and unit reductions that push the same state again
+        G = Grammar.from_text("S → BS | b\nB → A\nA → ɛ")
+        for kind in ('lr0', 'lalr'):
+            self.assertEqual([bool(glr.parse(G, s, kind)) for s in ["b", "", "bb", "a"]],
+                [True, False, False, False])
+        self.assertEqual(glr.parse(G, "b", 'lr0', tree=True).tree.count(), float('inf'))
+
+    def test_deterministic(self):
+        # same answers as the LR driver on a conflict-free table
+        G = Grammar.from_text("""
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """)
+        parser = glr.GLRParser(G.lr_table('lalr'))
+        for s in ["a+a∗a", "(a+a)∗a", "a+", "a∗(a", ""]:
+            expected = G.lr_parse(s, trace=False, tree=True)
+            result = parser.parse(s, tree=True)
+            self.assertEqual((result.accepted, result.position), (expected.accepted, expected.position))
+            if result:
+                self.assertEqual(result.tree.tree().pretty(), expected.tree.pretty())
+
+        G = Grammar.from_text("S → Aa | Bb | ac\nA → a\nB → a")
+        self.assertEqual([bool(glr.parse(G, s, 'lr0')) for s in ["aa", "ab", "ac", "a"]],
+            [True, True, True, False])
+
+    def test_scaling(self):
+        # reductions redone for a new link only follow paths through it
+        G = Grammar.from_text("S → SS | a")
+        parser = glr.GLRParser(G.lr_table('lalr'))
+        start = time.perf_counter()
+        self.assertTrue(parser.parse("a" * 100))
+        self.assertLess(time.perf_counter() - start, 2)
+        # a long nullable unit chain, linear in the grammar size
+        rules = {'S': [['A0', 'b']], 'A3000': [[]]}
+        for i in range(3000):
+            rules['A%d' % i] = [['A%d' % (i+1)], []]
+        table = Grammar('S', rules).lr_table('lalr')
+        start = time.perf_counter()
+        self.assertTrue(glr.GLRParser(table).parse(['b']))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_deep(self):
+        # trees deeper than the recursion limit
+        G = Grammar.from_text("S → (S) | a")
+        s = "(" * 3000 + "a" + ")" * 3000
+        tree = glr.parse(G, s, tree=True).tree.tree()
+        self.assertEqual(tree.text(), s)
+        self.assertEqual(len(tree), 9002)
+
+
+if __name__ == '__main__':
+    unittest.main()
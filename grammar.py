@@ -1,4 +1,10 @@
+import functools
 import itertools
+import re
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 from tabulate import tabulate
 from pprint import pprint as pp
@@ -6,13 +12,129 @@ from pprint import pprint as pp
 """
 TODO:
 - detect grammar conflicts (LL(1), LR(0),..)
-- LR(0) parse
-- LR(1)
-- SLR(1)
-- LALR(1)
-- parse tree + tree traversal with grammar output example
 """
 
+# a table cell with several candidate entries; `row` is a non-terminal (LL)
+# or a state number (LR), `choices` the competing entries in table order
+Conflict = namedtuple('Conflict', 'row symbol choices')
+
+# a syntax error met by a recovering parse: the offending token (None at the
+# end of the input), its index and the terminals that were expected there
+ParseError = namedtuple('ParseError', 'position token expected')
+
+
+def bits(mask):
+    # the positions of the bits set in an int bitmask, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def grid(table, **kwargs):
+    # render a table whose first row holds the column names
+    return tabulate(table[1:], headers=table[0], tablefmt="fancy_grid", **kwargs)
+
+
+def render_steps(steps):
+    return '\n' + grid(steps, stralign="right") + '\n'
+
+
+def digraph(nodes, relation, initial):
+    # DeRemer & Pennello's Digraph algorithm: the smallest F such that
+    # F(x) = initial(x) | F(y) for every y in relation(x).
+    # Strongly connected components are collapsed on the fly, so each
+    # edge is followed once and mutual dependencies cannot loop.
+    # Values are joined with |=: int bitmasks, or sets that initial(x)
+    # returns fresh since they are grown in place and every member of a
+    # component ends up sharing the same one.
+    depth = {x: 0 for x in nodes}
+    done = len(depth) + 1
+    F = {}
+    stack = []
+    for root in nodes:
+        if depth[root]:
+            continue
+        stack.append(root)
+        depth[root] = len(stack)
+        F[root] = initial(root)
+        frames = [(root, len(stack), iter(relation(root)))]
+        while frames:
+            x, d, edges = frames[-1]
+            for y in edges:
+                if depth[y] == 0:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    F[y] = initial(y)
+                    frames.append((y, len(stack), iter(relation(y))))
+                    break
+                if depth[y] < depth[x]:
+                    depth[x] = depth[y]
+                if F[y] is not F[x]:
+                    F[x] |= F[y]
+            else:
+                frames.pop()
+                if depth[x] == d:
+                    while True:
+                        top = stack.pop()
+                        depth[top] = done
+                        F[top] = F[x]
+                        if top == x:
+                            break
+                if frames:
+                    parent = frames[-1][0]
+                    if depth[x] < depth[parent]:
+                        depth[parent] = depth[x]
+                    F[parent] |= F[x]
+    return F
+
+
+class Profile:
+    # opt-in instrumentation, see Grammar.instrument: call count and wall
+    # time per phase, plus counters (states created, table cells filled,
+    # parse steps..). Phase times are inclusive: the first call of a phase
+    # also pays for the analyses it needs that were not built yet.
+
+    def __init__(self):
+        self.phases = {} # name -> [calls, seconds]
+        self.counters = {}
+
+    def add(self, phase, seconds):
+        entry = self.phases.setdefault(phase, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        self.phases.clear()
+        self.counters.clear()
+
+    def as_dict(self):
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in sorted(self.phases.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+
+def instrumented(method):
+    # times a Grammar method into self.profile; a single attribute test
+    # when instrumentation is off
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = self.profile
+        if profile is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profile.add(method.__name__, time.perf_counter() - start)
+    return wrapper
+
+
 class Grammar:
     ARROW = '→'
     EPSILON = 'ɛ'
@@ -20,22 +142,293 @@ class Grammar:
 
     def __init__(self, axiom, rules):
         self.axiom = axiom
+        self.profile = None
         self.rules = rules
 
+    @property
+    def rules(self):
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = rules
+        self.invalidate()
+
+    def invalidate(self):
+        # drop every cached analysis; call it after editing `rules` in place
+        self._cache = {}
+        # the analyses hold sets of terminals as int bitmasks, bit i for
+        # _terminals[i]; terminals are interned as they are met, and edit()
+        # keeps the interning so that the masks it reuses stay valid
+        self._bits = {}
+        self._terminals = []
+
+    def add_production(self, v, rule):
+        self.edit(v, list(self.rules.get(v, ())) + [list(rule)])
+
+    def remove_production(self, v, rule):
+        R = list(self.rules.get(v, ()))
+        if list(rule) not in R:
+            raise ValueError("no production " + self.rule2str(v, rule))
+        R.remove(list(rule))
+        self.edit(v, R)
+
+    def replace_production(self, v, rule, new):
+        R = list(self.rules.get(v, ()))
+        if list(rule) not in R:
+            raise ValueError("no production " + self.rule2str(v, rule))
+        R[R.index(list(rule))] = list(new)
+        self.edit(v, R)
+
+    @instrumented
+    def edit(self, v, rules):
+        # Replace the rules of non-terminal v, keeping the analyses already
+        # built up to date. Only what can see the change is recomputed:
+        # nullable/FNE/FIRST for v and its (transitive) users, FOLLOW for the
+        # symbols of the rules involved and those ending their rules, and
+        # the LL(1) rows of both; the LR(0) automaton keeps the closure of
+        # every state without an item of v. Other LR tables are rebuilt on
+        # demand. Adding or removing a non-terminal starts over.
+        rules = [list(rule) for rule in rules]
+        if v not in self.rules or not rules:
+            if rules:
+                self._rules[v] = rules
+            else:
+                self._rules.pop(v, None)
+            self.invalidate()
+            return
+        old_rules = self.rules[v]
+        # production ids after v's shift by the change in its rule count
+        start = total = 0
+        for u, R in self.rules.items():
+            if u == v:
+                start = total
+            total += len(R)
+        end = start + len(old_rules)
+        delta = len(rules) - len(old_rules)
+        remap = [p if p < start else p + delta for p in range(total + 1)]
+
+        self._rules[v] = rules
+        old = self._cache
+        self._cache = {}
+        profile = self.profile
+        changed = {x for rule in old_rules + rules for x in rule}
+
+        if 'occurrences' in old:
+            occurrences = dict(old['occurrences'])
+            for x in changed:
+                occurrences[x] = [o for o in occurrences.get(x, ()) if o[0] != v]
+            for j, rule in enumerate(rules):
+                for i, x in enumerate(rule):
+                    occurrences[x].append((v, j, i))
+            for x in changed:
+                if not occurrences[x]:
+                    del occurrences[x]
+            self._cache['occurrences'] = occurrences
+
+        scope, follow = set(), set()
+        if 'first' in old:
+            occurrences = self.occurrences()
+            scope = {v}
+            work = [v]
+            while work:
+                for u, _, _ in occurrences.get(work.pop(), ()):
+                    if u not in scope:
+                        scope.add(u)
+                        work.append(u)
+            self._cache['first'] = self._compute_first_sets(old['first'], scope)
+            if profile is not None:
+                profile.count('edit FIRST scope', len(scope))
+        if 'suffixes' in old:
+            self._cache['suffixes'] = self._compute_suffixes(old['suffixes'], scope)
+
+        if 'FOLLOW_all' in old:
+            V = self.V()
+            suffixes = self._suffixes()
+            follow = {x for x in changed if x in V}
+            for u in scope:
+                follow.update(x for rule in self.rules[u] for x in rule if x in V)
+            work = list(follow)
+            while work:
+                u = work.pop()
+                for j, rule in enumerate(self.rules[u]):
+                    for i, x in enumerate(rule):
+                        if x in V and x not in follow and suffixes[u, j, i][1]:
+                            follow.add(x)
+                            work.append(x)
+            self._cache['FOLLOW_all'] = self._compute_FOLLOW_all(old['FOLLOW_all'], follow)
+            if profile is not None:
+                profile.count('edit FOLLOW scope', len(follow))
+
+        if 'll1' in old and old['ll1'].terminals == self.symbol_table()[0]:
+            self._cache['ll1'] = CompiledLL1.from_grammar(self, old['ll1'], scope | follow, remap)
+
+        if 'lr0_items' in old:
+            items = old['lr0_items'].edited(self.productions() + [("S'", [self.axiom])],
+                start, end, len(rules))
+            if items is not None:
+                self._cache['lr0_items'] = items
+        if 'lr0_automaton' in old and 'lr0_items' in self._cache:
+            # the states with an item of v are the ones whose closure may change
+            automaton = old['lr0_automaton']
+            base = old['lr0_items'].base
+            touched = {base[p]+i for p in range(start, end) for i in range(len(old_rules[p-start])+1)}
+            kept = {automaton.kernels[n]: n for n, state in enumerate(automaton.states)
+                if touched.isdisjoint(state)}
+            self._cache['lr0_automaton'] = LR0Automaton(self.lr0_items(), automaton, kept)
+            if profile is not None:
+                profile.count('edit lr0 states kept', len(kept))
+
+    def _bit(self, t):
+        # the mask of terminal t alone
+        i = self._bits.get(t)
+        if i is None:
+            i = self._bits[t] = len(self._terminals)
+            self._terminals.append(t)
+        return 1 << i
+
+    def _terminal_set(self, mask):
+        # the public form of a mask, one frozenset per distinct mask
+        sets = self._cache.setdefault('terminal_sets', {})
+        s = sets.get(mask)
+        if s is None:
+            terminals = self._terminals
+            s = sets[mask] = frozenset(terminals[i] for i in bits(mask))
+        return s
+
+    def _cached(self, key, build):
+        try:
+            return self._cache[key]
+        except KeyError:
+            if self.profile is None:
+                value = self._cache[key] = build()
+                return value
+        # instrumented build: the phase is named after the cache key
+        phase = key if type(key) == str else ':'.join(key)
+        start = time.perf_counter()
+        value = self._cache[key] = build()
+        self.profile.add(phase, time.perf_counter() - start)
+        self._count(key, value)
+        return value
+
+    def _count(self, key, value):
+        # counters derived from a freshly built analysis, so that the
+        # builders themselves carry no bookkeeping
+        profile = self.profile
+        if key == 'lr0_automaton':
+            profile.count('lr0 states', len(value.states))
+            profile.count('lr0 closure items',
+                sum(len(q) - len(k) for k, q in zip(value.kernels, value.states)))
+        elif key == 'lr1_automaton':
+            profile.count('lr1 states', len(value.states))
+        elif key == 'll1':
+            profile.count('ll1 cells', sum(1 for p in value.table if p >= 0))
+            profile.count('ll1 conflicts', len(value.conflicts))
+        elif key[0] == 'lr_table':
+            profile.count('%s cells' % key[1], sum(1 for a in value.action if a)
+                + sum(1 for s in value.goto if s >= 0))
+            profile.count('%s conflicts' % key[1], len(value.conflicts))
+
+    def instrument(self, enabled=True):
+        # start recording analysis phases into self.profile (kept if already
+        # on), or stop with enabled=False. Returns the profile.
+        if not enabled:
+            self.profile = None
+        elif self.profile is None:
+            self.profile = Profile()
+        return self.profile
+
     @staticmethod
-    def from_text(text):
+    def from_text(text, words=None):
+        # By default every character of a right side is a symbol (F → (E) | a).
+        # With words=True, implied when a non-terminal name is longer than one
+        # character or an alternative has spaces inside, symbols are
+        # whitespace-separated words and '...' or "..." quote a terminal
+        # that contains spaces, '|' or the epsilon sign.
+        # Repeated non-terminals add alternatives to the earlier line.
         axiom = None
         rules = {}
         lines = [l.strip() for l in text.split('\n') if len(l.strip()) > 0]
-        for line in lines:
-            arrow = Grammar.ARROW if Grammar.ARROW in line else '->'
-            V, Vrules = [x.strip() for x in line.split(arrow)]
+        lines = [[x.strip() for x in l.split(Grammar.ARROW if Grammar.ARROW in l else '->', 1)]
+                for l in lines]
+        if words is None:
+            words = any(len(V) > 1 or re.search(r'[^\s|]\s+[^\s|]', Vrules)
+                for V, Vrules in lines)
+        for V, Vrules in lines:
             if not axiom:
                 axiom = V
-            Vrules = [list(x.strip().replace(Grammar.EPSILON,'')) for x in Vrules.split('|')]
-            rules[V] = Vrules
+            if words:
+                Vrules = Grammar._split_words(Vrules)
+            else:
+                Vrules = [list(x.strip().replace(Grammar.EPSILON,'')) for x in Vrules.split('|')]
+            rules.setdefault(V, []).extend(Vrules)
         return Grammar(axiom=axiom, rules=rules)
 
+    WORD = re.compile(r"""'[^']*'|"[^"]*"|\||[^\s|]+""")
+
+    @staticmethod
+    def _split_words(text):
+        alternatives = [[]]
+        for word in Grammar.WORD.findall(text):
+            if word == '|':
+                alternatives.append([])
+            elif word[0] in '\'"':
+                if len(word) > 2:
+                    alternatives[-1].append(word[1:-1])
+            elif word != Grammar.EPSILON:
+                alternatives[-1].append(word)
+        return alternatives
+
+    def sep(self):
+        # how symbols are joined for display: '' when they are all one character
+        return self._cached('sep',
+            lambda: '' if all(len(x) == 1 for x in itertools.chain(self.V(), self.T())) else ' ')
+
+    def tokenizer(self, patterns=None):
+        # Tokenizer for input strings, see Tokenizer.for_grammar
+        if patterns:
+            return Tokenizer.for_grammar(self, patterns)
+        return self._cached('tokenizer', lambda: Tokenizer.for_grammar(self))
+
+    def tokens(self, s):
+        # the token stream of an input: strings are split into characters
+        # when every symbol is one character and tokenized otherwise;
+        # lists and other iterables of symbols or Tokens pass through
+        if type(s) == str and self.sep():
+            return self.tokenizer().tokenize(s)
+        return s
+
+    def parse_many(self, inputs, workers=1, method='ll1', chunk_size=256, tokenizer=None,
+            recover=False, max_errors=100):
+        # accept/reject every input (a string or a token list) with the
+        # 'll1' table or an LR table ('lalr', 'slr',..), yielding ParseResults
+        # in input order. The table is built once; with workers > 1 it is
+        # sent once to each process of a pool, inputs travel in chunks and
+        # only a few chunks per worker are in flight, so `inputs` may be a
+        # stream of any length. recover=True collects the errors of each
+        # input in one pass, as parse(recover=True) does.
+        table = self.ll1() if method == 'll1' else self.lr_table(method)
+        if tokenizer is None and self.sep():
+            tokenizer = self.tokenizer()
+        batch = table, tokenizer, max_errors if recover else None
+        inputs = iter(inputs)
+        chunks = iter(lambda: list(itertools.islice(inputs, chunk_size)), [])
+        if workers <= 1:
+            for chunk in chunks:
+                for result in _recognize_chunk(chunk, batch):
+                    yield ParseResult(*result)
+            return
+        with ProcessPoolExecutor(workers, initializer=_init_batch, initargs=batch) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_recognize_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    for result in pending.popleft().result():
+                        yield ParseResult(*result)
+            while pending:
+                for result in pending.popleft().result():
+                    yield ParseResult(*result)
+
     def V(self): #non-terminals
         return self.rules.keys()
 
@@ -46,113 +439,256 @@ class Grammar:
         return x in self.V()
 
     def T(self): #terminals
+        return self._cached('T', self._compute_T)
+
+    def _compute_T(self):
         flat = lambda L: itertools.chain(*L)
-        return set(x for x in flat(flat(self.rules.values())) if self.is_terminal(x))
+        return frozenset(x for x in flat(flat(self.rules.values())) if self.is_terminal(x))
+
+    def _first_sets(self):
+        return self._cached('first', self._compute_first_sets)
+
+    def _compute_first_sets(self, previous=None, scope=None):
+        # nullable and FNE of every non-terminal as one least fixed point:
+        # a non-terminal is re-examined only when a symbol it uses has grown.
+        # With the `previous` sets, only the non-terminals in `scope` start
+        # over; it must hold every user of its members (see edit).
+        rules = self.rules
+        bit = self._bit
+        if previous is None:
+            scope = rules
+            nullable = set()
+            FNE = {v: 0 for v in rules}
+        else:
+            nullable = set(previous[0] - scope)
+            FNE = {v: 0 if v in scope else previous[1][v] for v in rules}
+        users = {v: set() for v in scope}
+        for v in scope:
+            for rule in rules[v]:
+                for symbol in rule:
+                    if symbol in users:
+                        users[symbol].add(v)
+
+        work = list(scope)
+        queued = set(work)
+        while work:
+            v = work.pop()
+            queued.discard(v)
+            vFNE = old = FNE[v]
+            was_nullable = v in nullable
+            for rule in rules[v]:
+                for symbol in rule:
+                    if symbol in FNE:
+                        vFNE |= FNE[symbol]
+                        if symbol not in nullable:
+                            break
+                    else:
+                        vFNE |= bit(symbol)
+                        break
+                else:
+                    nullable.add(v)
+            FNE[v] = vFNE
+            if vFNE != old or (v in nullable) != was_nullable:
+                for u in users[v]:
+                    if u not in queued:
+                        queued.add(u)
+                        work.append(u)
+
+        kept = {} if previous is None else previous[2]
+        rule_FNE = {}
+        for v, R in rules.items():
+            for rule in R:
+                key = tuple(rule)
+                if key not in rule_FNE:
+                    if v not in scope and key in kept:
+                        rule_FNE[key] = kept[key]
+                    else:
+                        rule_FNE[key] = self._rule_FNE(rule, nullable, FNE)
+        return frozenset(nullable), FNE, rule_FNE
+
+    def _rule_FNE(self, rule, nullable, FNE):
+        result = 0
+        for symbol in rule:
+            if symbol in FNE:
+                result |= FNE[symbol]
+                if symbol not in nullable:
+                    break
+            else:
+                result |= self._bit(symbol)
+                break
+        return result
 
     def is_nullable(self, x):
-        if self.is_terminal(x):
-            return False
-        R = self.rules[x]
-        for rule in R:
-            nullable = all(self.is_nullable(s) for s in rule)
-            if nullable:
-                return True
-        return False
+        return x in self._first_sets()[0]
 
     def is_list_nullable(self,l):
-        return all(self.is_nullable(x) for x in l)
+        nullable = self._first_sets()[0]
+        return all(x in nullable for x in l)
 
     def FNE_rule(self, rule):
-        FNE = set()
-        for symbol in rule:
-            subFNE = self.FNE(symbol)
-            nullable = self.is_nullable(symbol)
-            FNE |= subFNE
-            if not nullable:
-                break
-        return FNE
+        return self._terminal_set(self._FNE_rule(rule))
 
+    def _FNE_rule(self, rule):
+        nullable, FNE, rule_FNE = self._first_sets()
+        key = tuple(rule)
+        if key in rule_FNE:
+            return rule_FNE[key]
+        return self._rule_FNE(rule, nullable, FNE)
+
+    @instrumented
     def FNE(self, x):
         if self.is_terminal(x):
-            return {x}
-        FNE = set()
-        R = self.rules[x]
-        for rule in R:
-            FNE |= self.FNE_rule(rule)
-        return FNE
+            return frozenset((x,))
+        return self._terminal_set(self._first_sets()[1][x])
 
+    @instrumented
     def FIRST(self, x):
-        FNE = self.FNE(x)
-        if self.is_nullable(x):
-            FNE.add('')
-        return FNE
-
-    def FOLLOW(self, x):
         if self.is_terminal(x):
-            return {x}
-        FOLLOW = set()
-
-        #rule 1
-        if x == self.axiom:
-            FOLLOW.add("$")
-
-        for V in self.V():
-            for rule in self.rules[V]:
+            return frozenset((x,))
+        FNE = self._terminal_set(self._first_sets()[1][x])
+        return FNE | {''} if self.is_nullable(x) else FNE
+
+    def occurrences(self):
+        # symbol -> [(non-terminal, rule index, position)] of every use in a right side
+        return self._cached('occurrences', self._compute_occurrences)
+
+    def _compute_occurrences(self):
+        index = {}
+        for V, R in self.rules.items():
+            for j, rule in enumerate(R):
                 for i, symbol in enumerate(rule):
-                    if symbol == x:
-                        if i+1 < len(rule):
-                            #rule 2
-                            symbol_next = rule[i+1]
-                            FOLLOW |= self.FNE(symbol_next)
-
-                        #rule 3
-                        all_next = rule[i+1:]
-                        if self.is_list_nullable(all_next):
-                            if V != x:
-                                FOLLOW |= self.FOLLOW(V)
-
+                    index.setdefault(symbol, []).append((V, j, i))
+        return index
+
+    def _suffixes(self):
+        # (FNE mask, nullable) of rule[i+1:] for every (non-terminal, rule index, position)
+        return self._cached('suffixes', self._compute_suffixes)
+
+    def _compute_suffixes(self, previous=None, scope=None):
+        # with `previous`, only the rules of the non-terminals in `scope`
+        nullable, FNE, _ = self._first_sets()
+        if previous is None:
+            scope = self.rules
+            suffixes = {}
+        else:
+            suffixes = {key: x for key, x in previous.items() if key[0] not in scope}
+        for V in scope:
+            for j, rule in enumerate(self.rules[V]):
+                after_FNE, after_nullable = 0, True
+                for i in range(len(rule)-1, -1, -1):
+                    suffixes[V, j, i] = after_FNE, after_nullable
+                    symbol = rule[i]
+                    if symbol in FNE:
+                        if symbol in nullable:
+                            after_FNE |= FNE[symbol]
+                        else:
+                            after_FNE, after_nullable = FNE[symbol], False
+                    else:
+                        after_FNE, after_nullable = self._bit(symbol), False
+        return suffixes
+
+    def FOLLOW_all(self):
+        return {x: self._terminal_set(mask) for x, mask in self._FOLLOW_all().items()}
+
+    def _FOLLOW_all(self):
+        return self._cached('FOLLOW_all', self._compute_FOLLOW_all)
+
+    def _FOLLOW(self, v):
+        # mask of FOLLOW(v) for the table builders: each read counts as a
+        # FOLLOW phase call when profiling, as the per-symbol FOLLOW did
+        profile = self.profile
+        if profile is None:
+            return self._FOLLOW_all()[v]
+        start = time.perf_counter()
+        try:
+            return self._FOLLOW_all()[v]
+        finally:
+            profile.add('FOLLOW', time.perf_counter() - start)
+
+    def _compute_FOLLOW_all(self, previous=None, scope=None):
+        # with `previous`, only the non-terminals in `scope` are recomputed;
+        # it must hold every non-terminal that includes one of its members
+        occurrences = self.occurrences()
+        suffixes = self._suffixes()
+
+        def initial(x):
+            FOLLOW = 0
+            #rule 1
+            if x == self.axiom:
+                FOLLOW = self._bit("$")
+            #rule 2
+            for occurrence in occurrences.get(x, ()):
+                FOLLOW |= suffixes[occurrence][0]
+            return FOLLOW
+
+        #rule 3: FOLLOW(x) includes FOLLOW(V) when x ends a rule of V
+        def includes(x):
+            return {V for V, j, i in occurrences.get(x, ())
+                    if V != x and suffixes[V, j, i][1]}
+
+        if previous is None:
+            return digraph(list(self.V()), includes, initial)
+
+        def initial_in_scope(x):
+            FOLLOW = initial(x)
+            for V in includes(x) - scope:
+                FOLLOW |= previous[V]
+            return FOLLOW
+
+        FOLLOW = dict(previous)
+        FOLLOW.update(digraph([x for x in self.V() if x in scope],
+            lambda x: includes(x) & scope, initial_in_scope))
         return FOLLOW
 
+    @instrumented
+    def FOLLOW(self, x):
+        if self.is_terminal(x):
+            return frozenset((x,))
+        return self._terminal_set(self._FOLLOW_all()[x])
+
     def rule2str(self, v, rule):
-        return (' '+Grammar.ARROW+' ').join([v,''.join(rule) if len(rule) > 0 else Grammar.EPSILON])
+        return (' '+Grammar.ARROW+' ').join([v,self.sep().join(rule) if len(rule) > 0 else Grammar.EPSILON])
 
     def vrules2str(self, v):
-        rules = [''.join(rule) if len(rule) > 0 else Grammar.EPSILON for rule in self.rules[v]]
+        rules = [self.sep().join(rule) if len(rule) > 0 else Grammar.EPSILON for rule in self.rules[v]]
         return (' '+Grammar.ARROW+' ').join((v,' | '.join(rules)))
 
+    def productions(self):
+        # every (non-terminal, rule) in a fixed order, the index is the production id
+        return self._cached('productions',
+            lambda: [(v, rule) for v, R in self.rules.items() for rule in R])
+
+    def symbol_table(self):
+        # (terminals with '$' last, non-terminals) in the order the compiled tables intern them
+        return self._cached('symbol_table',
+            lambda: (sorted(self.T())+["$"], sorted(self.V())))
+
+    def ll1(self):
+        return self._cached('ll1', lambda: CompiledLL1.from_grammar(self))
+
     def parse_table_cell(self,v,t):
-        L = []
-        R = self.rules[v]
-        for rule in R:
-            FNE = self.FNE_rule(rule)
-            if t in FNE:
-                L.append((v,rule))
-
-        FOLLOW = self.FOLLOW(v)
-        if t in FOLLOW:
-            for rule in R:
-                if self.is_list_nullable(rule):
-                    L.append((v,rule))
-        return L
+        productions = self.productions()
+        return [productions[p] for p in self.ll1().choices(v, t)]
 
+    @instrumented
     def parse_table(self,include_conflicts=False):
+        ll1 = self.ll1()
+        productions = self.productions()
         table = {}
-        T = list(self.T())+["$"]
         for v in self.V():
             Vrules = {}
-            for t in T:
-                result = self.parse_table_cell(v,t)
+            for t in ll1.terminals:
+                result = ll1.choices(v, t)
                 if len(result) > 0:
                     if not include_conflicts:
-                        if len(result) > 1:
-                            print("CONFLICT IGNORED!",v,t,result)
-                        Vrules[t] = result[0]
+                        Vrules[t] = productions[result[0]]
                     else:
-                        Vrules[t] = result
+                        Vrules[t] = [productions[p] for p in result]
             table[v] = Vrules
         return table
 
-    def print_parse_table(self):
+    @instrumented
+    def render_parse_table(self):
         V = sorted(self.V())
         T = sorted(self.T())+["$"]
 
@@ -169,110 +705,179 @@ class Grammar:
                     cell = ""
                 row.append(cell)
             table.append(row)
+        return '\n' + grid(table) + '\n'
 
-        print()
-        print(tabulate(table[1:],
-                headers=table[0],
-                tablefmt="fancy_grid"))
-        print()
-
-    def parse(self, s, limit=50, print_steps=True):
-        if type(s) == str:
-            s = list(s)
-
-        parse_table = self.parse_table()
+    def print_parse_table(self):
+        print(self.render_parse_table())
+
+    @instrumented
+    def parse(self, s, limit=None, print_steps=True, trace=True, tree=False,
+            recover=False, max_errors=100):
+        # trace=False runs the table-driven recognizer: linear time, no step
+        # limit unless one is given, and nothing recorded along the way
+        # except the parse tree when tree=True. recover=True implies it and
+        # goes on past syntax errors, up to max_errors and without a tree
+        # (see CompiledLL1.recover)
+        if recover:
+            if tree:
+                raise ValueError("recover=True builds no parse tree")
+            return self.ll1().recover(self.tokens(s), max_errors)
+        if not trace:
+            result = self.ll1().recognize(self.tokens(s), limit, tree)
+            if self.profile is not None:
+                self.profile.count('ll1 parse tokens', result.position)
+            return result
+        accepted, steps = self.parse_steps(s, limit)
+        if print_steps:
+            print(render_steps(steps))
+        return accepted
+
+    @instrumented
+    def parse_steps(self, s, limit=None):
+        # the traced LL(1) parse: (accepted, [[stack, input, action],..]),
+        # headed by a row of column names
+        if limit is None:
+            limit = 50
+        s = [getattr(x, 'kind', x) for x in self.tokens(s)]
+        sep = self.sep()
+
+        ll1 = self.ll1()
+        productions = self.productions()
         table = [["(top) stack",'parse','action'],]
         stack = [self.axiom,"$"]
         to_parse = s+["$"]
 
         final_action_is_accept = False
 
-        try:
-            while limit > 0:
-                need_to_break = False
-                to_parse0 = to_parse[0]
-                stack0 = stack[0]
-                row = [''.join(stack),''.join(to_parse)]
-                action = ""
-                try:
-                    if stack0 == to_parse0:
-                        if stack0 == "$":
-                            action = "accept"
-                            need_to_break = True
-                            final_action_is_accept = True
-                        else:
-                            action = "match"
-                            stack = stack[1:]
-                            to_parse = to_parse[1:]
+        while limit > 0:
+            need_to_break = False
+            to_parse0 = to_parse[0]
+            stack0 = stack[0]
+            row = [sep.join(stack),sep.join(to_parse)]
+            action = ""
+            try:
+                if stack0 == to_parse0:
+                    if stack0 == "$":
+                        action = "accept"
+                        need_to_break = True
+                        final_action_is_accept = True
                     else:
-                        if self.is_terminal(stack0):
-                            action = "parsing error"
-                            need_to_break = True
-                        else:
-                            v,rule = parse_table[stack0][to_parse0]
-                            action = "apply "+self.rule2str(v, rule)
-                            stack = rule+stack[1:]
-                except Exception as e:
-                    action = "Exception occured"
-                    print("Exception:",repr(e))
-                    need_to_break = True
-                row.append(action)
-                table.append(row)
-                limit -= 1
-                if need_to_break:
-                    break
-        finally:
-            if print_steps:
-                print()
-                print(tabulate(table[1:],
-                        headers=table[0],
-                        stralign="right",
-                        tablefmt="fancy_grid"))
-                print()
-        return final_action_is_accept
+                        action = "match"
+                        stack = stack[1:]
+                        to_parse = to_parse[1:]
+                else:
+                    if self.is_terminal(stack0):
+                        action = "parsing error"
+                        need_to_break = True
+                    else:
+                        v,rule = productions[ll1.choice(stack0, to_parse0)]
+                        action = "apply "+self.rule2str(v, rule)
+                        stack = rule+stack[1:]
+            except Exception as e:
+                action = "Exception occured: "+repr(e)
+                need_to_break = True
+            row.append(action)
+            table.append(row)
+            limit -= 1
+            if need_to_break:
+                break
+        if self.profile is not None:
+            self.profile.count('ll1 parse steps', len(table) - 1)
+        return final_action_is_accept, table
 
-    def FIRST_FOLLOW_table(self):
+    def first_follow(self):
+        # {non-terminal: {'FIRST': [..], 'FOLLOW': [..]}}, '' standing for ɛ
+        return {V: {'FIRST': sorted(self.FIRST(V)), 'FOLLOW': sorted(self.FOLLOW(V))}
+                for V in sorted(self.V())}
+
+    @instrumented
+    def render_FIRST_FOLLOW_table(self):
         table = [["",'FIRST','FOLLOW'],]
 
         formatset = lambda s: ','.join(sorted(s))
 
-        for V in sorted(self.V()):
+        for V, sets in self.first_follow().items():
             table.append([
                 V,
-                formatset([ Grammar.EPSILON if x == '' else x for x in sorted(self.FIRST(V))]),
-                formatset(self.FOLLOW(V))
+                formatset([ Grammar.EPSILON if x == '' else x for x in sets['FIRST']]),
+                formatset(sets['FOLLOW'])
             ])
-        print()
-        print(tabulate(table[1:],
-                headers=table[0],
-                tablefmt="fancy_grid"))
-        print()
+        return '\n' + grid(table) + '\n'
 
-    def print_grammar(self):
-        print("Axiom:",self.axiom)
-        print("Terminals:",' '.join(sorted(self.T())))
-        print("Non-Terminals:",' '.join(sorted(self.V())))
-        print("Rules:")
-        for v in sorted(self.V()):
-            print(self.vrules2str(v))
+    def FIRST_FOLLOW_table(self):
+        print(self.render_FIRST_FOLLOW_table())
+
+    def summary(self):
+        return {
+            'axiom': self.axiom,
+            'terminals': sorted(self.T()),
+            'nonterminals': sorted(self.V()),
+            'rules': [self.vrules2str(v) for v in sorted(self.V())],
+        }
+
+    @instrumented
+    def render_grammar(self):
+        summary = self.summary()
+        lines = [
+            "Axiom: "+summary['axiom'],
+            "Terminals: "+' '.join(summary['terminals']),
+            "Non-Terminals: "+' '.join(summary['nonterminals']),
+            "Rules:",
+        ]
+        return '\n'.join(lines + summary['rules'])
 
+    def print_grammar(self):
+        print(self.render_grammar())
+
+    def ll1_conflicts(self):
+        # [{'nonterminal', 'terminal', 'rules'}] of the conflicting LL(1) cells
+        productions = self.productions()
+        return [{
+                'nonterminal': conflict.row,
+                'terminal': conflict.symbol,
+                'rules': [self.rule2str(*productions[p]) for p in conflict.choices],
+            } for conflict in self.ll1().conflicts]
+
+    @instrumented
+    def render_ll1_conflicts(self):
+        return '\n'.join("conflict on %s %s: %s" % (c['nonterminal'], c['terminal'],
+                ', '.join(c['rules'])) for c in self.ll1_conflicts())
+
+    def print_ll1_conflicts(self):
+        if self.ll1().conflicts:
+            print(self.render_ll1_conflicts())
+
+    @instrumented
+    def render_stats_ll1(self):
+        parts = [
+            "FIRST/FOLLOW table:",
+            self.render_FIRST_FOLLOW_table(),
+            "LL(1) parse table:",
+            self.render_parse_table(),
+        ]
+        if self.ll1().conflicts:
+            parts.append(self.render_ll1_conflicts())
+        return '\n'.join(parts)
 
     def stats_ll1(self):
-        print("FIRST/FOLLOW table:")
-        self.FIRST_FOLLOW_table()
-        print("LL(1) parse table:")
-        self.print_parse_table()
+        print(self.render_stats_ll1())
 
-    def stats_lr0(self):
-        print("states:")
+    @instrumented
+    def render_stats_lr0(self):
         states = self.lr0_states()
-        self.lr0_pp(states)
-        print()
-        print("table:")
-        self.lr0_table(states)
-        print()
-        print("action table:")
-        self.lr0_full_table(states)
+        return '\n'.join([
+            "states:",
+            self.render_lr0_states(states),
+            "",
+            "table:",
+            self.render_lr0_table(states),
+            "",
+            "action table:",
+            self.render_lr0_full_table(states),
+        ])
+
+    def stats_lr0(self):
+        print(self.render_stats_lr0())
 
     def stats(self):
         self.print_grammar()
@@ -281,24 +886,19 @@ class Grammar:
 
     ###### LR(0)
 
-    def lr0_closure(self,kernels, max_depth=4):
-        if max_depth == 0:
-            return kernels
-        items = {}
-        for kernel in kernels:
-            items[self.sstate2str(kernel)] = kernel
-            R, rule, i = kernel
-            right = rule[i:]
-            if right:
-                right0 = right[0]
-                if self.is_non_terminal(right0):
-                    for rule2 in self.rules[right0]:
-                        nq = (right0, rule2,0)
-                        closured = self.lr0_closure([nq], max_depth-1)
-                        for it in closured:
-                            items[self.sstate2str(it)] = it
-        return items.values()
+    def lr0_items(self):
+        return self._cached('lr0_items', lambda: LR0Items(
+            self.productions() + [("S'", [self.axiom])], self.V()))
 
+    @instrumented
+    def lr0_closure(self,kernels):
+        items = self.lr0_items()
+        kernel = [items.item_of(*q) for q in kernels]
+        closure = items.closure(kernel)
+        rest = sorted(closure.difference(kernel), key=items.key)
+        return [items.as_tuple(i) for i in kernel + rest]
+
+    @instrumented
     def lr0_goto(self, q, X):
         state = []
         for item in q:
@@ -324,141 +924,121 @@ class Grammar:
     def state2strstr(self, q):
         return ';'.join(self.state2str(q))
 
-    def lr0_states(self):
-        symboles = sorted(self.V() | self.T())
-        I0_kernel = [("S'",[self.axiom],0)]
-        I0 = self.lr0_closure(I0_kernel)
-
-        hash_to_state = {}
-
-        def hash_state(x):
-            return self.state2strstr(x)
-
-        def add(x,myIs, origin=None, transition=None):
-            h = hash_state(x)
-            if h in hash_to_state:
-                el = myIs[hash_to_state[h]]
-            else:
-                hash_to_state[h] = add.N
-                el = myIs[add.N] = {
-                    'state':x,
-                    'origin':set(),
-                    'transition':set(),
-                    'N':add.N,
-                }
-                add.N += 1
-            if origin != None:
-                el['origin'].add(origin)
-                el['transition'].add(transition)
-        add.N = 0
-
-        def states(Is):
-            return [x['state'] for x in Is.values()]
+    def lr0_automaton(self):
+        return self._cached('lr0_automaton', lambda: LR0Automaton(self.lr0_items()))
 
+    @instrumented
+    def lr0_states(self):
+        automaton = self.lr0_automaton()
+        items = automaton.items
         Is = {}
-        add(I0, Is)
-
-        while True:
-            newIs = {k:v for k,v in Is.items()}
-            for k,v in Is.items():
-                I = v["state"]
-                genIs = [(self.lr0_goto(I, X), X) for X in symboles]
-                genIs = [(x, X) for x, X in genIs if len(x) > 0]
-                genIs = [(self.lr0_closure(x),X) for x, X in genIs]
-                [add(x, newIs, k, X) for x, X in genIs]
-            if len(Is) == len(newIs):
-                Is = newIs
-                break
-            Is = newIs
+        for k, (kernel, state) in enumerate(zip(automaton.kernels, automaton.states)):
+            rest = sorted(state.difference(kernel), key=items.key)
+            Is[k] = {
+                'state':[items.as_tuple(i) for i in sorted(kernel, key=items.key) + rest],
+                'origin':set(),
+                'transition':set(),
+                'N':k,
+            }
+        for k, transitions in enumerate(automaton.goto):
+            for X, target in transitions.items():
+                Is[target]['origin'].add(k)
+                Is[target]['transition'].add(X)
         return Is
 
+    def lr0_parse(self, s, limit=None, print_steps=True, trace=True, tree=False,
+            recover=False, max_errors=100):
+        return self.lr_parse(s, 'lr0', limit, print_steps, trace, tree, recover, max_errors)
+
+    def lr0_parse_steps(self, s, limit=None):
+        return self.lr_parse_steps(s, 'lr0', limit)
+
+    @instrumented
+    def lr_parse(self, s, kind='lalr', limit=None, print_steps=True, trace=True, tree=False,
+            recover=False, max_errors=100):
+        # shift/reduce driver over lr_table(kind); trace=False runs the
+        # linear-time recognizer without building the steps table, as does
+        # recover=True with the one of LRTable.recover (no tree)
+        if recover:
+            if tree:
+                raise ValueError("recover=True builds no parse tree")
+            return self.lr_table(kind).recover(self.tokens(s), max_errors)
+        if not trace:
+            result = self.lr_table(kind).recognize(self.tokens(s), limit, tree)
+            if self.profile is not None:
+                self.profile.count('%s parse tokens' % kind, result.position)
+            return result
+        accepted, steps = self.lr_parse_steps(s, kind, limit)
+        if print_steps:
+            print(render_steps(steps))
+        return accepted
+
+    @instrumented
+    def lr_parse_steps(self, s, kind='lalr', limit=None):
+        # the traced LR parse: (accepted, [[states, stack, input, action],..]),
+        # headed by a row of column names
+        lr = self.lr_table(kind)
+        if limit is None:
+            limit = 50
+
+        s = [getattr(x, 'kind', x) for x in self.tokens(s)]
+        sep = self.sep()
+        table = [['states stack', 'stack', 'parse', 'action'],]
+        states = [0]
+        stack = ['$']
+        position = 0
+        final_action_is_accept = False
 
-    def lr0_parse(self, s, limit=50, print_steps=True):
-        if type(s) == str:
-            s = list(s)
-
-        states = self.lr0_states()
-
-        def is_reduce_item(item):
-            R, rule, i = item
-            return len(rule) == i
-
-        def is_shift_item(item):
-            return not is_reduce_item(item)
-
-        def find_transition(curr, symbol):
-            for k, state in states.items():
-                if curr in state['origin'] and symbol in state['transition']:
-                    return k
-
-        GOTO = self.lr0_GOTO(states)
-
-        table = [['state','states stack', "(top) stack",'parse','action'],]
-
-        s.append('$')
-
-        stack = [0]
-        stack2 = ['$']
-
-        try:
-            for i in range(20):
-                row = [
-                    ''.join(map(str,stack)),
-                    ''.join(map(str,stack2)),
-                    ''.join(s)]
-                action = "no action"
-                curr_state = stack[-1]
-                s0 = s[0]
-                new_state = find_transition(curr_state, s0)
-                #SHIFT
-                if new_state:
-                    stack.append(new_state)
-                    stack2.append(s0)
-                    s = s[1:]
-                    action = "shift "+str(new_state)
-                else:
-                    state_infos = states[curr_state]
-                    #REDUCE
-                    reduce_items = [it for it in state_infos['state']
-                        if is_reduce_item(it)]
-                    if len(reduce_items) > 0:
-                        if len(reduce_items) > 1:
-                            print("WHAT, multiple reduce items", reduce_items)
-                        reduce_item = reduce_items[0]
-                        for it in reduce_item:
-                            stack.pop()
-                            stack2.pop()
-                        R, _, _ = reduce_item
-                        print("GOTO",R,"=>", GOTO[R])
-                        stack.append(GOTO[R])
-                        stack2.append(R)
-                        action = "reduce "+self.sstate2str(reduce_item)
-                row.append(action)
-                table.append(row)
-        finally:
-            print()
-            print(tabulate(table[1:],
-                    headers=table[0],
-                    stralign="right",
-                    tablefmt="fancy_grid"))
-            print()
+        while limit > 0:
+            token = s[position] if position < len(s) else '$'
+            row = [
+                ' '.join(map(str,states)),
+                sep.join(stack),
+                sep.join(s[position:]+['$'])]
+            a = lr.action_of(states[-1], token)
+            action = lr.describe(a)
+            need_to_break = False
+            if a > 0:
+                states.append(a-1)
+                stack.append(token)
+                position += 1
+            elif a == lr.accept:
+                final_action_is_accept = True
+                need_to_break = True
+            elif a < 0:
+                lhs, rhs = lr.productions[-a-1]
+                if rhs:
+                    del states[-len(rhs):]
+                    del stack[-len(rhs):]
+                V = lr.symbols[lhs]
+                states.append(lr.goto_of(states[-1], V))
+                stack.append(V)
+            else:
+                action = "parsing error"
+                need_to_break = True
+            row.append(action)
+            table.append(row)
+            limit -= 1
+            if need_to_break:
+                break
+        if self.profile is not None:
+            self.profile.count('%s parse steps' % kind, len(table) - 1)
+        return final_action_is_accept, table
 
     def lr0_GOTO(self, states):
+        # state -> {non-terminal: target state}
+        goto = self.lr0_automaton().goto
         V = self.V()
-        def find_transition(v):
-            for k,x in states.items():
-                if v in x['transition']:
-                    return k
-        GOTO = {v:find_transition(v) for v in V}
-        return GOTO
+        return {k: {X: target for X, target in goto[k].items() if X in V}
+                for k in states}
 
-    def lr0_table(self, states):
+    @instrumented
+    def render_lr0_table(self, states):
         V = self.V()
         T = self.T()
+        goto = self.lr0_automaton().goto
         def find_transition(origin, transition):
-            for k,x in states.items():
-                if transition in x['transition'] and origin in x['origin']:
-                    return k
+            return goto[origin].get(transition)
         items = sorted(states.items(), key=lambda x:x[1]['N'])
         symbols = sorted(T) + sorted(V)
         table = [['item set',]+symbols]
@@ -471,18 +1051,18 @@ class Grammar:
                 else:
                     row.append('')
             table.append(row)
-        print(tabulate(table[1:],
-                headers=table[0],
-                stralign="right",
-                tablefmt="fancy_grid"))
+        return grid(table, stralign="right")
 
-    def lr0_full_table(self, states):
+    def lr0_table(self, states):
+        print(self.render_lr0_table(states))
+
+    @instrumented
+    def render_lr0_full_table(self, states):
         V = self.V()
         T = self.T()
+        goto = self.lr0_automaton().goto
         def find_transition(origin, transition):
-            for k,x in states.items():
-                if transition in x['transition'] and origin in x['origin']:
-                    return k
+            return goto[origin].get(transition)
 
         def is_reduce_item(item):
             R, rule, i = item
@@ -507,7 +1087,7 @@ class Grammar:
                             cell = to_be_filled
                         else:
                             cell = '---'
-                    elif symb is '$':
+                    elif symb == '$':
                         for lr0it in v['state']:
                             R, rule, i = lr0it
                             if R == "S'":
@@ -520,19 +1100,1295 @@ class Grammar:
                             cell = "SHIFT "+str(r)
                 row.append(cell)
             table.append(row)
-        print(tabulate(table[1:],
-                headers=table[0],
-                stralign="right",
-                tablefmt="fancy_grid"))
+        return grid(table, stralign="right")
 
-    def lr0_pp(self, states):
+    def lr0_full_table(self, states):
+        print(self.render_lr0_full_table(states))
+
+    @instrumented
+    def render_lr0_states(self, states):
+        lines = []
         items = sorted(states.items(), key=lambda x:x[1]['N'])
         for k,v in items:
-            print("I"+str(v['N']),self.state2strstr(v['state']))
+            lines.append("I"+str(v['N'])+" "+self.state2strstr(v['state']))
             if len(v['origin']) > 0:
-                print("   from",v['origin'])
+                lines.append("   from "+str(v['origin']))
             if len(v['transition']) > 0:
-                print("   transition",','.join(map(repr,v['transition'])))
+                lines.append("   transition "+','.join(map(repr,v['transition'])))
+        return '\n'.join(lines)
+
+    def lr0_pp(self, states):
+        print(self.render_lr0_states(states))
+
+    def lr0_summary(self):
+        # [{'items': [..], 'transitions': {symbol: state}}] per LR(0) state
+        automaton = self.lr0_automaton()
+        return [{'items': self.state2str(v['state']),
+                 'transitions': dict(automaton.goto[k])}
+                for k, v in sorted(self.lr0_states().items())]
+
+
+    ###### SLR(1), LALR(1), LR(1)
+
+    def lr_table(self, kind='lalr'):
+        # compiled ACTION/GOTO table, kind is one of 'lr0', 'slr', 'lalr', 'lr1'
+        builders = {
+            'lr0': self._lr0_reductions,
+            'slr': self._slr1_reductions,
+            'lalr': self._lalr1_reductions,
+            'lr1': None,
+        }
+        if kind not in builders:
+            raise ValueError("unknown LR table kind: %r" % kind)
+        def build():
+            if kind == 'lr1':
+                automaton = self.lr1_automaton()
+                return LRTable.build(kind, self, automaton.goto, automaton.reductions())
+            return LRTable.build(kind, self, self.lr0_automaton().goto, builders[kind]())
+        return self._cached(('lr_table', kind), build)
+
+    def _complete_items(self):
+        # per LR(0) state, the production ids of its complete items
+        automaton = self.lr0_automaton()
+        items = automaton.items
+        return [sorted(items.prod[i] for i in state if items.next[i] is None)
+                for state in automaton.states]
+
+    def _lr0_reductions(self):
+        T = 0
+        for t in self.symbol_table()[0]:
+            T |= self._bit(t)
+        end = self._bit('$')
+        start = len(self.productions())
+        return [[(p, end if p == start else T) for p in complete]
+                for complete in self._complete_items()]
+
+    def _slr1_reductions(self):
+        productions = self.productions()
+        end = self._bit('$')
+        start = len(productions)
+        return [[(p, end if p == start else self._FOLLOW(productions[p][0]))
+                    for p in complete]
+                for complete in self._complete_items()]
+
+    def _lalr1_reductions(self):
+        LA = self._lalr1_lookaheads()
+        end = self._bit('$')
+        start = len(self.productions())
+        return [[(p, end if p == start else LA.get((q, p), 0))
+                    for p in complete]
+                for q, complete in enumerate(self._complete_items())]
+
+    def lalr1_lookaheads(self):
+        # (state, production id) -> lookahead terminals, by DeRemer & Pennello
+        return {key: self._terminal_set(mask) for key, mask in self._lalr1_lookaheads().items()}
+
+    def _lalr1_lookaheads(self):
+        return self._cached('lalr1_lookaheads', self._compute_lalr1_lookaheads)
+
+    def _compute_lalr1_lookaheads(self):
+        goto = self.lr0_automaton().goto
+        V = self.V()
+        bit = self._bit
+        nullable = self._first_sets()[0]
+        productions = self.productions()
+        by_lhs = {}
+        for p, (v, rule) in enumerate(productions):
+            by_lhs.setdefault(v, []).append(p)
+
+        # non-terminal transitions (p, A)
+        transitions = [(p, A) for p, moves in enumerate(goto) for A in moves if A in V]
+
+        # terminals directly read after (p, A), '$' after the axiom from state 0
+        def direct_read(x):
+            p, A = x
+            r = goto[p][A]
+            DR = 0
+            for t in goto[r]:
+                if t not in V:
+                    DR |= bit(t)
+            if p == 0 and A == self.axiom:
+                DR |= bit('$')
+            return DR
+
+        def reads(x):
+            p, A = x
+            r = goto[p][A]
+            return [(r, C) for C in goto[r] if C in nullable]
+
+        Read = digraph(transitions, reads, direct_read)
+
+        # (p, A) includes (p', B) when B → βAγ, γ nullable and p' reaches p on β;
+        # (q, B → ω) looks back at (p', B) when p' reaches q on ω
+        includes = {x: [] for x in transitions}
+        lookback = {}
+        for x in transitions:
+            p_, B = x
+            for p in by_lhs[B]:
+                rule = productions[p][1]
+                nullable_from = len(rule)
+                while nullable_from > 0 and rule[nullable_from-1] in nullable:
+                    nullable_from -= 1
+                q = p_
+                for i, X in enumerate(rule):
+                    if X in V and i+1 >= nullable_from:
+                        includes[q, X].append(x)
+                    q = goto[q][X]
+                lookback.setdefault((q, p), []).append(x)
+
+        Follow = digraph(transitions, includes.__getitem__, Read.__getitem__)
+
+        LA = {}
+        for key, sources in lookback.items():
+            lookaheads = 0
+            for x in sources:
+                lookaheads |= Follow[x]
+            LA[key] = lookaheads
+        return LA
+
+    def lr1_automaton(self):
+        return self._cached('lr1_automaton', lambda: LR1Automaton(self))
+
+    def lr_table_summary(self, kind='lalr'):
+        # the LR table as {'actions': [{terminal: [..]}], 'goto': [{non-terminal: state}],
+        # 'conflicts': [..]}, one entry per state and actions spelled out
+        lr = self.lr_table(kind)
+        actions, goto = [], []
+        for s in range(lr.nstates):
+            actions.append({t: [lr.describe(a) for a in lr.actions(s, t)]
+                for t in lr.terminals if lr.action_of(s, t)})
+            goto.append({v: lr.goto_of(s, v)
+                for v in lr.nonterminals if lr.goto_of(s, v) is not None})
+        conflicts = [{
+                'state': c.row,
+                'terminal': c.symbol,
+                'actions': [lr.describe(a) for a in c.choices],
+            } for c in lr.conflicts]
+        return {'kind': kind, 'actions': actions, 'goto': goto, 'conflicts': conflicts}
+
+    @instrumented
+    def render_lr_table(self, kind='lalr'):
+        lr = self.lr_table(kind)
+        summary = self.lr_table_summary(kind)
+        table = [['state'] + lr.terminals + lr.nonterminals]
+        for s in range(lr.nstates):
+            row = [s]
+            for t in lr.terminals:
+                row.append(', '.join(summary['actions'][s].get(t, ())))
+            for v in lr.nonterminals:
+                row.append(summary['goto'][s].get(v, ''))
+            table.append(row)
+        lines = [grid(table, stralign="right")]
+        for c in summary['conflicts']:
+            lines.append("conflict in state %d on %s: %s" % (c['state'], c['terminal'],
+                ', '.join(c['actions'])))
+        return '\n'.join(lines)
+
+    def print_lr_table(self, kind='lalr'):
+        print(self.render_lr_table(kind))
+
+
+class LR0Items:
+    # every LR(0) item (production id, dot position) interned to an int:
+    # production p owns the ids base[p]..base[p]+len(rule), in dot order.
+    # Item sets are frozensets of ids, so hashing them is cheap. ids maps
+    # (v, rule) to its production ids, several when a rule is repeated.
+
+    def __init__(self, productions, nonterminals):
+        self.productions = productions
+        self.ids = {}
+        self.base = []
+        self.prod = array('i')
+        self.dot = array('i')
+        self.next = [] # symbol after the dot, None for a complete item
+        self.predict = {v: [] for v in nonterminals} # v -> items (v → •rule)
+        for p, (v, rule) in enumerate(productions):
+            self.ids.setdefault((v, tuple(rule)), []).append(p)
+            self.base.append(len(self.prod))
+            if v in self.predict:
+                self.predict[v].append(len(self.prod))
+            for i in range(len(rule)+1):
+                self.prod.append(p)
+                self.dot.append(i)
+                self.next.append(rule[i] if i < len(rule) else None)
+
+    def edited(self, productions, start, end, count):
+        # the items once productions[start:end] are replaced by `count` new
+        # ones: every other item keeps its id, so the closures that do not
+        # involve the replaced productions stay valid. New items are added
+        # at the end and the replaced ones left unused (prod -1). Returns
+        # None once unused items outnumber the others: renumber from scratch.
+        size = sum(len(rule)+1 for _, rule in productions)
+        if 2*size < len(self.prod):
+            return None
+        delta = count - (end - start)
+        items = LR0Items.__new__(LR0Items)
+        items.productions = productions
+        items.prod = array('i', self.prod)
+        items.dot = array('i', self.dot)
+        items.next = list(self.next)
+        for p in range(start, end):
+            for i in range(len(self.productions[p][1])+1):
+                items.prod[self.base[p]+i] = -1
+                items.next[self.base[p]+i] = None
+        for p in range(end, len(self.productions)):
+            for i in range(len(self.productions[p][1])+1):
+                items.prod[self.base[p]+i] = p + delta
+        base = []
+        for p in range(start, start+count):
+            base.append(len(items.prod))
+            rule = productions[p][1]
+            for i in range(len(rule)+1):
+                items.prod.append(p)
+                items.dot.append(i)
+                items.next.append(rule[i] if i < len(rule) else None)
+        items.base = self.base[:start] + base + self.base[end:]
+        items.ids = {}
+        items.predict = {v: [] for v in self.predict}
+        for p, (v, rule) in enumerate(productions):
+            items.ids.setdefault((v, tuple(rule)), []).append(p)
+            if v in items.predict:
+                items.predict[v].append(items.base[p])
+        return items
+
+    def item_of(self, R, rule, i, copy=0):
+        # item with the dot at i in R → rule, in its copy-th occurrence
+        return self.base[self.ids[R, tuple(rule)][copy]] + i
+
+    def key(self, item):
+        # sort key of an item, production then dot, whatever its id
+        return self.prod[item], self.dot[item]
+
+    def as_tuple(self, item):
+        R, rule = self.productions[self.prod[item]]
+        return R, rule, self.dot[item]
+
+    def closure(self, kernel):
+        items = set(kernel)
+        work = list(kernel)
+        predicted = set()
+        predict = self.predict
+        next_symbol = self.next
+        while work:
+            B = next_symbol[work.pop()]
+            if B in predict and B not in predicted:
+                predicted.add(B)
+                for item in predict[B]:
+                    if item not in items:
+                        items.add(item)
+                        work.append(item)
+        return frozenset(items)
+
+
+class LR0Automaton:
+    # canonical collection of LR(0) item sets. State n is `states[n]`
+    # (closed, a frozenset of item ids) with kernel `kernels[n]`, and
+    # `goto[n]` maps a symbol to the next state. Built with a single FIFO
+    # worklist: each state is expanded once, when it is first discovered.
+
+    def __init__(self, items, previous=None, kept=()):
+        # `kept` maps kernels to their state number in `previous`, an
+        # automaton over the same item ids, for the states whose closure
+        # and transitions are known not to have changed (see Grammar.edit)
+        self.items = items
+        self.kernels = []
+        self.states = []
+        self.goto = []
+        ids = {}
+
+        def add(kernel):
+            ids[kernel] = len(self.states)
+            self.kernels.append(kernel)
+            m = kept.get(kernel) if kept else None
+            self.states.append(items.closure(kernel) if m is None else previous.states[m])
+            self.goto.append({})
+
+        start = items.base[len(items.productions)-1]
+        add(frozenset((start,)))
+        next_symbol = items.next
+        n = 0
+        while n < len(self.states):
+            m = kept.get(self.kernels[n]) if kept else None
+            if m is None:
+                moves = {}
+                for item in self.states[n]:
+                    X = next_symbol[item]
+                    if X is not None:
+                        moves.setdefault(X, []).append(item+1)
+                moves = [(X, frozenset(moves[X])) for X in sorted(moves)]
+            else:
+                kernels = previous.kernels
+                moves = [(X, kernels[t]) for X, t in previous.goto[m].items()]
+            transitions = self.goto[n]
+            for X, kernel in moves:
+                if kernel not in ids:
+                    add(kernel)
+                transitions[X] = ids[kernel]
+            n += 1
+
+    def __len__(self):
+        return len(self.states)
+
+
+class LR1Automaton:
+    # canonical LR(1) collection, for comparison with LALR(1): states are
+    # {LR(0) item id: lookahead terminals as a G._bit mask}
+
+    def __init__(self, G):
+        items = self.items = G.lr0_items()
+        V = G.V()
+        predict = items.predict
+        next_symbol = items.next
+        # FNE and nullability of what follows the symbol after the dot
+        after = {}
+        for item, X in enumerate(next_symbol):
+            if X in V:
+                rest = items.productions[items.prod[item]][1][items.dot[item]+1:]
+                after[item] = G._FNE_rule(rest), G.is_list_nullable(rest)
+
+        def closure(kernel):
+            # an item goes back to work whenever its lookaheads grow
+            state = dict(kernel)
+            work = list(state)
+            while work:
+                item = work.pop()
+                if item in after:
+                    B = next_symbol[item]
+                    first, nullable = after[item]
+                    lookaheads = first | state[item] if nullable else first
+                    for predicted in predict[B]:
+                        known = state.get(predicted, 0)
+                        if lookaheads & ~known:
+                            state[predicted] = known | lookaheads
+                            work.append(predicted)
+            return state
+
+        self.states = []
+        self.goto = []
+        ids = {}
+
+        def add(kernel):
+            ids[kernel] = len(self.states)
+            self.states.append(closure(kernel))
+            self.goto.append({})
+
+        start = items.base[len(items.productions)-1]
+        add(frozenset(((start, G._bit('$')),)))
+        n = 0
+        while n < len(self.states):
+            moves = {}
+            for item, lookaheads in self.states[n].items():
+                X = next_symbol[item]
+                if X is not None:
+                    moves.setdefault(X, []).append((item+1, lookaheads))
+            for X in sorted(moves):
+                kernel = frozenset(moves[X])
+                if kernel not in ids:
+                    add(kernel)
+                self.goto[n][X] = ids[kernel]
+            n += 1
+
+    def __len__(self):
+        return len(self.states)
+
+    def reductions(self):
+        items = self.items
+        result = []
+        for state in self.states:
+            reduces = {}
+            for item, lookaheads in state.items():
+                if items.next[item] is None:
+                    p = items.prod[item]
+                    reduces[p] = reduces.get(p, 0) | lookaheads
+            result.append(sorted(reduces.items()))
+        return result
+
+
+class LRTable:
+    # ACTION/GOTO table shared by the LR(0), SLR(1), LALR(1) and LR(1)
+    # builders, over the same symbol interning as CompiledLL1.
+    # action[state*len(terminals) + t] is 0 for an error, s+1 to shift to
+    # state s and -(p+1) to reduce production p; reducing the augmented
+    # production S' → axiom (the last one) means accept.
+    # goto[state*len(nonterminals) + v] is the target state, -1 for none.
+    # A conflicting cell keeps its first entry (shift, then the lowest
+    # production) and lists every candidate in `conflicts`.
+
+    def __init__(self, kind, terminals, nonterminals, productions, action, goto, conflicts):
+        self.kind = kind
+        self.terminals = list(terminals)
+        self.nonterminals = list(nonterminals)
+        self.symbols = self.terminals + self.nonterminals
+        self.index = {x: i for i, x in enumerate(self.symbols)}
+        self.productions = productions # [(lhs id, rhs ids)], lhs -1 for S'
+        self.accept = -len(productions)
+        self.action = action
+        self.goto = goto
+        self.nstates = len(action) // len(self.terminals)
+        self.conflicts = conflicts
+        self._conflicts = {(c.row, c.symbol): c.choices for c in conflicts}
+        self._sizes = [len(rhs) for _, rhs in productions]
+        self._lhs = [lhs - len(self.terminals) for lhs, _ in productions]
+        self._resume = None
+
+    @staticmethod
+    def build(kind, G, transitions, reductions):
+        # transitions: per state {symbol: state},
+        # reductions: per state [(production id, lookahead terminals as
+        # a G._bit mask)]
+        terminals, nonterminals = G.symbol_table()
+        index = {x: i for i, x in enumerate(terminals + nonterminals)}
+        width, height = len(terminals), len(nonterminals)
+        productions = [(index[v], tuple(index[x] for x in rule))
+                for v, rule in G.productions()]
+        productions.append((-1, (index[G.axiom],)))
+
+        nstates = len(transitions)
+        action = array('i', [0]) * (nstates * width)
+        goto = array('i', [-1]) * (nstates * height)
+        for s, moves in enumerate(transitions):
+            for X, target in moves.items():
+                x = index[X]
+                if x < width:
+                    action[s*width + x] = target+1
+                else:
+                    goto[s*height + x - width] = target
+
+        cells = {}
+        for s, reduces in enumerate(reductions):
+            for p, lookaheads in reduces:
+                for t in G._terminal_set(lookaheads):
+                    cell = s*width + index[t]
+                    current = action[cell]
+                    if current == 0:
+                        action[cell] = -(p+1)
+                    elif current != -(p+1):
+                        cells.setdefault(cell, [current]).append(-(p+1))
+
+        conflicts = [Conflict(cell // width, terminals[cell % width], choices)
+                for cell, choices in sorted(cells.items())]
+        return LRTable(kind, terminals, nonterminals, productions, action, goto, conflicts)
+
+    def is_deterministic(self):
+        return not self.conflicts
+
+    def action_of(self, state, t):
+        t = self.index.get(t, -1)
+        if not 0 <= t < len(self.terminals):
+            return 0
+        return self.action[state * len(self.terminals) + t]
+
+    def actions(self, state, t):
+        # every candidate action of the cell, conflicts included
+        if (state, t) in self._conflicts:
+            return list(self._conflicts[state, t])
+        a = self.action_of(state, t)
+        return [a] if a else []
+
+    def goto_of(self, state, v):
+        height = len(self.nonterminals)
+        v = self.index.get(v, -1) - len(self.terminals)
+        if not 0 <= v < height:
+            return None
+        target = self.goto[state * height + v]
+        return target if target >= 0 else None
+
+    def recognize(self, tokens, limit=None, tree=False):
+        # state stack as a list of ints and a cursor over `tokens`; a
+        # reduction pops len(rhs) states at once, so parsing is linear
+        if tree:
+            return self._parse_tree(tokens, limit)
+        width = len(self.terminals)
+        height = len(self.nonterminals)
+        end = width - 1
+        index = self.index
+        action = self.action
+        goto = self.goto
+        accept = self.accept
+        sizes = self._sizes
+        lhs = self._lhs
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        states = [0]
+        push = states.append
+        state = 0
+        position = 0
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        steps = 0
+        while t >= 0:
+            a = action[state*width + t]
+            if a > 0:
+                state = a-1
+                push(state)
+                position += 1
+                token = next(tokens, None)
+                t = end if token is None else terminal(token)
+            elif a < 0:
+                if a == accept:
+                    return ParseResult(True, position)
+                p = -a-1
+                if sizes[p]:
+                    del states[-sizes[p]:]
+                state = goto[states[-1]*height + lhs[p]]
+                push(state)
+            else:
+                break
+            if limit is not None:
+                steps += 1
+                if steps >= limit:
+                    break
+        return ParseResult(False, position)
+
+    def _parse_tree(self, tokens, limit):
+        # recognize() that also grows a ParseTree bottom-up: a node stack runs
+        # parallel to the state stack and a reduction adopts its top len(rhs)
+        width = len(self.terminals)
+        height = len(self.nonterminals)
+        end = width - 1
+        index = self.index
+        action = self.action
+        goto = self.goto
+        accept = self.accept
+        sizes = self._sizes
+        lhs = self._lhs
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        tree = ParseTree(self.symbols, width)
+        states = [0]
+        nodes = []
+        state = 0
+        position = 0
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        steps = 0
+        while t >= 0:
+            a = action[state*width + t]
+            if a > 0:
+                state = a-1
+                states.append(state)
+                n = tree.add(t)
+                tree.set_token(n, token)
+                nodes.append(n)
+                position += 1
+                token = next(tokens, None)
+                t = end if token is None else terminal(token)
+            elif a < 0:
+                if a == accept:
+                    tree.root = nodes[-1]
+                    return ParseResult(True, position, tree)
+                p = -a-1
+                n = tree.add(lhs[p] + width)
+                if sizes[p]:
+                    tree.set_children(n, nodes[-sizes[p]:])
+                    del states[-sizes[p]:]
+                    del nodes[-sizes[p]:]
+                nodes.append(n)
+                state = goto[states[-1]*height + lhs[p]]
+                states.append(state)
+            else:
+                break
+            if limit is not None:
+                steps += 1
+                if steps >= limit:
+                    break
+        return ParseResult(False, position)
+
+    def _resumptions(self):
+        # per state, the (target, mask of the terminals with an action in
+        # the target) of its gotos, and the union of those masks
+        if self._resume is None:
+            width = len(self.terminals)
+            height = len(self.nonterminals)
+            action = self.action
+            masks = []
+            for s in range(self.nstates):
+                mask = 0
+                for t in range(width):
+                    if action[s*width + t]:
+                        mask |= 1 << t
+                masks.append(mask)
+            self._resume = []
+            for s in range(self.nstates):
+                targets = [g for g in self.goto[s*height:(s+1)*height] if g >= 0]
+                gotos = [(g, masks[g]) for g in targets]
+                union = 0
+                for _, mask in gotos:
+                    union |= mask
+                self._resume.append((gotos, union))
+        return self._resume
+
+    def recover(self, tokens, max_errors=100):
+        # recognize() that reports a syntax error and goes on. Phrase level
+        # first: a missing terminal is inserted when the lookahead can
+        # follow it, or an extra token dropped when the next one fits.
+        # Otherwise the stack is popped down to a state with a goto after
+        # which the lookahead is valid, tokens being skipped until one is
+        # (one pass over the stack finds them all). Tokens are read once and
+        # each position gets at most one insertion and one popping, so the
+        # parse stays linear; it stops after max_errors errors, reporting
+        # one per position.
+        width = len(self.terminals)
+        height = len(self.nonterminals)
+        end = width - 1
+        index = self.index
+        action = self.action
+        goto = self.goto
+        accept = self.accept
+        sizes = self._sizes
+        lhs = self._lhs
+        terminals = self.terminals
+        resume = self._resumptions()
+        tokens = iter(tokens)
+        ahead = []
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        def advance():
+            token = ahead.pop() if ahead else next(tokens, None)
+            return token, end if token is None else terminal(token)
+
+        errors = []
+        states = [0]
+        push = states.append
+        state = 0
+        position = 0
+        inserted = popped = -1
+        token, t = advance()
+        while True:
+            a = action[state*width + t] if t >= 0 else 0
+            if a > 0:
+                state = a-1
+                push(state)
+                position += 1
+                token, t = advance()
+                continue
+            if a < 0:
+                if a == accept:
+                    return ParseResult(not errors, position, errors=errors)
+                p = -a-1
+                if sizes[p]:
+                    del states[-sizes[p]:]
+                state = goto[states[-1]*height + lhs[p]]
+                push(state)
+                continue
+            if not errors or errors[-1].position != position:
+                row = action[state*width:(state+1)*width]
+                errors.append(ParseError(position, token,
+                    tuple(x for x, a in zip(terminals, row) if a)))
+                if len(errors) >= max_errors:
+                    return ParseResult(False, position, errors=errors)
+            if t < 0:
+                position += 1
+                token, t = advance()
+                continue
+            if inserted != position:
+                inserted = position
+                for x in range(end):
+                    a = action[state*width + x]
+                    if a > 0 and action[(a-1)*width + t]:
+                        state = a-1
+                        push(state)
+                        break
+                else:
+                    a = 0
+                if a:
+                    continue
+            if t != end:
+                if not ahead:
+                    ahead.append(next(tokens, None))
+                following = end if ahead[0] is None else terminal(ahead[0])
+                if following >= 0 and action[state*width + following]:
+                    position += 1
+                    token, t = advance()
+                    continue
+            if popped == position:
+                if t == end:
+                    return ParseResult(False, position, errors=errors)
+                position += 1
+                token, t = advance()
+                continue
+            popped = position
+            union = 0
+            for s in states:
+                union |= resume[s][1]
+            while t != end and (t < 0 or not union >> t & 1):
+                position += 1
+                token, t = advance()
+            for i in range(len(states)-1, -1, -1):
+                target = next((g for g, mask in resume[states[i]][0] if mask >> t & 1), -1)
+                if target >= 0:
+                    del states[i+1:]
+                    state = target
+                    push(state)
+                    break
+            else:
+                return ParseResult(False, position, errors=errors)
+
+    def rule2str(self, p):
+        lhs, rhs = self.productions[p]
+        lhs = self.symbols[lhs] if lhs >= 0 else "S'"
+        sep = '' if all(len(x) == 1 for x in self.symbols) else ' '
+        rhs = sep.join(self.symbols[x] for x in rhs) if rhs else Grammar.EPSILON
+        return lhs + ' ' + Grammar.ARROW + ' ' + rhs
+
+    def describe(self, a):
+        if a > 0:
+            return "shift " + str(a-1)
+        if a == self.accept:
+            return "accept"
+        if a < 0:
+            return "reduce " + self.rule2str(-a-1)
+        return ""
+
+
+class ParseResult:
+    # outcome of a parse, truthy when the input is accepted. `position` is
+    # the number of tokens consumed, so on a rejection it is the index of
+    # the offending token (len(input) when the input ended too early).
+    # `tree` is the ParseTree when one was asked for and the input accepted,
+    # `errors` the ParseErrors of a recovering parse, which reads the whole
+    # input (position is then where it stopped) and accepts only without
+    # errors.
+    __slots__ = ('accepted', 'position', 'tree', 'errors')
+
+    def __init__(self, accepted, position, tree=None, errors=()):
+        self.accepted = accepted
+        self.position = position
+        self.tree = tree
+        self.errors = errors
+
+    def __bool__(self):
+        return self.accepted
+
+    def __repr__(self):
+        if self.errors:
+            return 'ParseResult(accepted=%r, position=%r, errors=%r)' % (
+                self.accepted, self.position, self.errors)
+        return 'ParseResult(accepted=%r, position=%r)' % (self.accepted, self.position)
+
+
+class ParseTree:
+    # concrete syntax tree stored as parallel arrays indexed by node id.
+    # symbol[n] is an interned symbol id; terminals (ids below `width`) are
+    # leaves whose token is tokens[first[n]], other nodes have count[n]
+    # children listed from children[first[n]]. Nodes are plain ints, so a
+    # tree costs a few machine words per node.
+    __slots__ = ('symbols', 'width', 'symbol', 'first', 'count',
+            'children', 'tokens', 'root')
+
+    def __init__(self, symbols, width):
+        self.symbols = symbols
+        self.width = width
+        self.symbol = array('i')
+        self.first = array('i')
+        self.count = array('i')
+        self.children = array('i')
+        self.tokens = []
+        self.root = 0
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def add(self, symbol):
+        self.symbol.append(symbol)
+        self.first.append(0)
+        self.count.append(0)
+        return len(self.symbol)-1
+
+    def set_children(self, n, children):
+        self.first[n] = len(self.children)
+        self.count[n] = len(children)
+        self.children.extend(children)
+
+    def set_token(self, n, token):
+        self.first[n] = len(self.tokens)
+        self.tokens.append(token)
+
+    def is_leaf(self, n):
+        return self.symbol[n] < self.width
+
+    def label(self, n):
+        return self.symbols[self.symbol[n]]
+
+    def token(self, n):
+        return self.tokens[self.first[n]] if self.is_leaf(n) else None
+
+    def children_of(self, n):
+        if self.is_leaf(n):
+            return self.children[0:0]
+        return self.children[self.first[n]:self.first[n]+self.count[n]]
+
+    def preorder(self, n=None):
+        stack = [self.root if n is None else n]
+        while stack:
+            n = stack.pop()
+            yield n
+            if not self.is_leaf(n):
+                stack.extend(reversed(self.children_of(n)))
+
+    def postorder(self, n=None):
+        stack = [(self.root if n is None else n, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if expanded or self.is_leaf(n):
+                yield n
+            else:
+                stack.append((n, True))
+                stack.extend((child, False) for child in reversed(self.children_of(n)))
+
+    def leaves(self, n=None):
+        return (x for x in self.preorder(n) if self.is_leaf(x))
+
+    def text(self, sep=''):
+        # the yield of the tree: the parsed tokens back in input order
+        return sep.join(str(self.token(n)) for n in self.leaves())
+
+    def as_dict(self):
+        # JSON-ready form: nodes in id order, leaves with their token text
+        nodes = []
+        for n in range(len(self)):
+            if self.is_leaf(n):
+                token = self.token(n)
+                nodes.append({'symbol': self.label(n),
+                    'token': None if token is None else str(token)})
+            else:
+                nodes.append({'symbol': self.label(n), 'children': list(self.children_of(n))})
+        return {'root': self.root, 'nodes': nodes}
+
+    def pretty(self):
+        lines = []
+        stack = [(self.root, 0)]
+        while stack:
+            n, depth = stack.pop()
+            label = self.label(n)
+            if self.is_leaf(n) and str(self.token(n)) != label:
+                label += ' ' + repr(self.token(n))
+            elif not self.is_leaf(n) and self.count[n] == 0:
+                label += ' ' + Grammar.ARROW + ' ' + Grammar.EPSILON
+            lines.append('  ' * depth + label)
+            if not self.is_leaf(n):
+                stack.extend((child, depth+1) for child in reversed(self.children_of(n)))
+        return '\n'.join(lines)
+
+
+class CompiledLL1:
+    # LL(1) table over interned symbols: terminals ('$' last) are the ids
+    # 0..len(terminals)-1 and non-terminals follow. `table` is a flat
+    # row-major array of production ids (-1 for an error cell), one row per
+    # non-terminal. Build it once and share it between parses.
+    # follow[row] holds the ids of FOLLOW(non-terminal), for recover().
+
+    def __init__(self, terminals, nonterminals, axiom, productions, table, conflicts, follow=()):
+        self.terminals = list(terminals)
+        self.nonterminals = list(nonterminals)
+        self.symbols = self.terminals + self.nonterminals
+        self.index = {x: i for i, x in enumerate(self.symbols)}
+        self.axiom = axiom
+        self.productions = productions # [(lhs id, rhs ids)]
+        self.table = table
+        self.conflicts = conflicts
+        self.follow = follow
+        self._conflicts = {(c.row, c.symbol): c.choices for c in conflicts}
+        self._expand = [rhs[::-1] for _, rhs in productions]
+
+    @staticmethod
+    def from_grammar(G, previous=None, rows=None, remap=None):
+        # With the `previous` table over the same symbols, only the
+        # non-terminals in `rows` are filled in again; the other rows are
+        # copied, their production ids translated through `remap`.
+        terminals, nonterminals = G.symbol_table()
+        index = {x: i for i, x in enumerate(terminals + nonterminals)}
+        width = len(terminals)
+        productions = [(index[v], tuple(index[x] for x in rule))
+                for v, rule in G.productions()]
+
+        table = array('i', [-1]) * (len(nonterminals) * width)
+        cells = {}
+        if previous is None:
+            rows = set(nonterminals)
+        else:
+            for v in nonterminals:
+                if v not in rows:
+                    start = (index[v] - width) * width
+                    for cell in range(start, start + width):
+                        p = previous.table[cell]
+                        if p >= 0:
+                            table[cell] = remap[p]
+            for row, t, choices in previous.conflicts:
+                if row not in rows:
+                    cell = (index[row] - width) * width + index[t]
+                    cells[cell] = [remap[p] for p in choices]
+
+        def add(v, t, p):
+            cell = (index[v] - width) * width + t
+            if table[cell] < 0:
+                table[cell] = p
+            else:
+                cells.setdefault(cell, [table[cell]]).append(p)
+
+        # same choice order as the per-cell definition: FNE rules first,
+        # then the nullable rules on FOLLOW
+        for p, (v, rule) in enumerate(G.productions()):
+            if v in rows:
+                for t in G._terminal_set(G._FNE_rule(rule)):
+                    add(v, index[t], p)
+        for p, (v, rule) in enumerate(G.productions()):
+            if v in rows and G.is_list_nullable(rule):
+                for t in G._terminal_set(G._FOLLOW(v)):
+                    add(v, index[t], p)
+
+        conflicts = [Conflict(nonterminals[cell // width], terminals[cell % width], choices)
+                for cell, choices in sorted(cells.items())]
+        # the recovery sets of every row, read in bulk
+        FOLLOW = G._FOLLOW_all()
+        follow = [frozenset(index[t] for t in G._terminal_set(FOLLOW[v])) for v in nonterminals]
+        return CompiledLL1(terminals, nonterminals, index[G.axiom],
+            productions, table, conflicts, follow)
+
+    def is_ll1(self):
+        return not self.conflicts
+
+    def recognize(self, tokens, limit=None, tree=False):
+        # stack of symbol ids with the top at the end, and a cursor over
+        # `tokens`: each step is O(1) and nothing is copied
+        if tree:
+            return self._parse_tree(tokens, limit)
+        width = len(self.terminals)
+        end = width - 1
+        index = self.index
+        table = self.table
+        expand = self._expand
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        stack = [end, self.axiom]
+        pop = stack.pop
+        push = stack.extend
+        position = 0
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        steps = 0
+        while t >= 0:
+            top = pop()
+            if top < width:
+                if top != t:
+                    break
+                if t == end:
+                    return ParseResult(True, position)
+                position += 1
+                token = next(tokens, None)
+                t = end if token is None else terminal(token)
+            else:
+                p = table[(top - width) * width + t]
+                if p < 0:
+                    break
+                push(expand[p])
+            if limit is not None:
+                steps += 1
+                if steps >= limit:
+                    break
+        return ParseResult(False, position)
+
+    def _parse_tree(self, tokens, limit):
+        # recognize() that also grows a ParseTree top-down: expanding a node
+        # allocates its children, matching a terminal fills in its token
+        width = len(self.terminals)
+        end = width - 1
+        index = self.index
+        table = self.table
+        expand = self._expand
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        tree = ParseTree(self.symbols, width)
+        stack = [end, self.axiom]
+        nodes = [-1, tree.add(self.axiom)]
+        position = 0
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        steps = 0
+        while t >= 0:
+            top = stack.pop()
+            n = nodes.pop()
+            if top < width:
+                if top != t:
+                    break
+                if t == end:
+                    return ParseResult(True, position, tree)
+                tree.set_token(n, token)
+                position += 1
+                token = next(tokens, None)
+                t = end if token is None else terminal(token)
+            else:
+                p = table[(top - width) * width + t]
+                if p < 0:
+                    break
+                rhs = self.productions[p][1]
+                children = [tree.add(x) for x in rhs]
+                tree.set_children(n, children)
+                stack.extend(expand[p])
+                nodes.extend(reversed(children))
+            if limit is not None:
+                steps += 1
+                if steps >= limit:
+                    break
+        return ParseResult(False, position)
+
+    def recover(self, tokens, max_errors=100):
+        # recognize() that reports a syntax error and goes on, in panic
+        # mode. A terminal on top of the stack that does not match is taken
+        # as missing; a non-terminal with no rule for the lookahead skips
+        # tokens up to one it can start, or gives up on itself at one of
+        # its FOLLOW tokens or the end, and input left after the axiom is
+        # parsed as another one. Each token is read once, so the
+        # whole input costs a single linear pass; the parse stops after
+        # max_errors errors. One error is reported per position.
+        width = len(self.terminals)
+        end = width - 1
+        index = self.index
+        table = self.table
+        expand = self._expand
+        follow = self.follow
+        terminals = self.terminals
+        tokens = iter(tokens)
+
+        def terminal(token):
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        def expected(top):
+            if top < width:
+                return (terminals[top],)
+            row = (top - width) * width
+            return tuple(x for x, p in zip(terminals, table[row:row+width]) if p >= 0)
+
+        errors = []
+        stack = [end, self.axiom]
+        pop = stack.pop
+        push = stack.extend
+        position = 0
+        restarted = -1
+        token = next(tokens, None)
+        t = end if token is None else terminal(token)
+        while True:
+            top = stack[-1]
+            if top < width:
+                if top == t:
+                    pop()
+                    if t == end:
+                        return ParseResult(not errors, position, errors=errors)
+                    position += 1
+                    token = next(tokens, None)
+                    t = end if token is None else terminal(token)
+                    continue
+            else:
+                p = table[(top - width) * width + t] if t >= 0 else -1
+                if p >= 0:
+                    pop()
+                    push(expand[p])
+                    continue
+            if not errors or errors[-1].position != position:
+                errors.append(ParseError(position, token, expected(top)))
+                if len(errors) >= max_errors:
+                    return ParseResult(False, position, errors=errors)
+            if top == end:
+                # input left over: skip to a token that starts the axiom
+                # again and parse on, once per position
+                axiom = (self.axiom - width) * width
+                while t != end and (t < 0 or table[axiom + t] < 0 or restarted == position):
+                    position += 1
+                    token = next(tokens, None)
+                    t = end if token is None else terminal(token)
+                restarted = position
+                if t != end:
+                    push((self.axiom,))
+                continue
+            if top < width:
+                if t < 0:
+                    # a token no rule knows: drop it
+                    position += 1
+                    token = next(tokens, None)
+                    t = end if token is None else terminal(token)
+                else:
+                    pop()
+                continue
+            row = (top - width) * width
+            while t != end and (t < 0 or table[row + t] < 0 and t not in follow[top - width]):
+                position += 1
+                token = next(tokens, None)
+                t = end if token is None else terminal(token)
+            if table[row + t] < 0:
+                pop()
+
+    def choice(self, v, t):
+        # production id used on non-terminal v with lookahead t, KeyError if none
+        width = len(self.terminals)
+        row, column = self.index[v] - width, self.index[t]
+        p = self.table[row * width + column] if row >= 0 and column < width else -1
+        if p < 0:
+            raise KeyError((v, t))
+        return p
+
+    def choices(self, v, t):
+        # every production id competing for the cell, conflicts included
+        if (v, t) in self._conflicts:
+            return list(self._conflicts[v, t])
+        try:
+            return [self.choice(v, t)]
+        except KeyError:
+            return []
+
+
+class Token(namedtuple('Token', 'kind value pos')):
+    # a lexeme: `kind` is the terminal it stands for (None when no rule
+    # matched), `value` the matched text and `pos` its offset in the input
+    __slots__ = ()
+
+    def __str__(self):
+        return self.value
+
+
+class Tokenizer:
+    # regex tokenizer: the (kind, pattern) rules are compiled into one master
+    # pattern of named alternatives, tried in order at each position.
+    # Matches of the `skip` kinds (whitespace, comments) are dropped; a
+    # character no rule matches becomes a Token of kind None, which every
+    # parser rejects at that position. Patterns must not use named groups.
+    # `reach` is how far past a position a rule may need to look to settle
+    # its match there (the longest literal, plus one for its lookahead).
+
+    def __init__(self, rules, skip=(), reach=1):
+        self.rules = list(rules)
+        self.skip = set(skip)
+        self.reach = reach
+        self.kinds = {}
+        parts = []
+        for i, (kind, pattern) in enumerate(self.rules):
+            group = '_%d' % i
+            self.kinds[group] = None if kind in self.skip else kind
+            parts.append('(?P<%s>%s)' % (group, pattern))
+        self.master = re.compile('|'.join(parts))
+
+    SKIP = '<skip>'
+
+    @staticmethod
+    def for_grammar(G, patterns=None, skip=r'\s+'):
+        return Tokenizer.for_terminals(G.T(), patterns, skip)
+
+    @staticmethod
+    def for_terminals(T, patterns=None, skip=r'\s+'):
+        # literal terminals longest first (a word-like one must not run into
+        # a following word character), then `patterns` for the terminals
+        # that stand for a class of lexemes, e.g. {'num': r'\d+'}
+        patterns = patterns or {}
+        literals = sorted((t for t in T if t not in patterns and t != '$'),
+                key=lambda t: (-len(t), t))
+        rules = [(t, re.escape(t) + (r'(?!\w)' if re.match(r'\w', t[-1]) else ''))
+                for t in literals]
+        rules += list(patterns.items())
+        if skip:
+            rules.append((Tokenizer.SKIP, skip))
+        reach = max((len(t) + 1 for t in literals), default=1)
+        return Tokenizer(rules, skip=[Tokenizer.SKIP], reach=reach)
+
+    def _scan(self, text, pos, end, offset=0, final=True, horizon=0):
+        # tokens of text[pos:end] as (token, next position), None for skipped
+        # text. When not `final`, more input may follow: stop at a position
+        # less than `horizon` characters from `end`, where a longer rule or
+        # a failed one could still match once the rest arrives, and before
+        # a match that touches `end`, since it could grow
+        match = self.master.match
+        kinds = self.kinds
+        while pos < end:
+            if not final and end - pos < horizon:
+                return
+            m = match(text, pos)
+            if m is None or m.end() == pos:
+                yield Token(None, text[pos], offset+pos), pos+1
+                pos += 1
+                continue
+            if not final and m.end() == end:
+                return
+            kind = kinds[m.lastgroup]
+            if kind is not None:
+                yield Token(kind, m.group(), offset+pos), m.end()
+            else:
+                yield None, m.end()
+            pos = m.end()
+
+    def tokenize(self, text):
+        for token, _ in self._scan(text, 0, len(text)):
+            if token is not None:
+                yield token
+
+    def tokenize_stream(self, stream, chunk_size=1 << 16):
+        # tokens of a text file-like object, read lazily chunk by chunk: only
+        # the unfinished tail of the previous chunk is kept in memory
+        horizon = max(chunk_size, self.reach)
+        buffer = ''
+        offset = 0
+        while True:
+            data = stream.read(chunk_size)
+            final = not data
+            buffer += data
+            pos = 0
+            for token, pos in self._scan(buffer, 0, len(buffer), offset, final, horizon):
+                if token is not None:
+                    yield token
+            buffer = buffer[pos:]
+            offset += pos
+            if final:
+                return
+
+# parse_many workers: the (table, tokenizer) pair sent once per process
+_batch = None
+
+def _init_batch(table, tokenizer, max_errors):
+    global _batch
+    _batch = table, tokenizer, max_errors
+
+def _recognize_chunk(chunk, batch=None):
+    table, tokenizer, max_errors = batch or _batch
+    results = []
+    for s in chunk:
+        if tokenizer is not None and type(s) == str:
+            s = tokenizer.tokenize(s)
+        if max_errors is None:
+            result = table.recognize(s)
+            results.append((result.accepted, result.position))
+        else:
+            result = table.recover(s, max_errors)
+            results.append((result.accepted, result.position, None, result.errors))
+    return results
 
 
 example = """E → TA
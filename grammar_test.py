@@ -1,6 +1,7 @@
+import io
 import unittest
 
-from grammar import Grammar
+from grammar import Grammar, ParseError, Tokenizer, render_steps
 from pprint import pprint as pp
 
 
@@ -66,6 +67,21 @@ class TestGrammar(unittest.TestCase):
         self.assertEqual(G.FNE("A"),{'a'})
         self.assertEqual(G.FNE("S"),{'a','b','c','d'})
 
+    def test_FNE_left_recursive(self):
+        G = self.G6
+        self.assertEqual(G.FNE("E"),{'0','1'})
+        self.assertEqual(G.FIRST("B"),{'0','1'})
+        self.assertFalse(G.is_nullable("E"))
+
+    def test_analysis_invalidated(self):
+        G = self.G3
+        self.assertEqual(G.FNE("C"),{'c','d'})
+        G.rules = dict(G.rules, C=[['e']])
+        self.assertEqual(G.FNE("C"),{'e'})
+        G.rules['C'].append([])
+        G.invalidate()
+        self.assertTrue(G.is_nullable("S"))
+
     def test_FOLLOW(self):
         G = self.G
         self.assertEqual(G.FOLLOW("E"),{'$',')'})
@@ -74,6 +90,16 @@ class TestGrammar(unittest.TestCase):
         self.assertEqual(G.FOLLOW("A"),{'$',')'})
         self.assertEqual(G.FOLLOW("B"),{'+','$',')'})
 
+    def test_FOLLOW_mutual(self):
+        G = Grammar.from_text("""
+                S → Ac | Bd
+                A → xB | z
+                B → yA | w
+            """)
+        self.assertEqual(G.FOLLOW("A"),{'c','d'})
+        self.assertEqual(G.FOLLOW("B"),{'c','d'})
+        self.assertEqual(G.occurrences()["B"],[('S', 1, 0), ('A', 0, 1)])
+
     def test_parse_table(self):
         G = self.G
         table = G.parse_table(include_conflicts=True)
@@ -88,10 +114,145 @@ class TestGrammar(unittest.TestCase):
         }
         self.assertEqual(table, goal_table)
 
+    def test_ll1_compiled(self):
+        G = self.G
+        ll1 = G.ll1()
+        self.assertIs(ll1, G.ll1())
+        self.assertTrue(ll1.is_ll1())
+        self.assertEqual(G.productions()[ll1.choice('F', '(')], ('F', ['(', 'E', ')']))
+        self.assertRaises(KeyError, ll1.choice, 'F', '+')
+
+        ll1 = self.G5.ll1()
+        self.assertEqual(ll1.conflicts, [('S', 'a', [0, 1, 2])])
+        self.assertEqual(self.G5.parse_table()['S']['a'], ('S', ['A', 'a']))
+
     def test_parse(self):
         G = self.G
         self.assertTrue(G.parse("a+a∗a",print_steps=False))
 
+    def test_parse_untraced(self):
+        G = self.G
+        self.assertTrue(G.parse("a+a∗a", trace=False))
+        self.assertTrue(G.parse(list("(a+a)∗a"), trace=False))
+        result = G.parse("a+∗a", trace=False)
+        self.assertFalse(result)
+        self.assertEqual(result.position, 2)
+        self.assertEqual(G.parse("a+", trace=False).position, 2)
+        self.assertEqual(G.parse("a?", trace=False).position, 1)
+        self.assertFalse(G.parse("a+a", limit=5, trace=False))
+
+        long_input = "(" * 50000 + "a" + "+a∗a)" * 50000
+        self.assertTrue(G.parse(long_input, trace=False))
+
+    def test_structured_results(self):
+        G = self.G
+        self.assertEqual(G.first_follow()['B'], {'FIRST': ['', '∗'], 'FOLLOW': ['$', ')', '+']})
+        self.assertEqual(G.summary()['nonterminals'], ['A', 'B', 'E', 'F', 'T'])
+        accepted, steps = G.parse_steps("a+a∗a")
+        self.assertTrue(accepted)
+        self.assertEqual(steps[1], ['E$', 'a+a∗a$', 'apply E → TA'])
+        self.assertEqual(steps[-1][-1], 'accept')
+        self.assertIn("apply E → TA", G.render_stats_ll1() + render_steps(steps))
+
+        G = self.G5
+        self.assertEqual(G.ll1_conflicts()[0]['rules'], ['S → Aa', 'S → Bb', 'S → ac'])
+        summary = G.lr_table_summary('lr0')
+        self.assertEqual(summary['actions'][4]['c'], ['shift 7', 'reduce A → a', 'reduce B → a'])
+        self.assertEqual(summary['goto'][0], {'A': 1, 'B': 2, 'S': 3})
+        self.assertEqual(len(G.lr0_summary()), 8)
+        accepted, steps = G.lr0_parse_steps("ac")
+        self.assertTrue(accepted)
+
+    def test_parse_many(self):
+        inputs = ["a+a∗a", "a+", "(a)", "", "a∗(a+a)"] * 3
+        expected = [self.G.ll1().recognize(x).position for x in inputs]
+        for workers in (1, 2):
+            results = list(self.G.parse_many(inputs, workers, chunk_size=2))
+            self.assertEqual([bool(r) for r in results], [True, False, True, False, True] * 3)
+            self.assertEqual([r.position for r in results], expected)
+
+        G = Grammar.from_text("expr -> expr '+' num | num")
+        results = G.parse_many(["1 + 22", "1 +"], method='lalr', tokenizer=G.tokenizer({'num': r'\d+'}))
+        self.assertEqual([bool(r) for r in results], [True, False])
+
+    def test_recover(self):
+        G = self.G
+        for kind in ('ll1', 'slr', 'lalr', 'lr1'):
+            if kind == 'll1':
+                parse = lambda s, n=100: G.parse(s, trace=False, recover=True, max_errors=n)
+            else:
+                parse = lambda s, n=100: G.lr_parse(s, kind, trace=False, recover=True, max_errors=n)
+            self.assertEqual(parse("a+a∗a").errors, [])
+            self.assertTrue(parse("a+a∗a"))
+            result = parse("a++a∗(a+)a")
+            self.assertFalse(result)
+            self.assertEqual([e.position for e in result.errors], [2, 8, 9], kind)
+            self.assertEqual(result.errors[0], ParseError(2, '+', ('(', 'a')))
+            self.assertEqual(result.position, 10)
+            self.assertEqual(parse("((a)").errors[0].expected[0], ')')
+            # one linear pass, capped
+            result = parse("a+)" * 10000, 10**6)
+            self.assertGreaterEqual(len(result.errors), 10000, kind)
+            self.assertEqual(result.position, 30000)
+            self.assertEqual(len(parse("a+)" * 10000, 5).errors), 5)
+        # recovery whatever trace is, and never with a tree
+        for result in [G.parse("a?ab", print_steps=False, recover=True),
+                G.lr_parse("a?ab", print_steps=False, recover=True)]:
+            self.assertFalse(result)
+            self.assertEqual(result.errors[0], ParseError(1, '?', (')', '+', '∗', '$')))
+        self.assertRaises(ValueError, G.parse, "a", trace=False, tree=True, recover=True)
+        self.assertRaises(ValueError, G.lr_parse, "a", tree=True, recover=True)
+        results = list(G.parse_many(["a+a", "a++a", "(a"], method='lalr', recover=True))
+        self.assertEqual([[e.position for e in r.errors] for r in results], [[], [2], [2]])
+
+    def test_profile(self):
+        G = self.G
+        self.assertIsNone(G.profile)
+        G.FOLLOW('A')
+        profile = G.instrument()
+        G.parse("a+a∗a", print_steps=False)
+        G.lr_parse("a+a", trace=False)
+        phases = profile.as_dict()['phases']
+        self.assertNotIn('FOLLOW_all', phases) # built before instrumenting
+        self.assertEqual(phases['FOLLOW']['calls'], 2)
+        self.assertEqual(phases['parse']['calls'], 1)
+        self.assertIn('lr_table:lalr', phases)
+        self.assertEqual(profile.counters['lalr parse tokens'], 3)
+        self.assertEqual(profile.counters['ll1 parse steps'], len(G.parse_steps("a+a∗a")[1]) - 1)
+        self.assertEqual(profile.counters['ll1 conflicts'], 0)
+        self.assertEqual(profile.counters['lr0 states'], len(G.lr0_automaton()))
+        self.assertIs(G.instrument(), profile)
+        self.assertIsNone(G.instrument(False))
+        G.render_stats_ll1()
+        self.assertNotIn('render_stats_ll1', profile.phases)
+
+    def test_edit(self):
+        G = self.G
+        G.ll1(), G.lr0_automaton(), G.lr_table('lalr')
+        G.add_production('F', list('[E]'))
+        G.add_production('B', list('/FB'))
+        G.replace_production('A', [], list('-T'))
+        G.remove_production('F', list('(E)'))
+        with self.assertRaises(ValueError):
+            G.remove_production('F', list('(E)'))
+        fresh = Grammar.from_text("""
+                E → TA
+                A → +TA | -T
+                T → FB
+                B → ∗FB | ɛ | /FB
+                F → a | [E]
+            """)
+        self.assertEqual(G.rules, fresh.rules)
+        for x in 'EABTF':
+            self.assertEqual(G.FIRST(x), fresh.FIRST(x))
+            self.assertEqual(G.FOLLOW(x), fresh.FOLLOW(x))
+        self.assertEqual(list(G.ll1().table), list(fresh.ll1().table))
+        self.assertEqual(G.lr0_states(), fresh.lr0_states())
+        self.assertEqual(G.lr_table_summary('lalr'), fresh.lr_table_summary('lalr'))
+        self.assertFalse(G.parse("a+[a]", trace=False))
+        self.assertTrue(G.parse("a+[a-a]∗a-a/a", trace=False))
+        self.assertTrue(G.lr_parse("a+[a-a]∗a-a/a", trace=False))
+
     def test_lr0(self):
         G = self.G4
         self.assertEqual(G.state2strstr([("S'", ['S'], 1)]),"S' → S•")
@@ -108,10 +269,162 @@ class TestGrammar(unittest.TestCase):
         states = G.lr0_states()
         self.assertEqual(len(states),8)
 
+    def test_lr0_closure_deep(self):
+        G = Grammar.from_text("""
+                S → A
+                A → B
+                B → C
+                C → D
+                D → E
+                E → x
+            """)
+        closure = G.lr0_closure([("S'", ['S'], 0)])
+        self.assertEqual(len(closure), 7)
+        self.assertIn(('E', ['x'], 0), closure)
+        items = G.lr0_items()
+        self.assertEqual(items.as_tuple(items.item_of('E', ['x'], 1)), ('E', ['x'], 1))
+        # a repeated rule keeps both productions reachable
+        items = Grammar('S', {'S': [['a'], ['a']]}).lr0_items()
+        self.assertEqual([items.prod[items.item_of('S', ['a'], 0, k)] for k in (0, 1)], [0, 1])
+
+    def test_lr0_automaton(self):
+        G = self.G4
+        automaton = G.lr0_automaton()
+        self.assertEqual(len(automaton), 6)
+        self.assertEqual(automaton.goto[0], {'(': 1, 'S': 2, 'a': 3})
+        self.assertEqual(automaton.goto[1]['('], 1)
+        states = G.lr0_states()
+        self.assertEqual(states[1]['origin'], {0, 1})
+        self.assertEqual(G.lr0_GOTO(states)[1], {'S': 4})
+
+    def test_lr_recognize(self):
+        G = self.G6
+        self.assertTrue(G.lr0_parse("1+1*0", print_steps=False))
+        self.assertFalse(G.lr0_parse("1+*0", print_steps=False))
+        table = G.lr_table('lr0')
+        self.assertTrue(table.recognize("1+1*0"))
+        result = table.recognize("1+*0")
+        self.assertFalse(result)
+        self.assertEqual(result.position, 2)
+        self.assertEqual(table.recognize("1+").position, 2)
+        self.assertEqual(table.recognize("1?").position, 1)
+        self.assertTrue(table.recognize("1" + "+0" * 100000))
+
+        G = self.G
+        for kind in ('slr', 'lalr', 'lr1'):
+            self.assertTrue(G.lr_parse("(a+a)∗a", kind, trace=False))
+            self.assertFalse(G.lr_parse("(a+a∗a", kind, trace=False))
+        self.assertTrue(G.lr_parse("(" * 20000 + "a" + ")" * 20000, trace=False))
+
+    def test_parse_tree(self):
+        G = self.G
+        for result in (G.parse("a+a∗a", trace=False, tree=True),
+                G.lr_parse("a+a∗a", trace=False, tree=True)):
+            tree = result.tree
+            self.assertEqual(tree.text(), "a+a∗a")
+            self.assertEqual(tree.label(tree.root), 'E')
+            self.assertEqual([tree.label(n) for n in tree.children_of(tree.root)], ['T', 'A'])
+            self.assertEqual([tree.label(n) for n in tree.preorder()][:5],
+                ['E', 'T', 'F', 'a', 'B'])
+            self.assertEqual([tree.label(n) for n in tree.postorder()][:5],
+                ['a', 'F', 'B', 'T', '+'])
+            self.assertEqual(len(list(tree.leaves())), 5)
+        self.assertIsNone(G.parse("a+a", trace=False).tree)
+        self.assertIsNone(G.parse("a+", trace=False, tree=True).tree)
+
+        deep = "(" * 30000 + "a" + ")" * 30000
+        tree = G.lr_parse(deep, trace=False, tree=True).tree
+        self.assertEqual(tree.text(), deep)
+        self.assertEqual(sum(1 for _ in tree.postorder()), len(tree))
+
+    def test_words(self):
+        G = Grammar.from_text("""
+                expr -> expr '+' term | term
+                term -> term '*' factor | factor
+                factor -> '(' expr ')' | num | id
+                factor -> "|" | 'ɛ' | ɛ
+            """)
+        self.assertEqual(G.rules['expr'], [['expr', '+', 'term'], ['term']])
+        self.assertEqual(G.rules['factor'][3:], [['|'], ['ɛ'], []])
+        self.assertEqual(G.vrules2str('term'), "term → term * factor | factor")
+        self.assertEqual(Grammar.from_text("E → T A").rules, {'E': [['T', 'A']]})
+        self.assertEqual(Grammar.from_text("E → TA").rules, {'E': [['T', 'A']]})
+
+        tokenizer = G.tokenizer({'num': r'\d+', 'id': r'[a-z]\w*'})
+        tokens = list(tokenizer.tokenize("12 +x1*|"))
+        self.assertEqual([t.kind for t in tokens], ['num', '+', 'id', '*', '|'])
+        self.assertEqual(tokens[2].value, 'x1')
+        self.assertEqual(tokens[2].pos, 4)
+        self.assertEqual([t.kind for t in tokenizer.tokenize("1 ? 2")], ['num', None, 'num'])
+
+        table = G.lr_table('lalr')
+        result = table.recognize(tokenizer.tokenize("12 + x1 * (3+y)"), tree=True)
+        self.assertTrue(result)
+        self.assertEqual(result.tree.text(' '), "12 + x1 * ( 3 + y )")
+        self.assertEqual(table.recognize(tokenizer.tokenize("12 + ? 3")).position, 2)
+        self.assertTrue(G.lr_parse(['num', '+', 'id'], trace=False))
+
+    def test_tokenize_stream(self):
+        G = Grammar.from_text("""
+                list -> item list | ɛ
+                item -> word | "[" list "]"
+            """)
+        tokenizer = G.tokenizer({'word': r'[a-z]+'})
+        text = "[alpha [beta gamma] delta] " * 1000
+        tokens = list(tokenizer.tokenize_stream(io.StringIO(text), chunk_size=7))
+        self.assertEqual(tokens, list(tokenizer.tokenize(text)))
+        self.assertTrue(G.ll1().recognize(iter(tokens)))
+        self.assertTrue(G.parse(tokenizer.tokenize(text), trace=False))
+        self.assertTrue(G.parse("[ word [ ] ]", trace=False))
+        # chunks that split operators and tokens longer than a chunk
+        for terminals, text in [(['===', '=', 'x', 'y'], "x === y==x=y ==="),
+                (['abc', 'a'], "abc a abca aabc abc")]:
+            tokenizer = Tokenizer.for_terminals(terminals)
+            expected = list(tokenizer.tokenize(text))
+            for chunk_size in range(1, len(text) + 1):
+                self.assertEqual(list(tokenizer.tokenize_stream(io.StringIO(text), chunk_size)),
+                    expected, chunk_size)
+
     def test_slr1(self):
         G = self.G5
-        states = G.lr0_states()
-        #G.slr1_table(states)
+        self.assertFalse(G.lr_table('lr0').is_deterministic())
+        table = G.lr_table('slr')
+        self.assertTrue(table.is_deterministic())
+        self.assertEqual(table.describe(table.action_of(4, 'a')), "reduce A → a")
+        self.assertEqual(table.describe(table.action_of(4, 'b')), "reduce B → a")
+        self.assertEqual(table.describe(table.action_of(3, '$')), "accept")
+        self.assertEqual(table.goto_of(0, 'S'), 3)
+
+    def test_lalr1(self):
+        G = Grammar.from_text("""
+                S → L=R | R
+                L → *R | i
+                R → L
+            """)
+        self.assertEqual(len(G.lr_table('slr').conflicts), 1)
+        self.assertTrue(G.lr_table('lalr').is_deterministic())
+        self.assertEqual(G.lr_table('lalr').nstates, 10)
+
+        G = Grammar.from_text("""
+                S → aAd | bBd | aBe | bAe
+                A → c
+                B → c
+            """)
+        conflicts = G.lr_table('lalr').conflicts
+        self.assertEqual([c.symbol for c in conflicts], ['d', 'e'])
+        self.assertEqual(G.lr_table('lalr').actions(6, 'd'), [-5, -6])
+        self.assertTrue(G.lr_table('lr1').is_deterministic())
+        self.assertEqual(len(G.lr1_automaton()), 14)
+        self.assertEqual(G.lalr1_lookaheads()[6, 4], frozenset('de'))
+
+    def test_terminal_sets(self):
+        # bitmasks inside, sets of terminal names at the API
+        G = self.G
+        self.assertIsInstance(G.FOLLOW_all()['T'], frozenset)
+        self.assertEqual(G.FNE_rule(list('BA')), {'∗', '+'})
+        G.add_production('A', list('-TA'))
+        self.assertEqual(G.FOLLOW('F'), {'∗', '+', '-', '$', ')'})
+        self.assertEqual(G.FIRST('A'), {'+', '-', ''})
 
     def test_stats(self):
         G = self.G
@@ -0,0 +1,365 @@
+"""
+LL(k) lookahead for the cells an LL(1) table cannot decide.
+
+FIRST_k and FOLLOW_k sets are tries over terminal ids, hash-consed in a
+Tries store: equal sets are the same node, so the fixpoints compare ints,
+and a trie only ever links to shared subtries. A set like FIRST_2(AB)
+with a thousand terminals in each of A and B is a root whose thousand
+edges all lead to the single node of FIRST_1(B), never the million pairs
+it stands for. Every node counts against the store's `limit`, which keeps
+memory and build time bounded whatever the alphabet.
+
+LLkTable keeps G.ll1() as it is and only replaces its conflicted cells by
+a decision trie on the tokens after the lookahead (strong LL(k): the
+alternatives are told apart on FIRST_k(rule) FOLLOW_k(lhs)). The driver
+reads ahead only in those cells, through a buffer of at most k-1 tokens.
+
+    G = Grammar.from_text("S → Aa | Bb | ac\\nA → a\\nB → a")
+    llk.parse(G, "ab", k=2)   # ParseResult(accepted=True, position=2)
+"""
+
+from collections import deque
+
+from grammar import Conflict, ParseResult, ParseTree, Token
+
+
+class Tries:
+    # hash-consed tries of terminal strings. Node n holds end[n], true when
+    # the empty string is in the set, and children[n], terminal -> node.
+    # EMPTY is the empty set and EPS the set of the empty string; a string
+    # cut at length k ends there like a complete one.
+    EMPTY = 0
+    EPS = 1
+
+    def __init__(self, limit=1000000):
+        self.limit = limit
+        self.end = []
+        self.children = []
+        self._nodes = {}
+        self._union = {}
+        self._concat = {}
+        self._truncate = {}
+        self.node(False, {})
+        self.node(True, {})
+
+    def __len__(self):
+        return len(self.end)
+
+    def node(self, end, children):
+        key = (end, tuple(sorted(children.items())))
+        n = self._nodes.get(key)
+        if n is None:
+            if len(self.end) >= self.limit:
+                raise ValueError("lookahead sets need more than %d trie nodes" % self.limit)
+            n = self._nodes[key] = len(self.end)
+            self.end.append(end)
+            self.children.append(dict(children))
+        return n
+
+    def terminal(self, t):
+        return self.node(False, {t: Tries.EPS})
+
+    def union(self, a, b):
+        if a == b or b == Tries.EMPTY:
+            return a
+        if a == Tries.EMPTY:
+            return b
+        key = (a, b) if a < b else (b, a)
+        n = self._union.get(key)
+        if n is None:
+            children = dict(self.children[a])
+            for t, c in self.children[b].items():
+                children[t] = self.union(children[t], c) if t in children else c
+            n = self._union[key] = self.node(self.end[a] or self.end[b], children)
+        return n
+
+    def union_all(self, nodes):
+        # one union of many sets, without the intermediate nodes
+        nodes = set(nodes)
+        nodes.discard(Tries.EMPTY)
+        if len(nodes) == 2:
+            return self.union(*nodes)
+        if len(nodes) < 2:
+            return nodes.pop() if nodes else Tries.EMPTY
+        children = {}
+        for n in nodes:
+            for t, c in self.children[n].items():
+                children.setdefault(t, []).append(c)
+        return self.node(any(self.end[n] for n in nodes),
+            {t: self.union_all(c) for t, c in children.items()})
+
+    def truncate(self, a, k):
+        # the strings of a cut to their first k terminals
+        if a == Tries.EMPTY:
+            return a
+        if k == 0:
+            return Tries.EPS
+        n = self._truncate.get((a, k))
+        if n is None:
+            children = {t: self.truncate(c, k-1) for t, c in self.children[a].items()}
+            n = self._truncate[a, k] = self.node(self.end[a], children)
+        return n
+
+    def concat(self, a, b, k):
+        # xy cut to k terminals for x in a (already cut to k) and y in b
+        if k == 0 or b == Tries.EPS or a == Tries.EMPTY:
+            return a
+        if b == Tries.EMPTY:
+            return b
+        n = self._concat.get((a, b, k))
+        if n is None:
+            children = {}
+            for t, c in self.children[a].items():
+                c = self.concat(c, b, k-1)
+                if c != Tries.EMPTY:
+                    children[t] = c
+            n = self.node(False, children)
+            if self.end[a]:
+                n = self.union(n, self.truncate(b, k))
+            self._concat[a, b, k] = n
+        return n
+
+    def strings(self, a):
+        # the set as tuples of terminal ids; this one does materialize them
+        result = []
+        stack = [(a, ())]
+        while stack:
+            n, prefix = stack.pop()
+            if self.end[n]:
+                result.append(prefix)
+            stack.extend((c, prefix + (t,)) for t, c in self.children[n].items())
+        return result
+
+
+class Lookahead:
+    # FIRST_k and FOLLOW_k of every symbol of G as nodes of `tries`, over
+    # the terminal ids of G.symbol_table(). A FOLLOW_k string that reaches
+    # the end of the input ends with '$'.
+
+    def __init__(self, G, k, limit=1000000):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        terminals, nonterminals = G.symbol_table()
+        self.terminals = terminals
+        self.index = {x: i for i, x in enumerate(terminals)}
+        self.tries = tries = Tries(limit)
+        self.first = {v: Tries.EMPTY for v in nonterminals}
+        for t in terminals:
+            self.first[t] = tries.terminal(self.index[t])
+        occurrences = G.occurrences()
+        rules = G.rules
+
+        # FIRST_k: a non-terminal is revisited when a symbol of its rules grows
+        work = list(nonterminals)
+        pending = set(work)
+        while work:
+            v = work.pop()
+            pending.discard(v)
+            first = tries.union_all(self.sequence(rule) for rule in rules[v])
+            if first != self.first[v]:
+                self.first[v] = first
+                for u, _, _ in occurrences.get(v, ()):
+                    if u not in pending:
+                        pending.add(u)
+                        work.append(u)
+
+        # FOLLOW_k: B gets FIRST_k(β) FOLLOW_k(A) from each A → αBβ
+        suffix = {}
+        for v, R in rules.items():
+            for j, rule in enumerate(R):
+                for i, x in enumerate(rule):
+                    if x in rules:
+                        suffix[v, j, i] = self.sequence(rule[i+1:])
+        self.follow = {v: Tries.EMPTY for v in nonterminals}
+        end = tries.terminal(self.index['$'])
+        work = list(nonterminals)
+        pending = set(work)
+        while work:
+            v = work.pop()
+            pending.discard(v)
+            follow = tries.union_all([end if v == G.axiom else Tries.EMPTY] +
+                [tries.concat(suffix[u, j, i], self.follow[u], k)
+                    for u, j, i in occurrences.get(v, ())])
+            if follow != self.follow[v]:
+                self.follow[v] = follow
+                for rule in rules[v]:
+                    for x in rule:
+                        if x in rules and x not in pending:
+                            pending.add(x)
+                            work.append(x)
+
+    def sequence(self, symbols):
+        # FIRST_k of a list of symbols
+        tries = self.tries
+        n = Tries.EPS
+        for x in symbols:
+            n = tries.concat(n, self.first[x], self.k)
+            if n == Tries.EMPTY:
+                break
+        return n
+
+    def _strings(self, n):
+        terminals = self.terminals
+        return frozenset(tuple(terminals[t] for t in s) for s in self.tries.strings(n))
+
+    def FIRST(self, x):
+        # FIRST_k(x) as tuples of terminals, () standing for ɛ
+        return self._strings(self.first[x])
+
+    def FOLLOW(self, x):
+        return self._strings(self.follow[x])
+
+
+class LLkTable:
+    # G.ll1() with its conflicted cells decided on up to k tokens. Those
+    # cells hold -2-d in `table`, d indexing `decisions`: nested dicts from
+    # the next terminal to a production id or to a deeper dict. `conflicts`
+    # lists the cells k tokens still do not decide, with the productions
+    # left competing; they fall back to the first of them, as in LL(1).
+
+    def __init__(self, G, k=2, limit=1000000):
+        ll1 = G.ll1()
+        self.k = k
+        self.terminals = ll1.terminals
+        self.nonterminals = ll1.nonterminals
+        self.symbols = ll1.symbols
+        self.index = ll1.index
+        self.axiom = ll1.axiom
+        self.productions = ll1.productions
+        self._expand = ll1._expand
+        self.table = ll1.table[:]
+        self.decisions = []
+        self.conflicts = []
+        if not ll1.conflicts:
+            self.lookahead = None
+            return
+        self.lookahead = lookahead = Lookahead(G, k, limit)
+        tries = lookahead.tries
+        productions = G.productions()
+        width = len(self.terminals)
+        memo = {}
+
+        def decide(alternatives, depth, unresolved):
+            # alternatives: [(production id, trie of what may follow the
+            # tokens read so far)], in LL(1) choice order
+            if len({p for p, _ in alternatives}) == 1:
+                return alternatives[0][0]
+            key = tuple(alternatives)
+            if key in memo:
+                d, left = memo[key]
+                unresolved.update(left)
+                return d
+            branches = {}
+            if depth < k:
+                for p, n in alternatives:
+                    for t, c in tries.children[n].items():
+                        branches.setdefault(t, []).append((p, c))
+            left = set()
+            if branches:
+                d = {t: decide(branch, depth+1, left) for t, branch in branches.items()}
+            else:
+                d = alternatives[0][0]
+                left.update(p for p, _ in alternatives)
+            memo[key] = d, left
+            unresolved.update(left)
+            return d
+
+        for v, t, choices in ll1.conflicts:
+            column = self.index[t]
+            alternatives = []
+            for p in choices:
+                rule = productions[p][1]
+                n = tries.concat(lookahead.sequence(rule), lookahead.follow[v], k)
+                alternatives.append((p, tries.children[n].get(column, Tries.EMPTY)))
+            unresolved = set()
+            d = decide(alternatives, 1, unresolved)
+            cell = (self.index[v] - width) * width + column
+            if d.__class__ is dict:
+                self.table[cell] = -2 - len(self.decisions)
+                self.decisions.append(d)
+            else:
+                self.table[cell] = d
+            if unresolved:
+                self.conflicts.append(Conflict(v, t, [p for p in choices if p in unresolved]))
+
+    def is_llk(self):
+        return not self.conflicts
+
+    def recognize(self, tokens, limit=None, tree=False):
+        # CompiledLL1.recognize, peeking past the lookahead in the decided
+        # cells; with tree=True the ParseTree grows top-down as there
+        width = len(self.terminals)
+        end = width - 1
+        index = self.index
+        table = self.table
+        decisions = self.decisions
+        expand = self._expand
+        tokens = iter(tokens)
+        ahead = deque()
+
+        def terminal(token):
+            if token is None:
+                return end
+            if token.__class__ is Token:
+                token = token.kind
+            t = index.get(token, -1)
+            return t if t < end else -1
+
+        if tree:
+            parse_tree = ParseTree(self.symbols, width)
+            nodes = [-1, parse_tree.add(self.axiom)]
+        stack = [end, self.axiom]
+        position = 0
+        token = next(tokens, None)
+        t = terminal(token)
+        steps = 0
+        while t >= 0:
+            top = stack.pop()
+            if tree:
+                n = nodes.pop()
+            if top < width:
+                if top != t:
+                    break
+                if t == end:
+                    return ParseResult(True, position, parse_tree if tree else None)
+                if tree:
+                    parse_tree.set_token(n, token)
+                position += 1
+                token = ahead.popleft() if ahead else next(tokens, None)
+                t = terminal(token)
+            else:
+                p = table[(top - width) * width + t]
+                if p < -1:
+                    p = decisions[-p-2]
+                    i = 0
+                    while p.__class__ is dict:
+                        if i == len(ahead):
+                            ahead.append(next(tokens, None))
+                        p = p.get(terminal(ahead[i]), -1)
+                        i += 1
+                    if p < 0:
+                        position += i
+                        break
+                if p < 0:
+                    break
+                stack.extend(expand[p])
+                if tree:
+                    children = [parse_tree.add(x) for x in self.productions[p][1]]
+                    parse_tree.set_children(n, children)
+                    nodes.extend(reversed(children))
+            if limit is not None:
+                steps += 1
+                if steps >= limit:
+                    break
+        return ParseResult(False, position)
+
+
+def table(G, k=2, limit=1000000):
+    # G's LL(k) table, kept with its other analyses until G changes
+    return G._cached(('llk', str(k)), lambda: LLkTable(G, k, limit))
+
+
+def parse(G, s, k=2, tree=False):
+    # LL(k) parse of an input string or token list
+    return table(G, k).recognize(G.tokens(s), tree=tree)
@@ -0,0 +1,61 @@
+import time
+import unittest
+
+import llk
+from grammar import Grammar
+
+
+class TestLLk(unittest.TestCase):
+
+    def test_lookahead(self):
+        G = Grammar.from_text("S → Aa | Bb | ac\nA → a\nB → a")
+        lookahead = llk.Lookahead(G, 2)
+        self.assertEqual(lookahead.FIRST('S'), {('a', 'a'), ('a', 'b'), ('a', 'c')})
+        self.assertEqual(lookahead.FOLLOW('A'), {('a', '$')})
+        self.assertEqual(lookahead.FOLLOW('S'), {('$',)})
+        G = Grammar.from_text("S → Aab\nA → a | ɛ")
+        lookahead = llk.Lookahead(G, 3)
+        self.assertEqual(lookahead.FIRST('A'), {('a',), ()})
+        self.assertEqual(lookahead.FIRST('S'), {('a', 'a', 'b'), ('a', 'b')})
+        self.assertEqual(lookahead.FOLLOW('A'), {('a', 'b', '$')})
+
+    def test_parse(self):
+        G = Grammar.from_text("S → Aa | Bb | ac\nA → a\nB → a")
+        self.assertTrue(G.ll1().conflicts)
+        self.assertEqual(llk.table(G, 2).conflicts, [])
+        for s, expected in {"aa": True, "ab": True, "ac": True, "ad": 1, "a": 1, "": 0, "aab": 2}.items():
+            result = llk.parse(G, s)
+            self.assertEqual(result.accepted, expected is True, s)
+            self.assertEqual(result.position, 2 if expected is True else expected, s)
+        self.assertEqual(llk.parse(G, "ab", tree=True).tree.pretty(), "S\n  B\n    a\n  b")
+
+        # a nullable rule decided on FOLLOW_2
+        G = Grammar.from_text("S → Aab\nA → a | ɛ")
+        self.assertEqual([bool(llk.parse(G, s)) for s in ["aab", "ab", "b", "aaab"]],
+            [True, True, False, False])
+
+        # k tokens are not always enough
+        G = Grammar.from_text("S → aab | aac")
+        self.assertEqual(llk.table(G, 2).conflicts[0].choices, [0, 1])
+        self.assertFalse(llk.parse(G, "aac", k=2))
+        self.assertEqual(llk.table(G, 3).conflicts, [])
+        self.assertTrue(llk.parse(G, "aac", k=3))
+
+    def test_large_alphabet(self):
+        # FIRST_3(S) has 2·n² strings; the tries hold O(n) nodes
+        n = 5000
+        terminals = ['t%d' % i for i in range(n)]
+        G = Grammar('S', {'S': [['A', 'A', 'c'], ['A', 'A', 'd']], 'A': [[t] for t in terminals]})
+        start = time.perf_counter()
+        table = llk.table(G, 3)
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(table.conflicts, [])
+        self.assertLess(len(table.lookahead.tries), 2*n)
+        self.assertTrue(llk.parse(G, ['t1', 't7', 'd'], k=3))
+        self.assertEqual(llk.parse(G, ['t1', 't7', 'e'], k=3).position, 2)
+        with self.assertRaises(ValueError):
+            llk.LLkTable(G, 3, limit=100)
+
+
+if __name__ == '__main__':
+    unittest.main()
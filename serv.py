@@ -1,53 +1,260 @@
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, jsonify, abort, make_response
+import earley
+import glr
 import grammar
 import os
+import threading
+from collections import OrderedDict
 
 app = Flask(__name__)
 
-from io import StringIO
-import sys
 
-class Capturing(list):
-    def __enter__(self):
-        self._stdout = sys.stdout
-        sys.stdout = self._stringio = StringIO()
-        return self
-    def __exit__(self, *args):
-        self.extend(self._stringio.getvalue().splitlines())
-        sys.stdout = self._stdout
+def normalize(text):
+    return '\n'.join(l.strip() for l in text.split('\n') if l.strip())
+
+
+class AnalysisCache:
+    # bounded LRU of analyzed grammars, keyed by normalized grammar text.
+    # An entry is the Grammar (with its cached tables), the rendered
+    # analysis sections and the JSON analysis, so a repeated grammar only
+    # pays for parsing.
+
+    def __init__(self, size=128):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text):
+        key = normalize(text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = analyze(key)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def title(x):
+    return '\n'.join(['', x+" analyis", '---------------', ''])
+
+def parse(x):
+    return '\n'.join(['', x+" parsing", '---', ''])
+
+
+def section(build):
+    # build one section of the analysis; a failure only loses that section
+    try:
+        return build()
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def analysis(G):
+    def ll1():
+        parse_table = G.parse_table(include_conflicts=True)
+        return {
+            'first_follow': G.first_follow(),
+            'table': {v: {t: [G.rule2str(*rule) for rule in cell] for t, cell in row.items()}
+                for v, row in parse_table.items()},
+            'conflicts': G.ll1_conflicts(),
+        }
+    return {
+        'grammar': section(G.summary),
+        'll1': section(ll1),
+        'lr0': section(lambda: {
+            'states': G.lr0_summary(),
+            'table': G.lr_table_summary('lr0'),
+        }),
+        'slr': section(lambda: G.lr_table_summary('slr')),
+        'lalr': section(lambda: G.lr_table_summary('lalr')),
+    }
+
+
+def rendered(render):
+    result = section(render)
+    return result['error'] if isinstance(result, dict) else result
+
+
+def analyze(text, profile=False):
+    # the Grammar (None if it could not be read), the rendered grammar
+    # description, LL(1) and LR(0) analysis, and the JSON analysis; each
+    # section holds its own error message when it fails. With
+    # profile=True the grammar records its phases in G.profile
+    entry = {'grammar': None, 'header': '', 'll1': '', 'lr0': '', 'analysis': None, 'error': None}
+    try:
+        G = grammar.Grammar.from_text(text)
+    except Exception as e:
+        entry['error'] = str(e)
+        return entry
+    if G.axiom is None:
+        entry['error'] = "the grammar is empty"
+        return entry
+    if profile:
+        G.instrument()
+    entry['header'] = rendered(G.render_grammar)
+    entry['ll1'] = title('LL(1)') + '\n' + rendered(G.render_stats_ll1)
+    entry['lr0'] = title('LR(0)') + '\n' + rendered(G.render_stats_lr0)
+    entry['analysis'] = analysis(G)
+    entry['grammar'] = G
+    return entry
+
+
+cache = AnalysisCache(int(os.getenv("GRAMMAR_CACHE_SIZE", 128)))
+
+
+def parsed(name, steps, to_parse):
+    try:
+        _, rows = steps(to_parse)
+        return parse(name) + '\n' + grammar.render_steps(rows)
+    except Exception as e:
+        return parse(name) + '\n' + str(e)
+
 
 @app.route('/')
 def hello_world():
     input = request.args.get('input',grammar.example)
     to_parse = request.args.get('to_parse',"a+a∗a")
-    G = grammar.Grammar.from_text(input)
-    with Capturing() as output:
-        def title(x):
-            print()
-            print(x,"analyis")
-            print('---------------')
-            print()
-        def parse(x):
-            print()
-            print(x,"parsing")
-            print('---')
-            print()
-
-        try:
-            G.print_grammar()
-            title('LL(1)')
-            G.stats_ll1()
-            parse('LL(1)')
-            G.parse(to_parse)
-            title('LR(0)')
-            G.stats_lr0()
-            parse('LR(0)')
-            G.lr0_parse(to_parse)
-        except Exception as e:
-            print(e)
+    entry = cache.get(input)
+    G = entry['grammar']
+    output = [entry['header'], entry['ll1']]
+    if G is not None:
+        output.append(parsed('LL(1)', G.parse_steps, to_parse))
+    output.append(entry['lr0'])
+    if G is not None:
+        output.append(parsed('LR(0)', G.lr0_parse_steps, to_parse))
+    if entry['error']:
+        output.append(entry['error'])
     return render_template('index.html', input=input,
-            to_parse=to_parse, output='\n'.join(output))
+            to_parse=to_parse, output='\n'.join(x for x in output if x))
+
+
+def error(message):
+    # answer 400 with a JSON error from anywhere in a request
+    abort(make_response(jsonify({'error': message}), 400))
+
+
+def params():
+    values = dict(request.args.items())
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            error("the JSON body must be an object")
+        values.update(body)
+    return values
+
+
+def flag(value):
+    return value in (True, 1, '1', 'true', 'yes')
+
+
+@app.route('/api/analyze', methods=['GET', 'POST'])
+def api_analyze():
+    entry = cache.get(params().get('grammar', ''))
+    if entry['error']:
+        return jsonify({'error': entry['error']}), 400
+    return jsonify(entry['analysis'])
+
+
+METHODS = ('ll1', 'lr0', 'slr', 'lalr', 'lr1')
+PARSE_METHODS = METHODS + ('glr', 'earley')
+
+@app.route('/api/parse', methods=['GET', 'POST'])
+def api_parse():
+    values = params()
+    entry = cache.get(values.get('grammar', ''))
+    if entry['error']:
+        return jsonify({'error': entry['error']}), 400
+    G = entry['grammar']
+    method = values.get('method', 'll1')
+    if method not in PARSE_METHODS:
+        return jsonify({'error': "method must be one of " + ', '.join(PARSE_METHODS)}), 400
+    to_parse = values.get('input', '')
+    recover = flag(values.get('recover'))
+    if recover and method not in METHODS:
+        return jsonify({'error': "recover needs one of " + ', '.join(METHODS)}), 400
+    if recover and flag(values.get('tree')):
+        return jsonify({'error': "recover and tree cannot be combined"}), 400
+
+    if method in ('glr', 'earley'):
+        # the shared packed forest of every parse, for any grammar
+        if method == 'glr':
+            result = glr.parse(G, to_parse, 'lalr', tree=flag(values.get('tree')))
+        else:
+            result = earley.parse(G, to_parse, tree=flag(values.get('tree')))
+        response = {'accepted': result.accepted, 'position': result.position}
+        if result.tree is not None:
+            count = result.tree.count()
+            response['parses'] = None if count == float('inf') else count
+            response['forest'] = result.tree.as_dict()
+        return jsonify(response)
+    if method == 'll1':
+        result = G.parse(to_parse, trace=False, tree=flag(values.get('tree')), recover=recover)
+    else:
+        result = G.lr_parse(to_parse, method, trace=False, tree=flag(values.get('tree')),
+            recover=recover)
+    response = {'accepted': result.accepted, 'position': result.position}
+    if recover:
+        response['errors'] = [{'position': e.position, 'token': None if e.token is None else str(e.token),
+            'expected': list(e.expected)} for e in result.errors]
+    if result.tree is not None:
+        response['tree'] = result.tree.as_dict()
+    if flag(values.get('steps')):
+        if method == 'll1':
+            _, rows = G.parse_steps(to_parse)
+        else:
+            _, rows = G.lr_parse_steps(to_parse, method)
+        response['steps'] = rows
+    return jsonify(response)
+
+
+@app.route('/api/profile', methods=['GET', 'POST'])
+def api_profile():
+    # phase timings and counters of a fresh, uncached analysis of the
+    # grammar, and of a parse of `input` when one is given
+    values = params()
+    method = values.get('method', 'll1')
+    if method not in METHODS:
+        return jsonify({'error': "method must be one of " + ', '.join(METHODS)}), 400
+    entry = analyze(normalize(values.get('grammar', '')), profile=True)
+    if entry['error']:
+        return jsonify({'error': entry['error']}), 400
+    G = entry['grammar']
+    if 'input' in values:
+        if method == 'll1':
+            G.parse(values['input'], trace=False)
+            G.parse_steps(values['input'])
+        else:
+            G.lr_parse(values['input'], method, trace=False)
+            G.lr_parse_steps(values['input'], method)
+    return jsonify(G.profile.as_dict())
+
+
+@app.route('/cache')
+def cache_stats():
+    return jsonify(cache.stats())
 
 if __name__ == '__main__':
     debug = os.getenv("PROD") == None
-    app.run(port=8080, debug=debug)
\ No newline at end of file
+    app.run(port=8080, debug=debug, threaded=True)
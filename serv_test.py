@@ -0,0 +1,128 @@
+import unittest
+from unittest import mock
+
+import grammar
+import serv
+
+
+GRAMMAR = """
+        E → TA
+        A → +TA | ɛ
+        T → FB
+        B → ∗FB | ɛ
+        F → (E) | a
+    """
+
+
+class TestAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.client = serv.app.test_client()
+
+    def test_analyze(self):
+        response = self.client.get('/api/analyze', query_string={'grammar': GRAMMAR})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(set(data), {'grammar', 'll1', 'lr0', 'slr', 'lalr'})
+        self.assertEqual(data['ll1']['conflicts'], [])
+        self.assertEqual(self.client.post('/api/analyze', json={'grammar': GRAMMAR}).get_json(), data)
+
+    def test_invalid(self):
+        for text in ["", "  \n "]:
+            response = self.client.post('/api/analyze', json={'grammar': text})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
+        for body in [[GRAMMAR], "S → a", 1]:
+            for url in ['/api/analyze', '/api/parse', '/api/profile']:
+                response = self.client.post(url, json=body)
+                self.assertEqual(response.status_code, 400, url)
+                self.assertIn('error', response.get_json())
+        response = self.client.post('/api/parse', data='{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': 'lr2'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_parse(self):
+        for method in serv.PARSE_METHODS:
+            data = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': method,
+                'input': "a+a∗a", 'tree': True}).get_json()
+            self.assertEqual((data['accepted'], data['position']), (True, 5), method)
+            tree = data['forest' if method in ('glr', 'earley') else 'tree']
+            self.assertEqual(len(tree['nodes']), 16, method)
+            data = self.client.get('/api/parse', query_string={'grammar': GRAMMAR,
+                'method': method, 'input': "a+∗a"}).get_json()
+            self.assertEqual((data['accepted'], data['position']), (False, 2), method)
+            self.assertNotIn('tree', data)
+
+    def test_recover(self):
+        for method in serv.METHODS:
+            if method == 'lr0':
+                continue # not LR(0): the table has conflicts
+            data = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': method,
+                'input': "a+∗a", 'recover': True}).get_json()
+            self.assertFalse(data['accepted'])
+            self.assertEqual(data['errors'], [{'position': 2, 'token': "∗", 'expected': ["(", "a"]}])
+        for method in ('ll1', 'lalr', 'glr'):
+            response = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': method,
+                'input': "a+∗a", 'recover': True, 'tree': True})
+            self.assertEqual(response.status_code, 400, method)
+        response = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': 'earley',
+            'input': "a", 'recover': True})
+        self.assertEqual(response.status_code, 400)
+
+    def test_steps(self):
+        data = self.client.post('/api/parse', json={'grammar': GRAMMAR, 'method': 'slr',
+            'input': "a", 'steps': True}).get_json()
+        self.assertTrue(data['accepted'])
+        self.assertTrue(data['steps'])
+
+    def test_profile(self):
+        data = self.client.post('/api/profile', json={'grammar': GRAMMAR, 'method': 'slr',
+            'input': "a"}).get_json()
+        self.assertIn('lr_table:slr', data['phases'])
+        self.assertEqual(data['counters']['slr parse tokens'], 1)
+        response = self.client.post('/api/profile', json={'grammar': GRAMMAR, 'method': 'glr'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = serv.app.test_client()
+
+    def test_eviction(self):
+        cache = serv.AnalysisCache(size=2)
+        first = cache.get("S → a")
+        self.assertIs(cache.get("  S → a\n\n"), first)
+        cache.get("S → b")
+        cache.get("S → a")
+        cache.get("S → c") # evicts S → b, the least recently used
+        self.assertEqual(cache.stats(), {'size': 2, 'max_size': 2,
+            'hits': 2, 'misses': 3, 'evictions': 1})
+        self.assertEqual(list(cache.entries), ["S → a", "S → c"])
+
+    def test_stats(self):
+        with mock.patch.object(serv, 'cache', serv.AnalysisCache(size=1)):
+            self.client.get('/api/analyze', query_string={'grammar': "S → a"})
+            self.client.get('/api/analyze', query_string={'grammar': "S → a"})
+            self.client.get('/api/analyze', query_string={'grammar': "S → b"})
+            stats = self.client.get('/cache').get_json()
+        self.assertEqual(stats, {'size': 1, 'max_size': 1,
+            'hits': 1, 'misses': 2, 'evictions': 1})
+
+    def test_sections(self):
+        # a failing section leaves the others, and the LL(1) parse, in place
+        with mock.patch.object(grammar.Grammar, 'render_stats_lr0', side_effect=ValueError("lr0")), \
+                mock.patch.object(grammar.Grammar, 'lr0_summary', side_effect=ValueError("lr0")), \
+                mock.patch.object(serv, 'cache', serv.AnalysisCache()):
+            entry = serv.analyze("S → a")
+            page = self.client.get('/', query_string={'input': "S → b", 'to_parse': "b"})
+        self.assertIsNotNone(entry['grammar'])
+        self.assertIn("lr0", entry['lr0'])
+        self.assertEqual(entry['analysis']['lr0'], {'error': "lr0"})
+        self.assertEqual(entry['analysis']['ll1']['conflicts'], [])
+        self.assertIn("LL(1) parsing", page.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
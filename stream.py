@@ -0,0 +1,202 @@
+"""
+Push parsing for token feeds of unbounded length: instead of one input
+list, tokens are fed in chunks as they arrive, then the end is signalled.
+
+    parser = stream.parser(G, 'lalr')
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            ...   # Reduction(production, symbol, start, end)
+    parser.end()            # the last Reductions
+    parser.result           # ParseResult
+
+Each Reduction reports a completed non-terminal with the production that
+derived it and the token positions start..end it spans, bottom-up and as
+soon as the table allows: LR drivers reduce when the next token arrives,
+the LL(1) driver when the last symbol of a rule is matched. Between
+calls a parser keeps its stack and a few counters, no tokens, so memory
+grows with the nesting depth of the input and not with its length. For
+LL(1), where a list is a right-recursive rule (Log → Line Log | ɛ), a
+rule that ends in its own non-terminal goes on under the same entry:
+the whole list is one Reduction, with the production that started it,
+and its stack stays constant however long it runs.
+
+A rejection ends the parse at once: `result` is set to the failing
+ParseResult and later tokens are ignored. For asyncio, events()
+drives a parser from an async iterable of chunks:
+
+    async for event in stream.events(parser, chunks):
+        ...
+"""
+
+from collections import namedtuple
+
+from grammar import ParseResult, Token
+
+
+# a non-terminal `symbol` derived by `production` (its id in G.productions())
+# from the tokens start..end-1
+Reduction = namedtuple('Reduction', 'production symbol start end')
+
+
+class PushParser:
+    # feed()/end() around a driver that takes one terminal id at a time;
+    # subclasses implement _step(t, events), which appends the Reductions
+    # it completes and returns False on a syntax error. `result` stays None
+    # until the parse is over.
+
+    def __init__(self, table, reductions=True):
+        self.table = table
+        self.reductions = reductions
+        self.symbols = table.symbols
+        self.width = len(table.terminals)
+        self.index = table.index
+        self.position = 0
+        self.result = None
+
+    def _terminal(self, token):
+        end = self.width - 1
+        if token.__class__ is Token:
+            token = token.kind
+        t = self.index.get(token, -1)
+        return t if t < end else -1
+
+    def feed(self, tokens):
+        # parse the next tokens, returning the Reductions they completed
+        events = []
+        if self.result is not None:
+            return events
+        step = self._step
+        terminal = self._terminal
+        for token in tokens:
+            t = terminal(token)
+            if t < 0 or not step(t, events):
+                self.result = ParseResult(False, self.position)
+                break
+            self.position += 1
+        return events
+
+    def end(self):
+        # the input is over: the last Reductions, `result` being set
+        events = []
+        if self.result is None:
+            accepted = self._step(self.width - 1, events)
+            self.result = ParseResult(accepted, self.position)
+        return events
+
+
+class LL1PushParser(PushParser):
+    # CompiledLL1.recognize one token at a time. Below the right side of
+    # each expansion the stack holds a marker -(p+1), with the position
+    # the rule started at in `starts`; it is popped as a Reduction as soon
+    # as the rule is matched. A non-terminal expanded right above the
+    # marker of a rule of its own, its tail, adds no marker: the rule goes
+    # on under the one already there. Without reductions there are no
+    # markers.
+
+    def __init__(self, table, reductions=True):
+        super().__init__(table, reductions)
+        self.stack = [self.width - 1, table.axiom]
+        self.starts = []
+
+    def _step(self, t, events):
+        width = self.width
+        table = self.table.table
+        productions = self.table.productions
+        expand = self.table._expand
+        symbols = self.symbols
+        stack = self.stack
+        starts = self.starts
+        position = self.position
+        reductions = self.reductions
+        while True:
+            top = stack[-1]
+            if top < 0:
+                stack.pop()
+                p = -top-1
+                events.append(Reduction(p, symbols[productions[p][0]], starts.pop(), position))
+            elif top < width:
+                if top != t:
+                    return False
+                stack.pop()
+                position += 1
+                # the rules this terminal ends are complete
+                while stack and stack[-1] < 0:
+                    p = -stack.pop()-1
+                    events.append(Reduction(p, symbols[productions[p][0]], starts.pop(), position))
+                return True
+            else:
+                p = table[(top - width) * width + t]
+                if p < 0:
+                    return False
+                below = stack[-2]
+                if not reductions or below < 0 and productions[-below-1][0] == top:
+                    stack.pop()
+                else:
+                    stack[-1] = -p-1
+                    starts.append(position)
+                stack.extend(expand[p])
+
+
+class LRPushParser(PushParser):
+    # LRTable.recognize one token at a time: the reductions a token
+    # triggers run when it arrives, then it is shifted. `starts` runs
+    # parallel to the state stack with the position each symbol began at.
+
+    def __init__(self, table, reductions=True):
+        super().__init__(table, reductions)
+        self.states = [0]
+        self.starts = [0]
+
+    def _step(self, t, events):
+        table = self.table
+        width = self.width
+        height = len(table.nonterminals)
+        action = table.action
+        goto = table.goto
+        accept = table.accept
+        sizes = table._sizes
+        lhs = table._lhs
+        symbols = self.symbols
+        states = self.states
+        starts = self.starts
+        position = self.position
+        reductions = self.reductions
+        while True:
+            a = action[states[-1]*width + t]
+            if a > 0:
+                states.append(a-1)
+                starts.append(position)
+                return True
+            if a == 0:
+                return False
+            if a == accept:
+                return True
+            p = -a-1
+            n = sizes[p]
+            start = starts[-n] if n else position
+            if n:
+                del states[-n:]
+                del starts[-n:]
+            states.append(goto[states[-1]*height + lhs[p]])
+            starts.append(start)
+            if reductions:
+                events.append(Reduction(p, symbols[lhs[p] + width], start, position))
+
+
+def parser(G, method='ll1', reductions=True):
+    # a fresh push parser over G's 'll1' table or an LR table ('lalr',..)
+    if method == 'll1':
+        return LL1PushParser(G.ll1(), reductions)
+    return LRPushParser(G.lr_table(method), reductions)
+
+
+async def events(parser, chunks):
+    # the Reductions of a parse fed from an async iterable of token chunks,
+    # those of end() included; parser.result holds the outcome afterwards
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            yield event
+        if parser.result is not None:
+            return
+    for event in parser.end():
+        yield event
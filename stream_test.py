@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+
+import stream
+from grammar import Grammar, Token
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        self.G = Grammar.from_text("""
+                E → TA
+                A → +TA | ɛ
+                T → FB
+                B → ∗FB | ɛ
+                F → (E) | a
+            """)
+
+    def test_events(self):
+        G = self.G
+        s = "a+(a∗a)"
+        for method in ('ll1', 'slr', 'lalr', 'lr1'):
+            parser = stream.parser(G, method)
+            events = []
+            for i in range(0, len(s), 2):
+                events += parser.feed(s[i:i+2])
+            self.assertIsNone(parser.result)
+            events += parser.end()
+            self.assertTrue(parser.result)
+            self.assertEqual(parser.result.position, 7)
+            # the non-terminals of the parse tree, in postorder; LL(1)
+            # reports a right-recursive list (A → +TA) once
+            tree = G.lr_parse(s, trace=False, tree=True).tree
+            tails = set()
+            if method == 'll1':
+                for n in tree.preorder():
+                    children = tree.children_of(n)
+                    if children and tree.label(children[-1]) == tree.label(n):
+                        tails.add(children[-1])
+            expected = [tree.label(n) for n in tree.postorder()
+                if not tree.is_leaf(n) and n not in tails]
+            self.assertEqual([e.symbol for e in events], expected, method)
+            self.assertEqual(events[-1], stream.Reduction(0, 'E', 0, 7))
+            self.assertIn(stream.Reduction(6, 'F', 2, 7), events)
+
+        for method in ('ll1', 'lalr'):
+            parser = stream.parser(G, method)
+            parser.feed([Token('a', 'x', 0), Token('+', '+', 1)])
+            self.assertEqual(parser.feed(")a"), [])
+            self.assertEqual(parser.result.position, 2)
+            self.assertEqual(parser.feed("a"), [])
+            parser.end()
+            self.assertFalse(parser.result)
+            parser = stream.parser(G, method)
+            parser.feed("a+")
+            parser.end()
+            self.assertEqual((parser.result.accepted, parser.result.position), (False, 2))
+
+    def test_unbounded(self):
+        # a long feed keeps a stack as deep as the nesting, not the input
+        G = Grammar.from_text("Log → Log Line | Line\nLine → w = v ;")
+        parser = stream.parser(G, 'lalr')
+        lines = 0
+        for _ in range(2000):
+            for event in parser.feed(['w', '=', 'v', ';'] * 10):
+                lines += event.symbol == 'Line'
+            self.assertLess(len(parser.states), 8)
+        lines += sum(event.symbol == 'Line' for event in parser.end())
+        self.assertTrue(parser.result)
+        self.assertEqual(lines, 20000)
+
+        G = Grammar.from_text("Log → Line Log | ɛ\nLine → w = v ;")
+        parser = stream.parser(G, 'll1')
+        lines = 0
+        for _ in range(2000):
+            for event in parser.feed(['w', '=', 'v', ';'] * 10):
+                lines += event.symbol == 'Line'
+            self.assertLess(len(parser.stack), 8)
+            self.assertLess(len(parser.starts), 4)
+        events = parser.end()
+        self.assertTrue(parser.result)
+        self.assertEqual(lines, 20000)
+        self.assertEqual(events, [stream.Reduction(0, 'Log', 0, 80000)])
+        parser = stream.parser(G, 'll1', reductions=False)
+        for _ in range(2000):
+            self.assertEqual(parser.feed(['w', '=', 'v', ';'] * 10), [])
+            self.assertLess(len(parser.stack), 8)
+        parser.end()
+        self.assertTrue(parser.result)
+
+    def test_asyncio(self):
+        async def chunks():
+            for chunk in ["(a+", "a)", "∗a"]:
+                await asyncio.sleep(0)
+                yield chunk
+
+        async def collect(parser):
+            return [event.symbol async for event in stream.events(parser, chunks())]
+
+        parser = stream.parser(self.G, 'lalr')
+        symbols = asyncio.run(collect(parser))
+        self.assertTrue(parser.result)
+        self.assertEqual(symbols.count('F'), 4)
+        self.assertEqual(symbols[-1], 'E')
+
+
+if __name__ == '__main__':
+    unittest.main()
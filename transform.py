@@ -0,0 +1,403 @@
+"""
+Grammar transformations: useless symbol and epsilon rule removal, left
+recursion removal and left factoring.
+
+Every transformation returns a new Grammar and a mapping back to the
+productions of the one it was given: mapping[i] is the tuple of ids (in
+G.productions() order) of the original productions that production i of
+the new grammar was built from, () for the bookkeeping rules a
+transformation adds on its own (A' → ɛ ending a loop, for instance).
+
+    G = Grammar.from_text("E → E+T | T\\nT → (E) | a")
+    H, mapping = transform.normalize(G)   # left recursion gone, factored
+    H.ll1_conflicts()                     # []
+
+New non-terminals are named after the one they come from with primes
+added (E', E''). The transformations are linear in the size of the
+grammar, except left recursion removal, which substitutes alternatives
+inside each left-recursive cycle and can grow with the size of the cycle;
+everything outside the cycles is left as it is.
+"""
+
+from grammar import Grammar
+
+
+def _rules(G):
+    # v -> [(rule, origin)], every production mapped to itself
+    rules = {v: [] for v in G.V()}
+    for p, (v, rule) in enumerate(G.productions()):
+        rules[v].append((tuple(rule), (p,)))
+    return rules
+
+
+def _grammar(axiom, rules):
+    # (Grammar, mapping) of v -> [(rule, origin)], repeated rules dropped
+    result = {}
+    mapping = []
+    for v, R in rules.items():
+        kept = result[v] = []
+        seen = set()
+        for rule, origin in R:
+            if rule not in seen:
+                seen.add(rule)
+                kept.append(list(rule))
+                mapping.append(origin)
+    return Grammar(axiom, result), mapping
+
+
+class _Names:
+    # fresh non-terminal names: v', v'', ... not used by any symbol yet
+
+    def __init__(self, rules):
+        self.taken = set(rules)
+        for R in rules.values():
+            for rule, _ in R:
+                self.taken.update(rule)
+        self.made = {} # v -> the names made from it
+
+    def fresh(self, v):
+        name = v + "'"
+        while name in self.taken:
+            name += "'"
+        self.taken.add(name)
+        self.made.setdefault(v, []).append(name)
+        return name
+
+    def ordered(self, rules, result):
+        # `result` listing every non-terminal of `rules` followed by the
+        # new ones made from it
+        ordered = {}
+        for v in rules:
+            ordered[v] = result[v]
+            for name in self.made.get(v, ()):
+                if name in result:
+                    ordered[name] = result[name]
+        return ordered
+
+
+def _nullable(rules):
+    # the nullable non-terminals, counting for each rule the symbols not
+    # known nullable yet
+    users = {}
+    missing = []
+    nullable = set()
+    work = []
+    for v, R in rules.items():
+        for rule, _ in R:
+            i = len(missing)
+            missing.append(len(rule))
+            for x in rule:
+                if x in rules:
+                    users.setdefault(x, []).append((i, v))
+            if not rule and v not in nullable:
+                nullable.add(v)
+                work.append(v)
+    while work:
+        x = work.pop()
+        for i, v in users.get(x, ()):
+            missing[i] -= 1
+            if missing[i] == 0 and v not in nullable:
+                nullable.add(v)
+                work.append(v)
+    return nullable
+
+
+def _reduce(axiom, rules):
+    # drop the non-terminals that derive no terminal string or cannot be
+    # reached from the axiom, with every rule that uses them
+    users = {}
+    missing = []
+    productive = set()
+    work = []
+    for v, R in rules.items():
+        for rule, _ in R:
+            i = len(missing)
+            symbols = {x for x in rule if x in rules}
+            missing.append(len(symbols))
+            for x in symbols:
+                users.setdefault(x, []).append((i, v))
+            if not symbols and v not in productive:
+                productive.add(v)
+                work.append(v)
+    while work:
+        x = work.pop()
+        for i, v in users.get(x, ()):
+            missing[i] -= 1
+            if missing[i] == 0 and v not in productive:
+                productive.add(v)
+                work.append(v)
+
+    useful = lambda rule: all(x not in rules or x in productive for x in rule)
+    reachable = {axiom}
+    work = [axiom]
+    while work:
+        v = work.pop()
+        for rule, _ in rules.get(v, ()):
+            if useful(rule):
+                for x in rule:
+                    if x in rules and x not in reachable:
+                        reachable.add(x)
+                        work.append(x)
+    result = {v: [(rule, origin) for rule, origin in R if useful(rule)]
+            for v, R in rules.items() if v in reachable and v in productive}
+    if axiom not in result:
+        result = {axiom: []} # the empty language
+    return result
+
+
+def _remove_epsilon(axiom, rules):
+    # every rule once per way of leaving out its nullable symbols, no rule
+    # with an empty right side except S → ɛ for a nullable axiom.
+    # A rule with many nullable symbols is first cut into a chain of
+    # non-terminals holding a few each, so the variants stay linear.
+    nullable = _nullable(rules)
+    names = _Names(rules)
+    pieces = {v: [] for v in rules}
+    for v, R in rules.items():
+        for rule, origin in R:
+            u = v
+            while sum(1 for x in rule if x in nullable) > 3:
+                cut = [i for i, x in enumerate(rule) if x in nullable][2]
+                rest = names.fresh(v)
+                pieces[u].append((rule[:cut] + (rest,), origin))
+                pieces[rest] = []
+                if all(x in nullable for x in rule[cut:]):
+                    nullable.add(rest)
+                u, rule = rest, rule[cut:]
+            pieces[u].append((rule, origin))
+
+    pieces = names.ordered(rules, pieces)
+    result = {}
+    for v, R in pieces.items():
+        out = result[v] = []
+        for rule, origin in R:
+            variants = [()]
+            for x in rule:
+                if x in nullable:
+                    variants = [r + (x,) for r in variants] + variants
+                else:
+                    variants = [r + (x,) for r in variants]
+            out.extend((r, origin) for r in variants if r and r != (v,))
+    if axiom in nullable:
+        if any(axiom in rule for R in result.values() for rule, _ in R):
+            start = names.fresh(axiom)
+            result = dict([(start, [((axiom,), ()), ((), ())])] + list(result.items()))
+            axiom = start
+        else:
+            result[axiom].append(((), ()))
+    return axiom, _reduce(axiom, result)
+
+
+def _components(nodes, edges):
+    # Tarjan's strongly connected components of a graph, iteratively
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(edges.get(root, ())))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            v, children = work[-1]
+            for w in children:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(edges.get(w, ()))))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+    return components
+
+
+def _cycles(rules, edges):
+    # the strongly connected components of `edges` that hold a cycle
+    cycles = []
+    for component in _components(list(rules), edges):
+        if len(component) > 1 or component[0] in edges[component[0]]:
+            cycles.append(set(component))
+    return cycles
+
+
+def _left_recursion(rules, nullable):
+    # (left-recursive cycles, whether one goes through a nullable prefix)
+    corners = {}
+    for v, R in rules.items():
+        corners[v] = set()
+        for rule, _ in R:
+            for i, x in enumerate(rule):
+                if x in rules:
+                    corners[v].add((x, i))
+                if x not in nullable:
+                    break
+    cycles = _cycles(rules, {v: {x for x, _ in corners[v]} for v in rules})
+    hidden = any(i and x in members for members in cycles
+            for v in members for x, i in corners[v])
+    return cycles, hidden
+
+
+def _is_cyclic(rules, nullable):
+    # whether some A ⇒+ A
+    units = {v: set() for v in rules}
+    for v, R in rules.items():
+        for rule, _ in R:
+            for i, x in enumerate(rule):
+                if x in rules and all(y in nullable for j, y in enumerate(rule) if j != i):
+                    units[v].add(x)
+    return bool(_cycles(rules, units))
+
+
+def _merge_unit_cycles(axiom, rules):
+    # every cycle of unit rules A → B → .. → A of an epsilon-free grammar
+    # folded into its first non-terminal, A → A rules dropped
+    units = {v: {rule[0] for rule, _ in R if len(rule) == 1 and rule[0] in rules}
+            for v, R in rules.items()}
+    merged = {}
+    for members in _cycles(rules, units):
+        first = next(v for v in rules if v in members)
+        for v in members:
+            merged[v] = first
+    if not merged:
+        return axiom, rules
+    result = {}
+    for v, R in rules.items():
+        u = merged.get(v, v)
+        out = result.setdefault(u, [])
+        for rule, origin in R:
+            rule = tuple(merged.get(x, x) for x in rule)
+            if rule != (u,):
+                out.append((rule, origin))
+    return merged.get(axiom, axiom), result
+
+
+def _remove_left_recursion(axiom, rules):
+    # Paull's algorithm, applied to each left-recursive cycle on its own:
+    # inside a cycle ordered A1..An, a rule Ai → Aj γ with j < i is replaced
+    # by Ai → δ γ for every Aj → δ, then Ai → Ai α | β becomes
+    # Ai → β Ai', Ai' → α Ai' | ɛ
+    nullable = _nullable(rules)
+    cycles, hidden = _left_recursion(rules, nullable)
+    if not cycles:
+        return axiom, rules
+    if hidden or _is_cyclic(rules, nullable):
+        # the substitutions only look at the first symbol and assume no
+        # A ⇒+ A: epsilon rules and unit cycles go first
+        axiom, rules = _merge_unit_cycles(*_remove_epsilon(axiom, rules))
+        cycles, _ = _left_recursion(rules, _nullable(rules))
+
+    names = _Names(rules)
+    result = {}
+    for v, R in rules.items():
+        result[v] = list(R)
+    for members in cycles:
+        order = [v for v in rules if v in members]
+        for i, v in enumerate(order):
+            earlier = set(order[:i])
+            R = result[v]
+            changed = True
+            while changed:
+                changed = False
+                out = []
+                for rule, origin in R:
+                    if rule and rule[0] in earlier:
+                        changed = True
+                        out.extend((delta + rule[1:], origin + other)
+                                for delta, other in result[rule[0]])
+                    else:
+                        out.append((rule, origin))
+                R = out
+            loops = [(rule[1:], origin) for rule, origin in R if rule and rule[0] == v]
+            if not loops:
+                result[v] = R
+                continue
+            rest = names.fresh(v)
+            result[v] = [(rule + (rest,), origin) for rule, origin in R
+                    if not (rule and rule[0] == v)]
+            result[rest] = [(alpha + (rest,), origin) for alpha, origin in loops if alpha]
+            result[rest].append(((), ()))
+
+    return axiom, _reduce(axiom, names.ordered(rules, result))
+
+
+def _left_factor(axiom, rules):
+    # alternatives of v sharing a prefix α become v → α v' and v' → the
+    # rest of each; v' is factored in turn. Every symbol of a rule is
+    # looked at a bounded number of times.
+    names = _Names(rules)
+    result = {}
+    for v, R in rules.items():
+        work = [(v, list(R))]
+        while work:
+            u, R = work.pop()
+            groups = {}
+            for rule, origin in R:
+                groups.setdefault(rule[:1], []).append((rule, origin))
+            out = result[u] = []
+            for first, group in groups.items():
+                if not first or len(group) == 1:
+                    out.extend(group)
+                    continue
+                shared = group[0][0]
+                prefix = len(shared)
+                for rule, _ in group:
+                    i = 1
+                    while i < prefix and i < len(rule) and rule[i] == shared[i]:
+                        i += 1
+                    prefix = i
+                rest = names.fresh(v)
+                origin = tuple(p for _, o in group for p in o)
+                out.append((shared[:prefix] + (rest,), origin))
+                work.append((rest, [(rule[prefix:], o) for rule, o in group]))
+    return axiom, names.ordered(rules, result)
+
+
+def reduce(G):
+    # G without its useless symbols: those that derive no terminal string
+    # or cannot be reached from the axiom
+    return _grammar(G.axiom, _reduce(G.axiom, _rules(G)))
+
+
+def remove_epsilon(G):
+    # an equivalent grammar with no epsilon rules, but S → ɛ (or a new
+    # axiom S' → S | ɛ) when the language has the empty word
+    return _grammar(*_remove_epsilon(G.axiom, _rules(G)))
+
+
+def remove_left_recursion(G):
+    # an equivalent grammar with no direct or indirect left recursion.
+    # Cycles of unit rules are cut, which only drops ambiguity.
+    return _grammar(*_remove_left_recursion(G.axiom, _rules(G)))
+
+
+def left_factor(G):
+    # an equivalent grammar where the alternatives of a non-terminal never
+    # begin with the same symbol
+    return _grammar(*_left_factor(G.axiom, _rules(G)))
+
+
+def normalize(G):
+    # useless symbols and left recursion removed, then left factored:
+    # the usual preparation of a grammar for an LL(1) table
+    axiom, rules = G.axiom, _reduce(G.axiom, _rules(G))
+    axiom, rules = _remove_left_recursion(axiom, rules)
+    axiom, rules = _left_factor(axiom, rules)
+    return _grammar(axiom, _reduce(axiom, rules))
@@ -0,0 +1,101 @@
+import itertools
+import unittest
+
+import earley
+import transform
+from grammar import Grammar
+
+
+def language(G, terminals, length):
+    # the sentences of G up to `length` tokens
+    parser = earley.EarleyParser(G)
+    return {s for n in range(length+1) for s in itertools.product(terminals, repeat=n)
+            if parser.parse(s)}
+
+
+class TestTransform(unittest.TestCase):
+
+    def assertSameLanguage(self, G, H, length=6):
+        terminals = sorted(G.T())
+        self.assertEqual(language(G, terminals, length), language(H, terminals, length))
+
+    def test_reduce(self):
+        G = Grammar.from_text("S → AB | a\nA → aA\nB → b\nC → c")
+        H, mapping = transform.reduce(G)
+        self.assertEqual(H.rules, {'S': [['a']]})
+        self.assertEqual(mapping, [(1,)])
+
+    def test_remove_epsilon(self):
+        G = Grammar.from_text("S → ABC\nA → aA | ɛ\nB → b | ɛ\nC → c | d")
+        H, mapping = transform.remove_epsilon(G)
+        self.assertFalse(any(not rule for _, rule in H.productions()))
+        self.assertEqual(H.rules['S'], [list("ABC"), list("BC"), list("AC"), list("C")])
+        self.assertEqual(mapping[:4], [(0,)] * 4)
+        self.assertSameLanguage(G, H)
+
+        G = Grammar.from_text("S → aSb | ɛ")
+        H, _ = transform.remove_epsilon(G)
+        self.assertEqual(H.axiom, "S'")
+        self.assertEqual(H.rules["S'"], [['S'], []])
+        self.assertSameLanguage(G, H)
+
+        # many nullable symbols in one rule: no exponential blowup
+        G = Grammar('S', {'S': [['A'] * 40], 'A': [['a'], []]})
+        H, _ = transform.remove_epsilon(G)
+        self.assertLess(len(H.productions()), 200)
+        self.assertTrue(earley.parse(H, ["a"] * 40))
+        self.assertFalse(earley.parse(H, ["a"] * 41))
+
+    def test_remove_left_recursion(self):
+        G = Grammar.from_text("""
+                E → E*B | E+B | B
+                B → 0 | 1
+            """)
+        H, mapping = transform.remove_left_recursion(G)
+        self.assertEqual(H.rules, {
+            'E': [['B', "E'"]],
+            "E'": [['*', 'B', "E'"], ['+', 'B', "E'"], []],
+            'B': [['0'], ['1']],
+        })
+        self.assertEqual(mapping, [(2,), (0,), (1,), (), (3,), (4,)])
+        self.assertSameLanguage(G, H)
+
+        # indirect, through a nullable prefix and through unit cycles
+        for text in ["S → Aa | b\nA → Ac | Sd | ɛ",
+                "S → BSa | c\nB → ɛ | b",
+                "S → A | a\nA → S | Sb"]:
+            G = Grammar.from_text(text)
+            H, mapping = transform.remove_left_recursion(G)
+            self.assertEqual(len(mapping), len(H.productions()))
+            self.assertSameLanguage(G, H)
+            # nothing left to do
+            self.assertEqual(transform.remove_left_recursion(H)[0].rules, H.rules, text)
+
+    def test_left_factor(self):
+        G = Grammar.from_text("""
+                S → if E then S | if E then S else S | a
+                E → b
+            """)
+        H, mapping = transform.left_factor(G)
+        self.assertEqual(H.rules['S'], [['if', 'E', 'then', 'S', "S'"], ['a']])
+        self.assertEqual(H.rules["S'"], [[], ['else', 'S']])
+        self.assertEqual(mapping[0], (0, 1))
+        self.assertSameLanguage(G, H, 7)
+
+    def test_normalize(self):
+        G = Grammar.from_text("""
+                E → E+T | E-T | T
+                T → T∗F | F
+                F → (E) | a | a[E]
+            """)
+        H, mapping = transform.normalize(G)
+        self.assertEqual(H.ll1_conflicts(), [])
+        self.assertSameLanguage(G, H, 4)
+        productions = G.productions()
+        for (v, rule), origin in zip(H.productions(), mapping):
+            for p in origin:
+                self.assertIn(productions[p][0], v)
+
+
+if __name__ == '__main__':
+    unittest.main()